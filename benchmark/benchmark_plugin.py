@@ -0,0 +1,66 @@
+from tuneflow_py import TuneflowPlugin, Song, ParamDescriptor, TrackType
+from typing import Dict, Any
+import json
+import os
+import pathlib
+
+BUNDLE_FILE_PATH = str(pathlib.PurePath(__file__).parent.joinpath('benchmark_plugin.bundle.json'))
+
+
+class TransposePlugin(TuneflowPlugin):
+    @staticmethod
+    def provider_id() -> str:
+        return "benchmark"
+
+    @staticmethod
+    def plugin_id() -> str:
+        return "transpose"
+
+    @staticmethod
+    def params(song: Song) -> Dict[str, ParamDescriptor]:
+        return {}
+
+    @staticmethod
+    def run(song: Song, params: Dict[str, Any]):
+        for track in song.get_tracks():
+            for clip in track.get_clips():
+                for note in clip.get_notes():
+                    note.set_pitch(min(note.get_pitch() + 1, 127))
+
+
+def create_song(track_count: int, clip_count: int, note_count: int):
+    '''
+    Creates a synthetic song with `track_count` x `clip_count` x `note_count` notes.
+    '''
+    song = Song()
+    for _ in range(track_count):
+        track = song.create_track(type=TrackType.MIDI_TRACK)
+        for clip_index in range(clip_count):
+            clip_start_tick = clip_index * note_count * 120
+            clip = track.create_midi_clip(clip_start_tick=clip_start_tick,
+                                          clip_end_tick=clip_start_tick + note_count * 120 - 1)
+            for note_index in range(note_count):
+                start_tick = clip_start_tick + note_index * 120
+                clip.create_note(pitch=40 + note_index % 48, velocity=100, start_tick=start_tick,
+                                 end_tick=start_tick + 100)
+    return song
+
+
+def create_app():
+    '''
+    App factory for `uvicorn --factory`, the Runner config is read from `BENCHMARK_RUNNER_CONFIG` as JSON.
+    '''
+    from tuneflow_devkit import Runner
+    config = json.loads(os.environ.get('BENCHMARK_RUNNER_CONFIG', '{}'))
+    if "async" in config:
+        results = {}
+
+        def store_uploader(job_id, result):
+            results[job_id] = result
+        config["async"] = {
+            "store": {
+                "uploader": store_uploader,
+                "resultUrlResolver": lambda job_id: f'memory://{job_id}'
+            }
+        }
+    return Runner(plugin_class_list=[TransposePlugin], bundle_file_path=BUNDLE_FILE_PATH).start(config=config)
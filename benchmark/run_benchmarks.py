@@ -0,0 +1,265 @@
+'''
+Benchmarks the Runner request pipeline.
+
+Drives `/init-plugin-params` and `/jobs` in sync and async mode with synthetic songs, either in-process through
+an ASGI transport or over a real uvicorn server, and reports throughput, latency percentiles and peak RSS.
+
+Every scenario runs in its own process, in-process scenarios in a child process of this script, so that the peak
+RSS of one scenario does not carry over to the next.
+
+Example:
+    python benchmark/run_benchmarks.py --transport inprocess uvicorn --tracks 8 --clips 4 --notes 200 \
+        --requests 200 --concurrency 8 --output bench_output.json
+'''
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+# Job statuses after which polling stops.
+FINISHED_JOB_STATUSES = ['DONE', 'ERROR', 'CANCELLED']
+
+BENCHMARK_DIR = pathlib.Path(__file__).parent
+sys.path.insert(0, str(BENCHMARK_DIR))
+sys.path.insert(0, str(BENCHMARK_DIR.parent.joinpath('src')))
+
+import httpx  # noqa: E402
+from msgpack import packb, unpackb  # noqa: E402
+from benchmark_plugin import create_song  # noqa: E402
+
+
+def get_percentile(sorted_values, percentile: float):
+    if len(sorted_values) == 0:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(percentile / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def get_peak_rss_bytes(pid: int | None = None):
+    '''
+    Returns the peak resident set size of the given process, or of the current process.
+    '''
+    if pid is None:
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS reports bytes.
+        return peak_rss if platform.system() == 'Darwin' else peak_rss * 1024
+    try:
+        with open(f'/proc/{pid}/status', 'r') as status_file:
+            for line in status_file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except FileNotFoundError:
+        pass
+    return None
+
+
+async def send_request(client: httpx.AsyncClient, endpoint: str, body: bytes, poll_interval: float):
+    response = await client.post(endpoint, content=body)
+    if response.status_code != 200:
+        return False
+    result = unpackb(response.content)
+    if result["status"] != "ACCEPTED":
+        return result["status"] == "OK"
+    while True:
+        status_response = await client.get(f'/jobs/{result["jobId"]}')
+        if status_response.status_code != 200:
+            # The job is unknown, for example because it was evicted.
+            return False
+        job_status = unpackb(status_response.content)["jobStatus"]
+        if job_status in FINISHED_JOB_STATUSES:
+            return job_status == 'DONE'
+        await asyncio.sleep(poll_interval)
+
+
+async def run_scenario(client: httpx.AsyncClient, endpoint: str, body: bytes, request_count: int, concurrency: int,
+                       poll_interval: float):
+    latencies = []
+    error_count = 0
+    request_queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(request_count):
+        request_queue.put_nowait(None)
+
+    async def worker():
+        nonlocal error_count
+        while not request_queue.empty():
+            request_queue.get_nowait()
+            start_time = time.perf_counter()
+            succeeded = await send_request(client, endpoint, body, poll_interval)
+            latencies.append(time.perf_counter() - start_time)
+            if not succeeded:
+                error_count += 1
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start_time
+    latencies.sort()
+    return {
+        "requests": request_count,
+        "errors": error_count,
+        "elapsedSeconds": elapsed,
+        "throughputPerSecond": request_count / elapsed,
+        "latencyMeanMs": sum(latencies) / len(latencies) * 1000,
+        "latencyP50Ms": get_percentile(latencies, 50) * 1000,  # type: ignore
+        "latencyP99Ms": get_percentile(latencies, 99) * 1000,  # type: ignore
+    }
+
+
+def get_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as free_socket:
+        free_socket.bind(('127.0.0.1', 0))
+        return free_socket.getsockname()[1]
+
+
+def start_uvicorn_server(runner_config: dict):
+    port = get_free_port()
+    environment = dict(os.environ)
+    environment["BENCHMARK_RUNNER_CONFIG"] = json.dumps(runner_config)
+    environment["PYTHONPATH"] = os.pathsep.join(
+        [str(BENCHMARK_DIR), str(BENCHMARK_DIR.parent.joinpath('src')), environment.get("PYTHONPATH", "")])
+    server_process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'benchmark_plugin:create_app', '--factory', '--port', str(port),
+         '--log-level', 'warning'],
+        env=environment, stdout=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f'{base_url}/plugin-bundle-info').status_code == 200:
+                return server_process, base_url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server_process.kill()
+    raise Exception("uvicorn server did not start in time")
+
+
+def iterate_scenarios(args):
+    for mode in args.modes:
+        for endpoint_name in args.endpoints:
+            if endpoint_name == 'init' and mode == 'async':
+                # Params initialization has no async path.
+                continue
+            yield mode, endpoint_name
+
+
+async def run_transport_scenario(transport_name: str, mode: str, endpoint_name: str, args, song_bytes: bytes):
+    '''
+    Runs one scenario against a new server or app.
+    '''
+    runner_config = {"executor": {"mode": args.executor}}
+    if mode == 'async':
+        runner_config["async"] = {}
+    server_process = None
+    if transport_name == 'uvicorn':
+        server_process, base_url = start_uvicorn_server(runner_config)
+        client = httpx.AsyncClient(base_url=base_url, timeout=None)
+    else:
+        os.environ["BENCHMARK_RUNNER_CONFIG"] = json.dumps(runner_config)
+        from benchmark_plugin import create_app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app()),  # type: ignore
+                                   base_url='http://benchmark', timeout=None)
+    try:
+        body = {
+            "providerId": "benchmark",
+            "pluginId": "transpose",
+            "song": song_bytes
+        }
+        if endpoint_name == 'jobs':
+            body["params"] = {}
+        endpoint = '/jobs' if endpoint_name == 'jobs' else '/init-plugin-params'
+        packed_body = packb(body)
+        # Warm up the server before measuring.
+        await run_scenario(client, endpoint, packed_body, min(args.concurrency, args.requests),
+                           args.concurrency, args.poll_interval)
+        result = await run_scenario(client, endpoint, packed_body, args.requests, args.concurrency,
+                                    args.poll_interval)
+        result.update({
+            "transport": transport_name,
+            "endpoint": endpoint_name,
+            "mode": mode,
+            "executor": args.executor,
+            "concurrency": args.concurrency,
+            "requestBytes": len(packed_body),
+            "peakRssBytes": get_peak_rss_bytes(server_process.pid if server_process is not None else None),
+        })
+        return result
+    finally:
+        await client.aclose()
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
+
+
+def run_inprocess_scenario_in_child(mode: str, endpoint_name: str):
+    '''
+    Runs one in-process scenario in a new process of this script and returns its result.
+    '''
+    child_args = [arg for arg in sys.argv[1:]]
+    output = subprocess.check_output(
+        [sys.executable, __file__] + child_args + ['--child-scenario', mode, endpoint_name])
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the tuneflow-devkit Runner request pipeline.')
+    parser.add_argument('--transport', nargs='+', choices=['inprocess', 'uvicorn'], default=['inprocess'])
+    parser.add_argument('--endpoints', nargs='+', choices=['init', 'jobs'], default=['init', 'jobs'])
+    parser.add_argument('--modes', nargs='+', choices=['sync', 'async'], default=['sync', 'async'])
+    parser.add_argument('--executor', choices=['thread', 'process', 'inline'], default='thread')
+    parser.add_argument('--tracks', type=int, default=8)
+    parser.add_argument('--clips', type=int, default=4)
+    parser.add_argument('--notes', type=int, default=200, help='Notes per clip.')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--poll-interval', type=float, default=0.005,
+                        help='Seconds between job status polls in async mode.')
+    parser.add_argument('--output', help='Path of the JSON results file.')
+    parser.add_argument('--child-scenario', nargs=2, metavar=('MODE', 'ENDPOINT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    song_bytes = create_song(args.tracks, args.clips, args.notes).serialize_to_bytestring()
+    if args.child_scenario is not None:
+        mode, endpoint_name = args.child_scenario
+        print(json.dumps(asyncio.run(run_transport_scenario('inprocess', mode, endpoint_name, args, song_bytes))))
+        return
+    print(f'Song: {args.tracks} tracks x {args.clips} clips x {args.notes} notes, {len(song_bytes)} bytes')
+    results = []
+    for transport_name in args.transport:
+        for mode, endpoint_name in iterate_scenarios(args):
+            if transport_name == 'inprocess':
+                result = run_inprocess_scenario_in_child(mode, endpoint_name)
+            else:
+                result = asyncio.run(run_transport_scenario(transport_name, mode, endpoint_name, args, song_bytes))
+            results.append(result)
+            print(f'{transport_name:10} {endpoint_name:5} {mode:6} '
+                  f'{result["throughputPerSecond"]:9.1f} req/s  '
+                  f'p50 {result["latencyP50Ms"]:8.2f} ms  p99 {result["latencyP99Ms"]:8.2f} ms  '
+                  f'errors {result["errors"]}  peak RSS {result["peakRssBytes"] / 1024 / 1024:7.1f} MB')
+    report = {
+        "createdAt": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpuCount": os.cpu_count(),
+        "song": {
+            "tracks": args.tracks,
+            "clipsPerTrack": args.clips,
+            "notesPerClip": args.notes,
+            "bytes": len(song_bytes)
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+'''
+Benchmarks the startup time of the devkit entry points.
+
+Every measurement runs in a fresh interpreter so that nothing is imported yet. Reports the time to import the
+package, the plugin worker modules, the Runner and the Debugger, and the time from a cold start to the first
+response of the Runner, either in-process or over a real uvicorn server.
+
+Example:
+    python benchmark/run_startup_benchmark.py --repeats 10 --output startup_output.json
+'''
+from __future__ import annotations
+import argparse
+import json
+import os
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARK_DIR = pathlib.Path(__file__).parent
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+import httpx  # noqa: E402
+from run_benchmarks import get_free_port  # noqa: E402
+
+IMPORT_SCENARIOS = {
+    "package": "import tuneflow_devkit",
+    "worker": "import tuneflow_devkit.executor_utils",
+    "runner": "from tuneflow_devkit import Runner",
+    "debugger": "from tuneflow_devkit import Debugger",
+}
+# Modules that should only be imported by the entry points that need them.
+WEB_MODULES = ['fastapi', 'starlette', 'socketio', 'engineio', 'uvicorn']
+
+IMPORT_CODE = '''
+import json, sys, time
+start_time = time.perf_counter()
+%s
+print(json.dumps({"seconds": time.perf_counter() - start_time,
+                  "webModules": [name for name in %r if name in sys.modules]}))
+'''
+
+FIRST_RESPONSE_CODE = '''
+import json, time
+start_time = time.perf_counter()
+from benchmark_plugin import create_app
+from fastapi.testclient import TestClient
+from msgpack import packb
+from tuneflow_py import Song
+app = create_app()
+app_time = time.perf_counter()
+with TestClient(app) as client:
+    client.get('/plugin-bundle-info').raise_for_status()
+    bundle_info_time = time.perf_counter()
+    client.post('/init-plugin-params', content=packb({
+        "providerId": "benchmark",
+        "pluginId": "transpose",
+        "song": Song().serialize_to_bytestring()
+    })).raise_for_status()
+    print(json.dumps({
+        "seconds": time.perf_counter() - start_time,
+        "createAppSeconds": app_time - start_time,
+        "bundleInfoSeconds": bundle_info_time - start_time
+    }))
+'''
+
+
+def get_environment(runner_config: dict | None = None):
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join(
+        [str(BENCHMARK_DIR), str(BENCHMARK_DIR.parent.joinpath('src')), environment.get("PYTHONPATH", "")])
+    environment["BENCHMARK_RUNNER_CONFIG"] = json.dumps(runner_config if runner_config is not None else {})
+    return environment
+
+
+def run_python(code: str, environment: dict):
+    '''
+    Runs `code` in a new interpreter and returns its JSON output, with the wall time of the whole process added.
+    '''
+    start_time = time.perf_counter()
+    completed_process = subprocess.run([sys.executable, '-c', code], env=environment, stdout=subprocess.PIPE,
+                                       check=True)
+    result = json.loads(completed_process.stdout.decode('utf-8').strip().splitlines()[-1])
+    result["processSeconds"] = time.perf_counter() - start_time
+    return result
+
+
+def measure_uvicorn_first_response(environment: dict, timeout=60):
+    '''
+    Returns the seconds from starting a uvicorn server to its first successful response.
+    '''
+    port = get_free_port()
+    start_time = time.perf_counter()
+    server_process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'benchmark_plugin:create_app', '--factory', '--port', str(port),
+         '--log-level', 'warning'],
+        env=environment, stdout=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                if httpx.get(f'http://127.0.0.1:{port}/plugin-bundle-info').status_code == 200:
+                    return {"seconds": time.perf_counter() - start_time}
+            except httpx.TransportError:
+                time.sleep(0.005)
+        raise Exception("uvicorn server did not start in time")
+    finally:
+        server_process.terminate()
+        server_process.wait()
+
+
+def summarize(name: str, samples: list):
+    seconds = sorted(sample["seconds"] for sample in samples)
+    summary = {
+        "scenario": name,
+        "repeats": len(samples),
+        "medianMs": statistics.median(seconds) * 1000,
+        "minMs": seconds[0] * 1000,
+        "maxMs": seconds[-1] * 1000,
+    }
+    if "processSeconds" in samples[0]:
+        summary["processMedianMs"] = statistics.median(sample["processSeconds"] for sample in samples) * 1000
+    if "webModules" in samples[0]:
+        summary["webModules"] = samples[0]["webModules"]
+    print(f'{name:26} median {summary["medianMs"]:8.1f} ms  min {summary["minMs"]:8.1f} ms  '
+          f'max {summary["maxMs"]:8.1f} ms' +
+          (f'  web modules {",".join(summary["webModules"]) or "-"}' if "webModules" in summary else ''))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the startup time of the tuneflow-devkit entry points.')
+    parser.add_argument('--scenarios', nargs='+', choices=list(IMPORT_SCENARIOS.keys()) + ['inprocess', 'uvicorn'],
+                        default=list(IMPORT_SCENARIOS.keys()) + ['inprocess', 'uvicorn'])
+    parser.add_argument('--executor', choices=['thread', 'process', 'inline'], default='thread')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', help='Path of the JSON results file.')
+    args = parser.parse_args()
+
+    environment = get_environment({"executor": {"mode": args.executor}})
+    results = []
+    for scenario in args.scenarios:
+        samples = []
+        for _ in range(args.repeats):
+            if scenario in IMPORT_SCENARIOS:
+                samples.append(run_python(IMPORT_CODE % (IMPORT_SCENARIOS[scenario], WEB_MODULES), environment))
+            elif scenario == 'inprocess':
+                samples.append(run_python(FIRST_RESPONSE_CODE, environment))
+            else:
+                samples.append(measure_uvicorn_first_response(environment))
+        name = f'import {scenario}' if scenario in IMPORT_SCENARIOS else f'first response {scenario}'
+        results.append(summarize(name, samples))
+    report = {
+        "createdAt": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpuCount": os.cpu_count(),
+        "executor": args.executor,
+        "results": results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,45 @@
-from tuneflow_devkit.debugger import Debugger
-from tuneflow_devkit.runner import Runner
+'''
+Public API of the devkit.
+
+Names are imported on first access, so that `import tuneflow_devkit` and the plugin worker processes, which only
+import `tuneflow_devkit.executor_utils`, do not pay for the web servers of the Runner and the Debugger.
+'''
+from typing import TYPE_CHECKING
+import importlib
+
+if TYPE_CHECKING:
+    from tuneflow_devkit.debugger import Debugger
+    from tuneflow_devkit.runner import Runner
+    from tuneflow_devkit.offline_runner import OfflineRunner
+    from tuneflow_devkit.cancellation_utils import JobCancelledError, get_cancellation_token
+    from tuneflow_devkit.result_store_utils import FileSystemResultStore, InMemoryResultStore, ResultStore, \
+        ResultTooLargeError
+    from tuneflow_devkit.progress_utils import report_progress
+
+_LAZY_IMPORTS = {
+    "Debugger": "tuneflow_devkit.debugger",
+    "Runner": "tuneflow_devkit.runner",
+    "OfflineRunner": "tuneflow_devkit.offline_runner",
+    "JobCancelledError": "tuneflow_devkit.cancellation_utils",
+    "get_cancellation_token": "tuneflow_devkit.cancellation_utils",
+    "FileSystemResultStore": "tuneflow_devkit.result_store_utils",
+    "InMemoryResultStore": "tuneflow_devkit.result_store_utils",
+    "ResultStore": "tuneflow_devkit.result_store_utils",
+    "ResultTooLargeError": "tuneflow_devkit.result_store_utils",
+    "report_progress": "tuneflow_devkit.progress_utils",
+}
+
+__all__ = list(_LAZY_IMPORTS.keys())
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+    # Later accesses skip this function.
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + __all__)
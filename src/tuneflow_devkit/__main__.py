@@ -0,0 +1,47 @@
+'''
+Runs a plugin over songs on disk without a server.
+
+Example:
+    python -m tuneflow_devkit --plugin my_plugin:MyPlugin --bundle bundle.json --input songs/ --output results/
+'''
+from __future__ import annotations
+from tuneflow_devkit.import_utils import load_object
+from tuneflow_devkit.executor_utils import EXECUTOR_MODES
+from tuneflow_devkit.offline_runner import OfflineRunner
+import argparse
+import json
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m tuneflow_devkit',
+                                     description='Runs a plugin over serialized songs without starting a server.')
+    parser.add_argument('--plugin', action='append', required=True,
+                        help='Plugin class as module:ClassName, can be repeated for bundles with multiple plugins.')
+    parser.add_argument('--bundle', required=True, help='Path of the bundle.json.')
+    parser.add_argument('--input', required=True,
+                        help='Directory of serialized songs, or a msgpack stream of {"id", "song", "params"} maps.')
+    parser.add_argument('--output', required=True, help='Directory to write the resulting songs, into its songs/ subdirectory, and the progress file to.')
+    parser.add_argument('--provider-id', help='Provider id of the plugin to run if the bundle has multiple plugins.')
+    parser.add_argument('--plugin-id', help='Id of the plugin to run if the bundle has multiple plugins.')
+    parser.add_argument('--params', default='{}', help='Plugin params as JSON, or @path of a JSON file.')
+    parser.add_argument('--executor', choices=EXECUTOR_MODES, default='process')
+    parser.add_argument('--workers', type=int, help='Number of workers, defaults to the number of CPUs.')
+    parser.add_argument('--progress-file', help='Progress file used to resume, defaults to OUTPUT/progress.jsonl.')
+    args = parser.parse_args()
+
+    if args.params.startswith('@'):
+        with open(args.params[1:], 'r', encoding='utf-8') as params_file:
+            params = json.load(params_file)
+    else:
+        params = json.loads(args.params)
+    offline_runner = OfflineRunner(plugin_class_list=[load_object(plugin_path) for plugin_path in args.plugin],
+                                   bundle_file_path=args.bundle)
+    stats = offline_runner.run(
+        input_path=args.input, output_dir=args.output, provider_id=args.provider_id, plugin_id=args.plugin_id,
+        params=params, mode=args.executor, max_workers=args.workers, progress_file_path=args.progress_file)
+    if stats["error"] > 0:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
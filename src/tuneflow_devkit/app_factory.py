@@ -0,0 +1,34 @@
+'''
+Creates the Runner app from environment variables, for servers that create one app in each worker process.
+
+Example:
+    TUNEFLOW_DEVKIT_PLUGINS=my_plugin:MyPlugin TUNEFLOW_DEVKIT_BUNDLE=bundle.json \
+    TUNEFLOW_DEVKIT_CONFIG=my_config:CONFIG uvicorn tuneflow_devkit.app_factory:create_app --factory --workers 4
+
+Each worker sets up its own plugins before it reports ready. Job status, cancel requests and async results are only
+visible to every worker with a shared job registry and result store, for example:
+    CONFIG = {
+        "jobs": {"registry": "sqlite", "path": "/var/run/tuneflow/jobs.db"},
+        "async": {"store": {"type": "filesystem", "directory": "/var/run/tuneflow/results"}},
+        "cache": {"directory": "/var/run/tuneflow/cache"}
+    }
+'''
+from __future__ import annotations
+from tuneflow_devkit.import_utils import load_config, load_object
+from tuneflow_devkit.runner import Runner
+import os
+
+PLUGINS_ENV = 'TUNEFLOW_DEVKIT_PLUGINS'
+BUNDLE_ENV = 'TUNEFLOW_DEVKIT_BUNDLE'
+CONFIG_ENV = 'TUNEFLOW_DEVKIT_CONFIG'
+PATH_PREFIX_ENV = 'TUNEFLOW_DEVKIT_PATH_PREFIX'
+
+
+def create_app():
+    plugins = os.environ.get(PLUGINS_ENV)
+    bundle_file_path = os.environ.get(BUNDLE_ENV)
+    if not plugins or not bundle_file_path:
+        raise Exception(f"{PLUGINS_ENV} and {BUNDLE_ENV} must be set")
+    runner = Runner(plugin_class_list=[load_object(plugin_path.strip()) for plugin_path in plugins.split(',')],
+                    bundle_file_path=bundle_file_path)
+    return runner.start(path_prefix=os.environ.get(PATH_PREFIX_ENV, '/'), config=load_config(os.environ.get(CONFIG_ENV)))
@@ -0,0 +1,135 @@
+from __future__ import annotations
+from tuneflow_devkit.compression_utils import DEFAULT_MIN_COMPRESSION_SIZE, compress_chunks, parse_header_values
+from msgpack import packb
+import hashlib
+import json
+import os
+import time
+import traceback
+
+JSON_MEDIA_TYPE = 'application/json'
+MSGPACK_MEDIA_TYPES = ['application/msgpack', 'application/x-msgpack']
+
+
+def negotiate_media_type(accept: str | None):
+    '''
+    Picks JSON or msgpack by the quality values of the `Accept` header, JSON is the default.
+    '''
+    best_media_type = JSON_MEDIA_TYPE
+    best_quality = 0.0
+    for media_type, quality in parse_header_values(accept):
+        if quality <= best_quality:
+            continue
+        if media_type in MSGPACK_MEDIA_TYPES:
+            best_media_type = MSGPACK_MEDIA_TYPES[0]
+            best_quality = quality
+        elif media_type in [JSON_MEDIA_TYPE, 'application/*', '*/*']:
+            best_media_type = JSON_MEDIA_TYPE
+            best_quality = quality
+    return best_media_type
+
+
+def accepts_gzip(accept_encoding: str | None):
+    return any(encoding in ['gzip', '*'] and quality > 0 for encoding, quality in parse_header_values(accept_encoding))
+
+
+def etag_matches(if_none_match: str | None, etag: str):
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        # If-None-Match uses the weak comparison.
+        if candidate == '*' or (candidate[2:] if candidate.startswith('W/') else candidate) == etag:
+            return True
+    return False
+
+
+class EncodedBundleInfo:
+    def __init__(self, bundle_info: dict, compress=True) -> None:
+        '''
+        Bundle info serialized once as JSON and msgpack, optionally pre-gzipped, with a strong ETag per encoding.
+        '''
+        self.bundle_info = bundle_info
+        # Same encoding as FastAPI's JSONResponse.
+        json_body = json.dumps(bundle_info, ensure_ascii=False, allow_nan=False, indent=None,
+                               separators=(",", ":")).encode("utf-8")
+        content_hash = hashlib.sha256(json_body).hexdigest()[:32]
+        self._representations = {}
+        for media_type, body in [(JSON_MEDIA_TYPE, json_body), (MSGPACK_MEDIA_TYPES[0], packb(bundle_info))]:
+            format_name = media_type.split('/')[1]
+            self._representations[(media_type, False)] = (body, f'"{content_hash}-{format_name}"')
+            if compress and len(body) >= DEFAULT_MIN_COMPRESSION_SIZE:
+                self._representations[(media_type, True)] = (compress_chunks([body], 'gzip'), f'"{content_hash}-{format_name}-gzip"')
+
+    def get_response(self, accept: str | None = None, accept_encoding: str | None = None,
+                     if_none_match: str | None = None, cache_control='no-cache'):
+        '''
+        Returns the status code, body and headers of the representation that matches the request headers.
+        '''
+        media_type = negotiate_media_type(accept)
+        use_gzip = accepts_gzip(accept_encoding) and (media_type, True) in self._representations
+        body, etag = self._representations[(media_type, use_gzip)]
+        headers = {
+            "ETag": etag,
+            "Cache-Control": cache_control,
+            "Vary": "Accept, Accept-Encoding"
+        }
+        if etag_matches(if_none_match, etag):
+            return 304, b'', headers
+        headers["Content-Type"] = media_type
+        if use_gzip:
+            headers["Content-Encoding"] = 'gzip'
+        return 200, body, headers
+
+
+class BundleInfoStore:
+    def __init__(self, bundle_file_path: str, load_bundle_info, bundle_info: dict | None = None, compress=True,
+                 reload_interval: float | None = None) -> None:
+        '''
+        Holds the encoded bundle info and reloads it when the bundle file changes.
+
+        `load_bundle_info()` reads and validates the bundle file. If `reload_interval` is set, the file is checked
+        for changes at most once per interval when the bundle info is requested.
+        '''
+        self.bundle_file_path = bundle_file_path
+        self.reload_interval = reload_interval
+        self._load_bundle_info = load_bundle_info
+        self._compress = compress
+        self._file_signature = self._get_file_signature()
+        self._last_check_time = time.monotonic()
+        self._encoded_bundle_info = EncodedBundleInfo(
+            bundle_info if bundle_info is not None else load_bundle_info(), compress=compress)
+
+    def _get_file_signature(self):
+        try:
+            file_stat = os.stat(self.bundle_file_path)
+        except FileNotFoundError:
+            return None
+        return (file_stat.st_mtime_ns, file_stat.st_size)
+
+    def get(self):
+        if self.reload_interval is not None and time.monotonic() - self._last_check_time >= self.reload_interval:
+            self._last_check_time = time.monotonic()
+            if self._get_file_signature() != self._file_signature:
+                self.reload()
+        return self._encoded_bundle_info
+
+    def reload(self):
+        '''
+        Reloads the bundle file and invalidates the cached encodings.
+
+        Keeps serving the previous bundle info and returns False if the new file is invalid.
+        '''
+        file_signature = self._get_file_signature()
+        try:
+            encoded_bundle_info = EncodedBundleInfo(self._load_bundle_info(), compress=self._compress)
+        except Exception:
+            print(f'Failed to reload bundle file {self.bundle_file_path}')
+            print(traceback.format_exc())
+            # Do not retry until the file changes again.
+            self._file_signature = file_signature
+            return False
+        self._file_signature = file_signature
+        self._encoded_bundle_info = encoded_bundle_info
+        print(f'Reloaded bundle file {self.bundle_file_path}')
+        return True
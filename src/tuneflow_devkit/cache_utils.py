@@ -0,0 +1,205 @@
+from __future__ import annotations
+from typing import Dict
+from collections import OrderedDict
+from msgpack import packb, unpackb
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+
+
+def canonicalize(value):
+    '''
+    Recursively sorts dict keys so that equal params always pack to the same bytes.
+    '''
+    if isinstance(value, dict):
+        return {key: canonicalize(value[key]) for key in sorted(value.keys(), key=str)}
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(item) for item in value]
+    return value
+
+
+def hash_song(song_bytes: bytes):
+    return hashlib.sha256(song_bytes).hexdigest()
+
+
+def compute_cache_key(task_name: str, provider_id: str, plugin_id: str, params, song_bytes: bytes):
+    key_hash = hashlib.sha256(packb([task_name, provider_id, plugin_id, canonicalize(params)]))
+    key_hash.update(hash_song(song_bytes).encode('ascii'))
+    return key_hash.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_memory_bytes=256 * 1024 * 1024, directory: str | None = None,
+                 max_disk_bytes=1024 * 1024 * 1024) -> None:
+        '''
+        Content-addressed cache of plugin results.
+
+        Results are kept packed in an in-memory LRU and, if `directory` is set, in an on-disk tier that evicts
+        the least recently used files once it grows beyond `max_disk_bytes`.
+        '''
+        self.max_memory_bytes = max_memory_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._memory_entries: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._hits = 0
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            for file_name in os.listdir(directory):
+                if not file_name.endswith('.tmp'):
+                    self._disk_bytes += os.path.getsize(os.path.join(directory, file_name))
+
+    def get(self, key: str):
+        '''
+        Returns the cached result or None.
+
+        Reading the disk tier does blocking IO, call this from a worker thread when it is enabled.
+        '''
+        with self._lock:
+            if key in self._memory_entries:
+                self._memory_entries.move_to_end(key)
+                self._hits += 1
+                self._memory_hits += 1
+                return unpackb(self._memory_entries[key])
+        packed_result = self._read_from_disk(key)
+        with self._lock:
+            if packed_result is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._disk_hits += 1
+            self._put_in_memory(key, packed_result)
+        return unpackb(packed_result)
+
+    def put(self, key: str, result: dict):
+        packed_result = packb(result)
+        with self._lock:
+            self._put_in_memory(key, packed_result)
+        self._write_to_disk(key, packed_result)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "memoryHits": self._memory_hits,
+                "diskHits": self._disk_hits,
+                "misses": self._misses,
+                "memoryEntries": len(self._memory_entries),
+                "memoryBytes": self._memory_bytes,
+                "diskBytes": self._disk_bytes
+            }
+
+    def _put_in_memory(self, key: str, packed_result: bytes):
+        if len(packed_result) > self.max_memory_bytes:
+            return
+        if key in self._memory_entries:
+            self._memory_bytes -= len(self._memory_entries.pop(key))
+        self._memory_entries[key] = packed_result
+        self._memory_bytes += len(packed_result)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted_result = self._memory_entries.popitem(last=False)
+            self._memory_bytes -= len(evicted_result)
+
+    def _get_file_path(self, key: str):
+        return os.path.join(self.directory, key)  # type: ignore
+
+    def _read_from_disk(self, key: str):
+        if self.directory is None:
+            return None
+        file_path = self._get_file_path(key)
+        try:
+            with open(file_path, 'rb') as cache_file:
+                packed_result = cache_file.read()
+            # Mark the entry as recently used for eviction.
+            os.utime(file_path)
+            return packed_result
+        except FileNotFoundError:
+            return None
+
+    def _write_to_disk(self, key: str, packed_result: bytes):
+        if self.directory is None or len(packed_result) > self.max_disk_bytes:
+            return
+        file_path = self._get_file_path(key)
+        if os.path.exists(file_path):
+            return
+        # Write to a temporary file first so that readers never see partial results.
+        file_descriptor, temp_file_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(file_descriptor, 'wb') as temp_file:
+            temp_file.write(packed_result)
+        os.replace(temp_file_path, file_path)
+        with self._lock:
+            self._disk_bytes += len(packed_result)
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+        self._evict_from_disk()
+
+    def _evict_from_disk(self):
+        cache_files = []
+        for file_name in os.listdir(self.directory):  # type: ignore
+            if file_name.endswith('.tmp'):
+                continue
+            file_path = os.path.join(self.directory, file_name)  # type: ignore
+            try:
+                file_stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            cache_files.append((file_stat.st_mtime, file_stat.st_size, file_path))
+        cache_files.sort()
+        disk_bytes = sum(file_size for _, file_size, _ in cache_files)
+        for _, file_size, file_path in cache_files:
+            if disk_bytes <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            disk_bytes -= file_size
+        with self._lock:
+            self._disk_bytes = disk_bytes
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        '''
+        Coalesces identical in-flight jobs so that they share one execution.
+
+        Callers receive the same result object, and must copy it before modifying it.
+        '''
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._leaders = 0
+        self._followers = 0
+
+    def get(self, key: str):
+        '''
+        Returns the future of the in-flight job with the same key, or None.
+        '''
+        if key not in self._calls:
+            return None
+        self._followers += 1
+        return asyncio.shield(self._calls[key])
+
+    def start(self, key: str, coroutine):
+        future = asyncio.ensure_future(coroutine)
+        self._calls[key] = future
+        self._leaders += 1
+
+        def remove_call(_):
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        future.add_done_callback(remove_call)
+        # Shielded so that a disconnected caller does not cancel the execution shared with others.
+        return asyncio.shield(future)
+
+    def get_stats(self):
+        return {
+            "inFlight": len(self._calls),
+            "executions": self._leaders,
+            "coalesced": self._followers
+        }
@@ -0,0 +1,108 @@
+from __future__ import annotations
+import threading
+import time
+
+CANCELLED = 'CANCELLED'
+TIMEOUT = 'TIMEOUT'
+
+
+class JobCancelledError(Exception):
+    def __init__(self, status=CANCELLED) -> None:
+        super().__init__(f"Job was stopped: {status}")
+        self.status = status
+
+    def __reduce__(self):
+        return (JobCancelledError, (self.status,))
+
+
+class CancellationToken:
+    def __init__(self, timeout: float | None = None, deadline: float | None = None) -> None:
+        '''
+        Tells a running job that it should stop, either because it was cancelled or because its deadline passed.
+
+        `deadline` is a `time.time()` timestamp so that it can be shared with worker processes.
+        '''
+        if deadline is None and timeout is not None:
+            deadline = time.time() + timeout
+        self.deadline = deadline
+        self._status: str | None = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def status(self):
+        '''
+        `CANCELLED` or `TIMEOUT` once the job should stop, otherwise None.
+        '''
+        if self._status is not None:
+            return self._status
+        if self.deadline is not None and time.time() >= self.deadline:
+            return TIMEOUT
+        return None
+
+    def is_cancelled(self):
+        return self.status is not None
+
+    def raise_if_cancelled(self):
+        '''
+        Raises `JobCancelledError` if the job should stop, plugins can call this between steps of long runs.
+        '''
+        status = self.status
+        if status is not None:
+            raise JobCancelledError(status)
+
+    def get_remaining_time(self):
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.time())
+
+    def cancel(self, status=CANCELLED):
+        with self._lock:
+            if self._status is not None:
+                return
+            self._status = status
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback):
+        '''
+        Calls `callback()` once the token is cancelled, possibly from another thread.
+
+        Passing the deadline does not call it, check `get_remaining_time()` for that.
+        '''
+        with self._lock:
+            if self._status is None:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+# Token of the job running in the current thread.
+_local = threading.local()
+_never_cancelled_token = CancellationToken()
+
+
+def get_cancellation_token() -> CancellationToken:
+    '''
+    Returns the cancellation token of the job running in the current thread.
+
+    Outside of a job, or if the job has no deadline, the returned token is never cancelled.
+    '''
+    token = getattr(_local, 'token', None)
+    return token if token is not None else _never_cancelled_token
+
+
+def run_with_cancellation_token(cancellation_token: CancellationToken | None, function, *args):
+    previous_token = getattr(_local, 'token', None)
+    _local.token = cancellation_token
+    try:
+        return function(*args)
+    finally:
+        _local.token = previous_token
@@ -0,0 +1,231 @@
+from __future__ import annotations
+from tuneflow_devkit.compression_utils import decompress_chunks, parse_header_values
+from msgpack import packb, unpackb
+import asyncio
+import re
+import struct
+import time
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# Compressed bodies are decoded in chunks of this size so that the decoded size can be checked while it grows.
+DECOMPRESSION_CHUNK_SIZE = 64 * 1024
+# Declared body sizes up to this are preallocated when no body size limit is configured, larger bodies grow the
+# buffer as they arrive so that a forged Content-Length cannot allocate memory up front.
+MAX_PREALLOCATED_BODY_SIZE = 64 * 1024 * 1024
+# Msgpack type bytes followed by a big-endian length, mapped to the object type and the length size.
+_SIZED_HEADERS = {
+    0xc4: ('bin', 1), 0xc5: ('bin', 2), 0xc6: ('bin', 4),
+    0xd9: ('scalar', 1), 0xda: ('scalar', 2), 0xdb: ('scalar', 4),
+    0xdc: ('array', 2), 0xdd: ('array', 4),
+    0xde: ('map', 2), 0xdf: ('map', 4),
+}
+_FIXED_SIZES = {
+    0xca: 4, 0xcb: 8, 0xcc: 1, 0xcd: 2, 0xce: 4, 0xcf: 8, 0xd0: 1, 0xd1: 2, 0xd2: 4, 0xd3: 8,
+}
+_EXT_SIZES = {0xd4: 1, 0xd5: 2, 0xd6: 4, 0xd7: 8, 0xd8: 16}
+_VARIABLE_EXT_LENGTH_SIZES = {0xc7: 1, 0xc8: 2, 0xc9: 4}
+# ASCII digits only, `str.isdigit` also accepts digits like '²' that `int` cannot parse.
+_CONTENT_LENGTH_PATTERN = re.compile(r'[0-9]+')
+
+
+class BodyTooLargeError(Exception):
+    pass
+
+
+class InvalidContentLengthError(Exception):
+    pass
+
+
+def parse_content_length(content_length: str | None):
+    '''
+    Returns the size declared in a `Content-Length` header, or None if there is no header. Raises
+    `InvalidContentLengthError` if the header is not a non-negative integer.
+    '''
+    if content_length is None:
+        return None
+    content_length = content_length.strip()
+    if _CONTENT_LENGTH_PATTERN.fullmatch(content_length) is None:
+        raise InvalidContentLengthError(f"Invalid Content-Length {content_length!r}")
+    return int(content_length)
+
+
+def _read_uint(data, offset: int, size: int):
+    if offset + size > len(data):
+        raise ValueError("Unexpected end of msgpack data")
+    return int.from_bytes(data[offset:offset + size], 'big')
+
+
+def _get_header(data, offset: int):
+    '''
+    Returns the type of the object at `offset` (map, array, bin or scalar), its header size, the size of its
+    payload in bytes for scalars and bins, or its item count for maps and arrays.
+    '''
+    if offset >= len(data):
+        raise ValueError("Unexpected end of msgpack data")
+    first_byte = data[offset]
+    if first_byte <= 0x7f or first_byte >= 0xe0 or 0xc0 <= first_byte <= 0xc3:
+        return 'scalar', 1, 0
+    if 0x80 <= first_byte <= 0x8f:
+        return 'map', 1, first_byte & 0x0f
+    if 0x90 <= first_byte <= 0x9f:
+        return 'array', 1, first_byte & 0x0f
+    if 0xa0 <= first_byte <= 0xbf:
+        return 'scalar', 1, first_byte & 0x1f
+    if first_byte in _SIZED_HEADERS:
+        object_type, length_size = _SIZED_HEADERS[first_byte]
+        return object_type, 1 + length_size, _read_uint(data, offset + 1, length_size)
+    if first_byte in _FIXED_SIZES:
+        return 'scalar', 1, _FIXED_SIZES[first_byte]
+    # Ext payloads are preceded by their type byte.
+    if first_byte in _EXT_SIZES:
+        return 'scalar', 2, _EXT_SIZES[first_byte]
+    if first_byte in _VARIABLE_EXT_LENGTH_SIZES:
+        length_size = _VARIABLE_EXT_LENGTH_SIZES[first_byte]
+        return 'scalar', 2 + length_size, _read_uint(data, offset + 1, length_size)
+    raise ValueError(f"Invalid msgpack type byte 0x{first_byte:02x}")
+
+
+def _skip_object(data, offset: int):
+    '''
+    Returns the offset right after the object starting at `offset`.
+    '''
+    remaining_count = 1
+    while remaining_count > 0:
+        remaining_count -= 1
+        object_type, header_size, size = _get_header(data, offset)
+        offset += header_size
+        if object_type == 'map':
+            remaining_count += 2 * size
+        elif object_type == 'array':
+            remaining_count += size
+        else:
+            offset += size
+    if offset > len(data):
+        raise ValueError("Unexpected end of msgpack data")
+    return offset
+
+
+def unpack_with_views(data):
+    '''
+    Unpacks a msgpack map like `unpackb`, except that top-level binary values are returned as memoryview slices of
+    `data` instead of copies.
+
+    The slices keep `data` alive, and `data` must not be modified while they are in use.
+    '''
+    data_view = memoryview(data)
+    object_type, header_size, item_count = _get_header(data_view, 0)
+    if object_type != 'map':
+        return unpackb(data_view)
+    result = {}
+    offset = header_size
+    for _ in range(item_count):
+        value_offset = _skip_object(data_view, offset)
+        key = unpackb(data_view[offset:value_offset])
+        offset = _skip_object(data_view, value_offset)
+        value_type, value_header_size, _ = _get_header(data_view, value_offset)
+        if value_type == 'bin':
+            result[key] = data_view[value_offset + value_header_size:offset]
+        else:
+            result[key] = unpackb(data_view[value_offset:offset])
+    if offset != len(data_view):
+        raise ValueError("Extra data after the msgpack map")
+    return result
+
+
+def decompress_body(data, content_encoding: str | None, max_size: int | None = None):
+    '''
+    Decodes a body sent with `Content-Encoding`, encodings applied in sequence are removed in reverse order.
+
+    Raises `BodyTooLargeError` as soon as the decoded size goes beyond `max_size`, `UnsupportedEncodingError`
+    for unknown encodings and `InvalidCompressedDataError` for corrupt or truncated bodies.
+    '''
+    encodings = [encoding for encoding, _ in parse_header_values(content_encoding) if encoding != 'identity']
+    for encoding in reversed(encodings):
+        decompressed_chunks = []
+        decompressed_size = 0
+        for decompressed_chunk in decompress_chunks(data, encoding, DECOMPRESSION_CHUNK_SIZE):
+            decompressed_size += len(decompressed_chunk)
+            if max_size is not None and decompressed_size > max_size:
+                raise BodyTooLargeError(f"Decompressed request body exceeds the limit of {max_size} bytes")
+            decompressed_chunks.append(decompressed_chunk)
+        data = b''.join(decompressed_chunks)
+    return data
+
+
+async def read_msgpack_body(request, max_body_size: int | None = None, stats: dict | None = None):
+    '''
+    Reads the request body into a single buffer and decodes it with `unpack_with_views`, so that the embedded
+    song is parsed directly from the request buffer.
+
+    Compressed bodies are decoded in a thread first. Raises `BodyTooLargeError` as soon as the declared, received
+    or decompressed size goes beyond `max_body_size`, `InvalidContentLengthError` for a malformed header and
+    `InvalidCompressedDataError` for a corrupt or truncated compressed body.
+    If `stats` is given, the body size and the read and unpack durations are recorded in it.
+    '''
+    start_time = time.perf_counter()
+    content_length = parse_content_length(request.headers.get('content-length'))
+    if max_body_size is not None and content_length is not None and content_length > max_body_size:
+        raise BodyTooLargeError(f"Request body of {content_length} bytes exceeds the limit of {max_body_size} bytes")
+    # Preallocate the declared size to avoid growing the buffer while reading.
+    preallocated_size = 0
+    if content_length is not None and (max_body_size is not None or content_length <= MAX_PREALLOCATED_BODY_SIZE):
+        preallocated_size = content_length
+    body_buffer = bytearray(preallocated_size)
+    received_size = 0
+    async for chunk in request.stream():
+        chunk_end = received_size + len(chunk)
+        if max_body_size is not None and chunk_end > max_body_size:
+            raise BodyTooLargeError(f"Request body exceeds the limit of {max_body_size} bytes")
+        if chunk_end <= len(body_buffer):
+            body_buffer[received_size:chunk_end] = chunk
+        else:
+            del body_buffer[received_size:]
+            body_buffer.extend(chunk)
+        received_size = chunk_end
+    del body_buffer[received_size:]
+    content_encoding = request.headers.get('content-encoding')
+    body_data = body_buffer
+    if content_encoding:
+        body_data = await asyncio.get_event_loop().run_in_executor(
+            None, decompress_body, body_buffer, content_encoding, max_body_size)
+    read_end_time = time.perf_counter()
+    body = unpack_with_views(body_data)
+    if stats is not None:
+        stats["size"] = received_size
+        stats["readBody"] = read_end_time - start_time
+        stats["unpack"] = time.perf_counter() - read_end_time
+    return body
+
+
+def pack_map_header(size: int):
+    if size < 16:
+        return struct.pack('B', 0x80 | size)
+    if size < 2 ** 16:
+        return struct.pack('>BH', 0xde, size)
+    return struct.pack('>BI', 0xdf, size)
+
+
+def pack_bin_header(size: int):
+    if size < 2 ** 8:
+        return struct.pack('>BB', 0xc4, size)
+    if size < 2 ** 16:
+        return struct.pack('>BH', 0xc5, size)
+    return struct.pack('>BI', 0xc6, size)
+
+
+def get_packed_chunks(response: dict, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''
+    Splits the packed response into chunks without packing large binary values into a new buffer.
+
+    The concatenated chunks are identical to `packb(response)`.
+    '''
+    chunks = [pack_map_header(len(response))]
+    for key, value in response.items():
+        if isinstance(value, (bytes, bytearray)) and len(value) > chunk_size:
+            chunks.append(packb(key) + pack_bin_header(len(value)))
+            value_view = memoryview(value)
+            for offset in range(0, len(value), chunk_size):
+                chunks.append(value_view[offset:offset + chunk_size])
+        else:
+            chunks.append(packb(key) + packb(value))
+    return chunks
@@ -0,0 +1,219 @@
+from __future__ import annotations
+from typing import List
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preferred order when the client accepts several encodings equally.
+DEFAULT_ENCODINGS = ['zstd', 'br', 'gzip']
+DEFAULT_COMPRESSION_LEVELS = {
+    'gzip': 6,
+    'zstd': 3,
+    'br': 4
+}
+# Compressing tiny bodies only adds overhead.
+DEFAULT_MIN_COMPRESSION_SIZE = 1024
+_ZSTD_FRAME_MAGIC = 0xfd2fb528
+_ZSTD_SKIPPABLE_FRAME_MAGIC = 0x184d2a50
+_DECOMPRESSION_ERRORS = tuple([zlib.error] + ([zstandard.ZstdError] if zstandard is not None else []) +
+                              ([brotli.error] if brotli is not None else []))
+
+
+class UnsupportedEncodingError(Exception):
+    pass
+
+
+class InvalidCompressedDataError(Exception):
+    pass
+
+
+def get_available_encodings():
+    '''
+    Returns the content encodings supported in this environment, zstd and br need the `zstandard` and `brotli`
+    packages.
+    '''
+    encodings = ['gzip']
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    return encodings
+
+
+def parse_header_values(header: str | None):
+    '''
+    Parses a header like `Accept` into (value, quality) pairs.
+    '''
+    if not header:
+        return []
+    values = []
+    for item in header.split(','):
+        parts = item.strip().split(';')
+        quality = 1.0
+        for parameter in parts[1:]:
+            name, _, value = parameter.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        values.append((parts[0].strip().lower(), quality))
+    return values
+
+
+def negotiate_encoding(accept_encoding: str | None, encodings: List[str]):
+    '''
+    Picks the encoding of `encodings` with the highest quality in the `Accept-Encoding` header, ties go to the
+    earlier encoding. Returns None if the response should not be compressed.
+    '''
+    qualities = dict(parse_header_values(accept_encoding))
+    best_encoding = None
+    best_quality = 0.0
+    for encoding in encodings:
+        quality = qualities[encoding] if encoding in qualities else qualities.get('*', 0.0)
+        if quality > best_quality:
+            best_encoding = encoding
+            best_quality = quality
+    return best_encoding
+
+
+def _create_compressor(encoding: str, level: int | None):
+    if encoding not in get_available_encodings():
+        raise UnsupportedEncodingError(f"Unsupported content encoding {encoding}")
+    if level is None:
+        level = DEFAULT_COMPRESSION_LEVELS[encoding]
+    if encoding == 'gzip':
+        # zlib writes a zero mtime, so the same input always gives the same bytes.
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress, compressor.flush
+    if encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=level).compressobj()  # type: ignore
+        return compressor.compress, compressor.flush
+    compressor = brotli.Compressor(quality=level)  # type: ignore
+    return compressor.process, compressor.finish
+
+
+def compress_chunks(chunks, encoding: str, level: int | None = None):
+    '''
+    Compresses the concatenation of `chunks` without joining them first.
+
+    zlib, zstandard and brotli release the GIL while compressing, so this can run in a thread next to the event loop.
+    '''
+    compress, flush = _create_compressor(encoding, level)
+    compressed_chunks = [compress(chunk) for chunk in chunks]
+    compressed_chunks.append(flush())
+    return b''.join(compressed_chunks)
+
+
+def _check_zstd_frames(data):
+    '''
+    Walks the frame and block headers of zstd data, without decompressing the blocks, and raises
+    `InvalidCompressedDataError` if the data ends in the middle of a frame.
+
+    `zstandard` readers return a truncated stream as if it had ended normally.
+    '''
+    def read_uint(offset: int, size: int):
+        if offset + size > len(data):
+            raise InvalidCompressedDataError("Compressed data ends in the middle of a zstd frame")
+        return int.from_bytes(data[offset:offset + size], 'little')
+
+    offset = 0
+    while offset < len(data):
+        magic = read_uint(offset, 4)
+        offset += 4
+        if magic & 0xfffffff0 == _ZSTD_SKIPPABLE_FRAME_MAGIC:
+            offset += 4 + read_uint(offset, 4)
+            continue
+        if magic != _ZSTD_FRAME_MAGIC:
+            raise InvalidCompressedDataError("Invalid zstd frame")
+        descriptor = read_uint(offset, 1)
+        single_segment = (descriptor >> 5) & 1
+        offset += 1 + (1 - single_segment) + [0, 1, 2, 4][descriptor & 0x03] + \
+            [single_segment, 2, 4, 8][descriptor >> 6]
+        is_last_block = False
+        while not is_last_block:
+            block_header = read_uint(offset, 3)
+            is_last_block = block_header & 1
+            # RLE blocks store a single byte that is repeated block size times.
+            offset += 3 + (1 if (block_header >> 1) & 0x03 == 1 else block_header >> 3)
+        # Content checksum.
+        offset += 4 if (descriptor >> 2) & 1 else 0
+    if offset > len(data):
+        raise InvalidCompressedDataError("Compressed data ends in the middle of a zstd frame")
+
+
+def _decompress_zlib_chunks(data, wbits: int, chunk_size: int):
+    decompressor = zlib.decompressobj(wbits)
+    for start in range(0, len(data), chunk_size):
+        pending_data = data[start:start + chunk_size]
+        while True:
+            chunk = decompressor.decompress(pending_data, chunk_size)
+            if len(chunk) > 0:
+                yield chunk
+            pending_data = decompressor.unconsumed_tail
+            # A full output chunk may leave more output buffered inside zlib.
+            if decompressor.eof or (len(pending_data) == 0 and len(chunk) < chunk_size):
+                break
+        if decompressor.eof:
+            break
+    if not decompressor.eof:
+        raise InvalidCompressedDataError("Compressed data ends before the end of the stream")
+
+
+def _decompress_zstd_chunks(data, chunk_size: int):
+    _check_zstd_frames(data)
+    reader = zstandard.ZstdDecompressor().stream_reader(data, read_across_frames=True)  # type: ignore
+    while True:
+        chunk = reader.read(chunk_size)
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def _decompress_brotli_chunks(data, chunk_size: int):
+    decompressor = brotli.Decompressor()  # type: ignore
+    for start in range(0, len(data), chunk_size):
+        chunk = decompressor.process(data[start:start + chunk_size], output_buffer_limit=chunk_size)
+        while True:
+            if len(chunk) > 0:
+                yield chunk
+            # Output stops growing once it reaches the limit, a shorter chunk means the input slice is used up.
+            if decompressor.is_finished() or (len(chunk) < chunk_size and decompressor.can_accept_more_data()):
+                break
+            chunk = decompressor.process(b'', output_buffer_limit=chunk_size)
+        if decompressor.is_finished():
+            break
+    if not decompressor.is_finished():
+        raise InvalidCompressedDataError("Compressed data ends before the end of the stream")
+
+
+def decompress_chunks(data, encoding: str, chunk_size: int):
+    '''
+    Decompresses `data` and yields the output in chunks of about `chunk_size` bytes, so that a caller can stop
+    before a highly compressed body is fully expanded. brotli chunks can be larger by one internal buffer of the
+    decoder.
+
+    Raises `UnsupportedEncodingError` for unknown encodings and `InvalidCompressedDataError` for corrupt or
+    truncated data.
+    '''
+    data = memoryview(data)
+    try:
+        if encoding in ['gzip', 'x-gzip']:
+            yield from _decompress_zlib_chunks(data, 16 + zlib.MAX_WBITS, chunk_size)
+        elif encoding == 'deflate':
+            yield from _decompress_zlib_chunks(data, zlib.MAX_WBITS, chunk_size)
+        elif encoding == 'zstd' and zstandard is not None:
+            yield from _decompress_zstd_chunks(data, chunk_size)
+        elif encoding == 'br' and brotli is not None:
+            yield from _decompress_brotli_chunks(data, chunk_size)
+        else:
+            raise UnsupportedEncodingError(f"Unsupported content encoding {encoding}")
+    except _DECOMPRESSION_ERRORS as e:
+        raise InvalidCompressedDataError(f"Invalid {encoding} data: {e}")
@@ -2,27 +2,136 @@ from __future__ import annotations
 import socketio
 import uvicorn
 from tuneflow_py import TuneflowPlugin, Song
-from typing import Type
+from typing import Dict, Type
 import traceback
 from tuneflow_devkit.translate_utils import translate_label
 import asyncio
 import functools
 import json
 from tuneflow_devkit.validation_utils import validate_plugin, find_match_plugin_info
-from msgpack import unpackb, packb
+from tuneflow_devkit.delta_utils import RESPONSE_MODES, get_song_response
+from tuneflow_devkit.song_utils import deserialize_plugin_song
+from tuneflow_devkit.codec_utils import unpack_with_views
+from tuneflow_devkit.progress_utils import ProgressReporter, run_with_progress_reporter
+from tuneflow_devkit.cancellation_utils import CancellationToken, JobCancelledError, run_with_cancellation_token
+from concurrent.futures import ThreadPoolExecutor
+from msgpack import packb, unpackb
+import importlib
+import os
+import sys
+import threading
+import time
+import uuid
+
+# How often the plugin module is checked for changes when hot reload is on.
+RELOAD_POLL_INTERVAL = 0.5
+# Largest Socket.IO message, larger songs are sent in chunks.
+DEFAULT_MAX_MESSAGE_SIZE = 100 * 1024 * 1024
+DEFAULT_MAX_SONG_SIZE = 1024 * 1024 * 1024
+# Chunked songs that were started but not used yet, per session.
+MAX_PENDING_TRANSFERS = 4
+
+
+class DebugSession:
+    def __init__(self, sid: str) -> None:
+        '''
+        State of one connected TuneFlow instance.
+        '''
+        self.sid = sid
+        self.lock = asyncio.Lock()
+        self.cancellation_token: CancellationToken | None = None
+        # Chunks of each transfer by index, so that memory only grows with the chunks actually received.
+        self._transfers: Dict[str, Dict[int, bytes]] = {}
+        self._transfer_totals: Dict[str, int] = {}
+        self._transfer_sizes: Dict[str, int] = {}
+
+    def receive_chunk(self, transfer_id: str, index: int, total: int, data, max_size: int):
+        '''
+        Stores chunk `index` of `total` chunks of a song, chunks can arrive in any order and a resent chunk replaces
+        the earlier one.
+        '''
+        if transfer_id not in self._transfers:
+            if len(self._transfers) >= MAX_PENDING_TRANSFERS:
+                raise Exception("Too many pending song transfers")
+            if total <= 0:
+                raise Exception(f"Invalid chunk count {total}")
+            self._transfers[transfer_id] = {}
+            self._transfer_totals[transfer_id] = total
+            self._transfer_sizes[transfer_id] = 0
+        chunks = self._transfers[transfer_id]
+        if total != self._transfer_totals[transfer_id] or index < 0 or index >= total:
+            self.discard_transfer(transfer_id)
+            raise Exception(f"Invalid chunk {index} of {total} for song transfer {transfer_id}")
+        transfer_size = self._transfer_sizes[transfer_id] + len(data)
+        if index in chunks:
+            transfer_size -= len(chunks[index])
+        if transfer_size > max_size:
+            self.discard_transfer(transfer_id)
+            raise Exception(f"Song transfer {transfer_id} is larger than {max_size} bytes")
+        chunks[index] = bytes(data)
+        self._transfer_sizes[transfer_id] = transfer_size
+
+    def take_song(self, transfer_id: str):
+        '''
+        Returns the song of a completed transfer and forgets the transfer.
+        '''
+        if transfer_id not in self._transfers:
+            raise Exception(f"Unknown song transfer {transfer_id}")
+        chunks = self._transfers[transfer_id]
+        total = self._transfer_totals[transfer_id]
+        self.discard_transfer(transfer_id)
+        if len(chunks) != total:
+            raise Exception(f"Song transfer {transfer_id} is incomplete")
+        return b''.join(chunks[index] for index in range(total))
+
+    def discard_transfer(self, transfer_id: str):
+        self._transfers.pop(transfer_id, None)
+        self._transfer_totals.pop(transfer_id, None)
+        self._transfer_sizes.pop(transfer_id, None)
 
 
 class Debugger:
-    def __init__(self, plugin_class: Type[TuneflowPlugin], bundle_file_path: str) -> None:
+    def __init__(self, plugin_class: Type[TuneflowPlugin], bundle_file_path: str, hot_reload=False,
+                 replay_file_path: str | None = None, host='127.0.0.1', port=18818, max_workers: int | None = None,
+                 max_message_size=DEFAULT_MAX_MESSAGE_SIZE, max_song_size=DEFAULT_MAX_SONG_SIZE) -> None:
         '''
         Creates a local debug server for a single plugin.
+
+        Several TuneFlow instances can connect at the same time, each session runs one plugin at a time on a pool of
+        `max_workers` threads. Songs larger than `max_message_size` have to be sent in `song-chunk` events, up to
+        `max_song_size` bytes.
+
+        With `hot_reload` the module of the plugin is reloaded whenever its file changes, and the last input received
+        from TuneFlow is replayed against the new code. The last input is also saved to `replay_file_path` if given,
+        so that it can be replayed after a restart.
         '''
 
         if plugin_class is None or bundle_file_path is None:
             raise Exception("plugin_class and bundle_file must be provided")
-        validate_plugin(plugin_class=plugin_class)
+        self._bundle_file_path = bundle_file_path
+        self._plugin_info = self._load_plugin_info(plugin_class)
         self._plugin_class = plugin_class
-        with open(bundle_file_path, 'rb') as bundle_file:
+
+        self._sessions: Dict[str, DebugSession] = {}
+        self._sio: None | socketio.AsyncServer = None
+        self._executor: ThreadPoolExecutor | None = None
+        self.host = host
+        self.port = port
+        self.max_workers = max_workers
+        self.max_message_size = max_message_size
+        self.max_song_size = max_song_size
+        self.hot_reload = hot_reload
+        self.replay_file_path = replay_file_path
+        self._last_input: dict | None = None
+        self._replay_lock = threading.Lock()
+        self._watched_mtimes = self._get_watched_mtimes()
+        if replay_file_path is not None and os.path.exists(replay_file_path):
+            with open(replay_file_path, 'rb') as replay_file:
+                self._last_input = unpackb(replay_file.read())
+
+    def _load_plugin_info(self, plugin_class: Type[TuneflowPlugin]):
+        validate_plugin(plugin_class=plugin_class)
+        with open(self._bundle_file_path, 'rb') as bundle_file:
             bundle_info = json.load(bundle_file)
             # Validate plugin and bundle.
             plugin_info = find_match_plugin_info(
@@ -31,101 +140,328 @@ class Debugger:
             if plugin_info is None:
                 raise Exception(
                     "plugin not specified in the bundle, check your bundle.json. For more information checkout https://github.com/tuneflow/tuneflow-py")
-            self._plugin_info = plugin_info
+            return plugin_info
 
-        self._daw_sid: None | str = None
-        self._sio: None | socketio.AsyncServer = None
-        self.port = 18818
+    def _get_watched_file_paths(self):
+        file_paths = [self._bundle_file_path]
+        module = sys.modules.get(self._plugin_class.__module__)
+        module_file_path = getattr(module, '__file__', None)
+        if module_file_path is not None:
+            file_paths.append(module_file_path)
+        return file_paths
 
-    def start(self):
-        # create a Socket.IO server
-        # Maximum http buffer size set to 100MB.
-        sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*', max_http_buffer_size=1e8)
-        self._sio = sio
+    def _get_watched_mtimes(self):
+        mtimes = {}
+        for file_path in self._get_watched_file_paths():
+            try:
+                mtimes[file_path] = os.stat(file_path).st_mtime_ns
+            except FileNotFoundError:
+                mtimes[file_path] = None
+        return mtimes
 
-        async def handle_connect(sid, environ, auth):
-            self._daw_sid = sid
-            print(
-                "===========================================================================")
-            print("TuneFlow connected")
-            print(
-                "===========================================================================")
+    def has_changed(self):
+        '''
+        Returns True if the plugin module or the bundle changed since the last call.
+        '''
+        mtimes = self._get_watched_mtimes()
+        changed = mtimes != self._watched_mtimes
+        self._watched_mtimes = mtimes
+        return changed
+
+    def reload_plugin(self):
+        '''
+        Reloads the module of the plugin and validates the reloaded class against the bundle again.
+
+        Returns False and keeps running the previous class if the new code fails to load. Only the module that
+        defines the plugin is reloaded, not the modules it imports.
+        '''
+        module_name = self._plugin_class.__module__
+        if module_name == '__main__':
+            print("Hot reload needs the plugin class to be defined in its own module, not in the debug script")
+            return False
+        try:
+            module = importlib.reload(sys.modules[module_name])
+            plugin_class = getattr(module, self._plugin_class.__name__)
+            plugin_info = self._load_plugin_info(plugin_class)
+        except Exception:
+            print("=========================== Reload Plugin Exception =======================")
+            traceback.print_exc()
+            print("===========================================================================")
+            return False
+        self._plugin_class = plugin_class
+        self._plugin_info = plugin_info
+        print(f"Reloaded {module_name}.{plugin_class.__name__}")
+        return True
+
+    def _cache_input(self, song_bytes, params, response_mode):
+        last_input = {
+            "song": bytes(song_bytes),
+            "params": params,
+            "responseMode": response_mode
+        }
+        self._last_input = last_input
+        if self.replay_file_path is not None:
+            with open(self.replay_file_path, 'wb') as replay_file:
+                replay_file.write(packb(last_input))
 
-        async def handle_disconnect(sid):
-            self._daw_sid = None
+    def _init_plugin(self, song_bytes):
+        plugin_class = self._plugin_class
+        try:
+            song, _ = deserialize_plugin_song(plugin_class, song_bytes)
+            params_config = plugin_class.params(song)
+            return {"status": "OK",
+                    "paramsConfig": params_config,
+                    "params": plugin_class._get_default_params(param_config=params_config)
+                    }
+        except Exception as e:
             print(
-                "===========================================================================")
-            print("TuneFlow disconnected")
-            print()
-            print(translate_label({
-                "en": "IMPORTANT: Please undo the plugin under debugging and re-run it after you restart the DevKit.",
-                "zh": "注意: 请在TuneFlow中撤销正在调试的插件，并在DevKit重新启动后重新运行该插件"
-            }))
+                "=========================== Run Plugin Exception ==========================")
+            traceback.print_exc()
             print(
                 "===========================================================================")
-
-        async def handle_get_bundle_info(sid, data):
             return {
-                "status": "OK",
-                "pluginInfo": self._plugin_info
+                "status": "INIT_PLUGIN_EXCEPTION"
             }
 
-        def init_plugin_task(plugin_class: Type[TuneflowPlugin], song: Song, sio, sid):
-            try:
-                params_config = plugin_class.params(song)
-                return {"status": "OK",
-                        "paramsConfig": params_config,
-                        "params": plugin_class._get_default_params(param_config=params_config)
-                        }
-            except Exception as e:
-                print(
-                    "=========================== Run Plugin Exception ==========================")
-                traceback.print_exc()
-                print(
-                    "===========================================================================")
-                return {
-                    "status": "INIT_PLUGIN_EXCEPTION"
-                }
-
-        async def handle_init_plugin(sid, data):
-            decoded_data = unpackb(data)
-            song = Song.deserialize_from_bytestring(decoded_data["song"])
-            response = await asyncio.get_event_loop().run_in_executor(None, functools.partial(init_plugin_task, plugin_class=self._plugin_class, song=song, sio=self._sio, sid=self._daw_sid))
-            return packb(response)
-
-        def run_plugin_task(plugin_class: Type[TuneflowPlugin], song, params, sio, sid):
-            try:
-                plugin_class.run(song, params)
-            except Exception as e:
-                print("================ Run Plugin Exception ================")
-                traceback.print_exc()
-                print("======================================================")
-                return {
-                    "status": "RUN_PLUGIN_EXCEPTION"
-                }
+    def _run_plugin(self, song_bytes, params, response_mode, progress_reporter: ProgressReporter | None,
+                    cancellation_token: CancellationToken | None = None, timings: dict | None = None):
+        plugin_class = self._plugin_class
+        try:
+            start_time = time.perf_counter()
+            song, partial_song = deserialize_plugin_song(plugin_class, song_bytes)
+            if params is None:
+                params = plugin_class._get_default_params(param_config=plugin_class.params(song))
+            deserialized_time = time.perf_counter()
+            run_with_cancellation_token(
+                cancellation_token, run_with_progress_reporter, progress_reporter, plugin_class.run, song, params)
+            run_time = time.perf_counter()
+            result = {
+                "status": "OK"
+            }
+            if partial_song is not None:
+                result.update(partial_song.get_response(song, response_mode=response_mode))
+            else:
+                result.update(get_song_response(song_bytes, song, response_mode=response_mode))
+            if timings is not None:
+                timings["deserialize"] = deserialized_time - start_time
+                timings["run"] = run_time - deserialized_time
+                timings["response"] = time.perf_counter() - run_time
+            return result
+        except JobCancelledError as e:
+            print("Plugin run stopped:", e.status)
             return {
-                "status": "OK",
-                "song": song.serialize_to_bytestring()
+                "status": e.status
+            }
+        except Exception as e:
+            print("================ Run Plugin Exception ================")
+            traceback.print_exc()
+            print("======================================================")
+            return {
+                "status": "RUN_PLUGIN_EXCEPTION"
             }
 
-        async def handle_run_plugin(sid, data):
-            print('run plugin')
-            decoded_data = unpackb(data)
-            params = decoded_data["params"]
-            song = Song.deserialize_from_bytestring(decoded_data["song"])
-            result = await asyncio.get_event_loop().run_in_executor(None,  functools.partial(run_plugin_task, plugin_class=self._plugin_class, song=song, params=params, sio=self._sio, sid=self._daw_sid))
-            return packb(result)
+    def replay(self):
+        '''
+        Runs the plugin again on the last song and params received from TuneFlow and prints the timings.
 
-        sio.on("connect", handle_connect, namespace='/daw')
-        sio.on("disconnect", handle_disconnect, namespace='/daw')
-        sio.on('get-bundle-info', handle_get_bundle_info, namespace='/daw')
-        sio.on('init-plugin', handle_init_plugin, namespace='/daw')
-        sio.on('run-plugin', handle_run_plugin, namespace='/daw')
+        The result is only returned, TuneFlow is not updated. Returns None if there is no input to replay.
+        '''
+        last_input = self._last_input
+        if last_input is None:
+            print(translate_label({
+                "en": "Nothing to replay yet, run the plugin from TuneFlow first.",
+                "zh": "还没有可以重放的输入, 请先在TuneFlow中运行该插件"
+            }))
+            return None
+        with self._replay_lock:
+            timings = {}
+            start_time = time.perf_counter()
+            result = self._run_plugin(
+                last_input["song"], last_input["params"], last_input["responseMode"],
+                progress_reporter=ProgressReporter(callback=self._print_progress), timings=timings)
+            timings["total"] = time.perf_counter() - start_time
+        print("==================== Replay ====================")
+        print("Status:", result["status"])
+        print("  ".join(f"{name}: {duration * 1000:.1f} ms" for name, duration in timings.items()))
+        print("================================================")
+        return result
 
-        self._sio = sio
+    @staticmethod
+    def _print_progress(progress):
+        print("Progress:", progress["progress"], progress["stage"] if progress["stage"] is not None else '')
 
+    def _watch_plugin(self):
+        while True:
+            time.sleep(RELOAD_POLL_INTERVAL)
+            if self.has_changed() and self.reload_plugin() and self._last_input is not None:
+                self.replay()
+
+    def _read_commands(self):
+        print(translate_label({
+            "en": "Type r and Enter to replay the last run, or reload and Enter to reload the plugin.",
+            "zh": "输入 r 并回车以重放上一次运行, 输入 reload 并回车以重新加载插件"
+        }))
+        for line in sys.stdin:
+            command = line.strip()
+            if command in ['r', 'replay']:
+                self.replay()
+            elif command == 'reload':
+                if self.reload_plugin() and self._last_input is not None:
+                    self.replay()
+
+    def create_app(self):
+        '''
+        Creates the Socket.IO server and returns its ASGI application.
+        '''
+        sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*',
+                                   max_http_buffer_size=self.max_message_size)
+        self._sio = sio
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='tuneflow-debugger')
+        sio.on("connect", self._handle_connect, namespace='/daw')
+        sio.on("disconnect", self._handle_disconnect, namespace='/daw')
+        sio.on('get-bundle-info', self._handle_get_bundle_info, namespace='/daw')
+        sio.on('song-chunk', self._handle_song_chunk, namespace='/daw')
+        sio.on('init-plugin', self._handle_init_plugin, namespace='/daw')
+        sio.on('run-plugin', self._handle_run_plugin, namespace='/daw')
         # Wrap with ASGI application
-        self._app = socketio.ASGIApp(self._sio)
+        self._app = socketio.ASGIApp(sio)
+        return self._app
+
+    async def _handle_connect(self, sid, environ, auth=None):
+        self._sessions[sid] = DebugSession(sid)
+        print(
+            "===========================================================================")
+        print("TuneFlow connected")
+        if len(self._sessions) > 1:
+            print(f"Connected sessions: {len(self._sessions)}")
+        print(
+            "===========================================================================")
+
+    async def _handle_disconnect(self, sid, reason=None):
+        session = self._sessions.pop(sid, None)
+        if session is not None and session.cancellation_token is not None:
+            # Nobody receives the result anymore, plugins that check their token can stop early.
+            session.cancellation_token.cancel()
+        print(
+            "===========================================================================")
+        print("TuneFlow disconnected")
+        print()
+        print(translate_label({
+            "en": "IMPORTANT: Please undo the plugin under debugging and re-run it after you restart the DevKit.",
+            "zh": "注意: 请在TuneFlow中撤销正在调试的插件，并在DevKit重新启动后重新运行该插件"
+        }))
+        if self._last_input is not None:
+            print(translate_label({
+                "en": "The last run can still be replayed without TuneFlow, type r and Enter to replay it.",
+                "zh": "上一次运行仍可以在没有TuneFlow的情况下重放, 输入 r 并回车即可重放"
+            }))
+        print(
+            "===========================================================================")
+
+    async def _handle_get_bundle_info(self, sid, data=None):
+        return {
+            "status": "OK",
+            "pluginInfo": self._plugin_info
+        }
+
+    def _get_session(self, sid):
+        if sid not in self._sessions:
+            self._sessions[sid] = DebugSession(sid)
+        return self._sessions[sid]
+
+    async def _handle_song_chunk(self, sid, data):
+        decoded_data = unpack_with_views(data)
+        try:
+            self._get_session(sid).receive_chunk(
+                decoded_data["transferId"], decoded_data["index"], decoded_data["total"], decoded_data["data"],
+                max_size=self.max_song_size)
+        except Exception as e:
+            print("Song transfer failed:", e)
+            return packb({"status": "SONG_TRANSFER_ERROR"})
+        return packb({"status": "OK"})
+
+    def _take_song(self, session: DebugSession, decoded_data: dict):
+        if "songTransferId" in decoded_data:
+            return session.take_song(decoded_data["songTransferId"])
+        return decoded_data["song"]
+
+    async def _run_in_executor(self, function, *args, **kwargs):
+        return await asyncio.get_event_loop().run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    async def _send_response(self, sid, response: dict, decoded_data: dict):
+        '''
+        Returns the packed response, or sends it in `result-chunk` events if the client asked for chunks smaller than
+        the response. Chunks are sent before the acknowledgement, which then only references the transfer.
+        '''
+        packed_response = await self._run_in_executor(packb, response)
+        chunk_size = decoded_data["resultChunkSize"] if "resultChunkSize" in decoded_data else None
+        if chunk_size is None or chunk_size <= 0 or len(packed_response) <= chunk_size:
+            return packed_response
+        transfer_id = uuid.uuid4().hex
+        chunk_count = (len(packed_response) + chunk_size - 1) // chunk_size
+        packed_view = memoryview(packed_response)
+        for index in range(chunk_count):
+            await self._sio.emit('result-chunk', packb({  # type: ignore
+                "transferId": transfer_id,
+                "index": index,
+                "total": chunk_count,
+                "data": packed_view[index * chunk_size:(index + 1) * chunk_size]
+            }), to=sid, namespace='/daw')
+        return packb({
+            "status": response["status"],
+            "resultTransferId": transfer_id,
+            "resultChunkCount": chunk_count
+        })
+
+    async def _handle_init_plugin(self, sid, data):
+        session = self._get_session(sid)
+        decoded_data = unpack_with_views(data)
+        try:
+            song_bytes = self._take_song(session, decoded_data)
+        except Exception as e:
+            print("Song transfer failed:", e)
+            return packb({"status": "SONG_TRANSFER_ERROR"})
+        async with session.lock:
+            response = await self._run_in_executor(self._init_plugin, song_bytes)
+            if response["status"] == "OK":
+                await self._run_in_executor(self._cache_input, song_bytes, None, 'full')
+        return await self._send_response(sid, response, decoded_data)
+
+    def _create_progress_reporter(self, sid):
+        loop = asyncio.get_event_loop()
+
+        def emit_progress(progress):
+            # Runs in the plugin thread, the emit is scheduled on the event loop without waiting for it.
+            asyncio.run_coroutine_threadsafe(
+                self._sio.emit('plugin-progress', packb(progress), to=sid, namespace='/daw'), loop)  # type: ignore
+        return ProgressReporter(callback=emit_progress)
+
+    async def _handle_run_plugin(self, sid, data):
+        print('run plugin')
+        session = self._get_session(sid)
+        decoded_data = unpack_with_views(data)
+        try:
+            song_bytes = self._take_song(session, decoded_data)
+        except Exception as e:
+            print("Song transfer failed:", e)
+            return packb({"status": "SONG_TRANSFER_ERROR"})
+        params = decoded_data["params"]
+        response_mode = decoded_data["responseMode"] if "responseMode" in decoded_data and decoded_data["responseMode"] in RESPONSE_MODES else 'full'
+        # Runs of one session are serialized, other sessions keep running in the meantime.
+        async with session.lock:
+            await self._run_in_executor(self._cache_input, song_bytes, params, response_mode)
+            session.cancellation_token = CancellationToken()
+            try:
+                result = await self._run_in_executor(
+                    self._run_plugin, song_bytes, params, response_mode,
+                    progress_reporter=self._create_progress_reporter(sid),
+                    cancellation_token=session.cancellation_token)
+            finally:
+                session.cancellation_token = None
+        return await self._send_response(sid, result, decoded_data)
+
+    def start(self):
+        self.create_app()
         self.print_plugin_info(plugin_info=self._plugin_info)
         print()
         print("======================================================")
@@ -134,7 +470,16 @@ class Debugger:
             "zh": "注意: 从 TuneFlow 库中以debug模式安装此插件，随后即可从各级右键菜单中运行此插件"
         }))
         print("======================================================")
-        uvicorn.run(self._app, host='127.0.0.1', port=self.port)
+        if self.hot_reload and self._plugin_class.__module__ == '__main__':
+            print("Hot reload needs the plugin class to be defined in its own module, not in the debug script")
+        elif self.hot_reload:
+            threading.Thread(target=self._watch_plugin, daemon=True).start()
+        if sys.stdin is not None and sys.stdin.isatty():
+            threading.Thread(target=self._read_commands, daemon=True).start()
+        try:
+            uvicorn.run(self._app, host=self.host, port=self.port)
+        finally:
+            self._executor.shutdown(wait=False)  # type: ignore
 
     @staticmethod
     def print_plugin_info(plugin_info):
@@ -0,0 +1,221 @@
+from __future__ import annotations
+from tuneflow_py import Song
+from tuneflow_py.models.protos import song_pb2
+from google.protobuf.descriptor import FieldDescriptor
+from msgpack import packb
+
+RESPONSE_MODES = ['full', 'delta']
+
+
+def _get_changed_field_names(before, after, excluded_field_names=()):
+    changed_field_names = []
+    for field in after.DESCRIPTOR.fields:
+        if field.name in excluded_field_names:
+            continue
+        if getattr(before, field.name) != getattr(after, field.name):
+            changed_field_names.append(field.name)
+        elif field.label != FieldDescriptor.LABEL_REPEATED and field.type == FieldDescriptor.TYPE_MESSAGE and \
+                before.HasField(field.name) != after.HasField(field.name):
+            changed_field_names.append(field.name)
+    return changed_field_names
+
+
+def _pack_fields(message, field_names):
+    '''
+    Serializes a copy of the message that only contains the given fields.
+    '''
+    partial_message = type(message)()
+    for field_name in field_names:
+        field = message.DESCRIPTOR.fields_by_name[field_name]
+        value = getattr(message, field_name)
+        if field.label == FieldDescriptor.LABEL_REPEATED:
+            getattr(partial_message, field_name).MergeFrom(value)
+        elif field.type == FieldDescriptor.TYPE_MESSAGE:
+            if message.HasField(field_name):
+                getattr(partial_message, field_name).CopyFrom(value)
+                getattr(partial_message, field_name).SetInParent()
+        else:
+            setattr(partial_message, field_name, value)
+    return partial_message.SerializeToString()
+
+
+def _apply_fields(message, field_names, packed_fields: bytes):
+    for field_name in field_names:
+        message.ClearField(field_name)
+    message.MergeFromString(packed_fields)
+
+
+def _get_unique_ids(items, get_id):
+    ids = [get_id(item) for item in items]
+    return ids if len(set(ids)) == len(ids) else None
+
+
+def _diff_items(before_items, after_items, get_id, diff_item):
+    '''
+    Diffs two repeated fields of messages identified by `get_id`.
+
+    Returns None if ids are not unique, in which case the whole field has to be replaced.
+    '''
+    before_ids = _get_unique_ids(before_items, get_id)
+    after_ids = _get_unique_ids(after_items, get_id)
+    if before_ids is None or after_ids is None:
+        return None
+    before_item_map = {get_id(item): item for item in before_items}
+    after_id_set = set(after_ids)
+    added_items = []
+    added_indices = []
+    updated_items = []
+    for index, item in enumerate(after_items):
+        item_id = get_id(item)
+        if item_id not in before_item_map:
+            added_items.append(item.SerializeToString())
+            added_indices.append(index)
+        else:
+            item_delta = diff_item(before_item_map[item_id], item)
+            if item_delta is not None:
+                updated_items.append(item_delta)
+    removed_ids = [item_id for item_id in before_ids if item_id not in after_id_set]
+    item_delta = {}
+    if len(added_items) > 0:
+        item_delta["added"] = added_items
+        item_delta["addedIndices"] = added_indices
+    if len(updated_items) > 0:
+        item_delta["updated"] = updated_items
+    if len(removed_ids) > 0:
+        item_delta["removedIds"] = removed_ids
+    # Applying the delta keeps existing items in their order and inserts new ones at their indices,
+    # the full order is only needed if existing items were moved.
+    applied_ids = [item_id for item_id in before_ids if item_id in after_id_set]
+    for index in added_indices:
+        applied_ids.insert(index, after_ids[index])
+    if applied_ids != after_ids:
+        item_delta["order"] = after_ids
+    return item_delta
+
+
+def _apply_items(items, item_delta, message_type, get_id, apply_item):
+    removed_ids = set(item_delta["removedIds"]) if "removedIds" in item_delta else set()
+    item_map = {}
+    kept_items = []
+    for item in items:
+        if get_id(item) in removed_ids:
+            continue
+        kept_item = message_type()
+        kept_item.CopyFrom(item)
+        item_map[get_id(kept_item)] = kept_item
+        kept_items.append(kept_item)
+    if "updated" in item_delta:
+        for updated_item in item_delta["updated"]:
+            apply_item(item_map[updated_item["id"]], updated_item)
+    if "added" in item_delta:
+        for index, packed_item in zip(item_delta["addedIndices"], item_delta["added"]):
+            added_item = message_type()
+            added_item.ParseFromString(packed_item)
+            item_map[get_id(added_item)] = added_item
+            kept_items.insert(index, added_item)
+    if "order" in item_delta:
+        kept_items = [item_map[item_id] for item_id in item_delta["order"]]
+    del items[:]
+    items.extend(kept_items)
+
+
+def _diff_message(before, after, item_id, child_field_name, diff_child):
+    delta = {}
+    changed_field_names = _get_changed_field_names(before, after, excluded_field_names=(child_field_name,))
+    if len(changed_field_names) > 0:
+        delta["fieldNames"] = changed_field_names
+        delta["fields"] = _pack_fields(after, changed_field_names)
+    before_children = getattr(before, child_field_name)
+    after_children = getattr(after, child_field_name)
+    if before_children != after_children:
+        children_delta = diff_child(before_children, after_children)
+        if children_delta is None:
+            # Fall back to replacing all children.
+            delta.setdefault("fieldNames", []).append(child_field_name)
+            delta["fields"] = _pack_fields(after, delta["fieldNames"])
+        else:
+            delta[child_field_name] = children_delta
+    if len(delta) == 0:
+        return None
+    delta["id"] = item_id
+    return delta
+
+
+def _apply_message(message, delta, child_field_name, apply_children):
+    if "fieldNames" in delta:
+        _apply_fields(message, delta["fieldNames"], delta["fields"])
+    if child_field_name in delta:
+        apply_children(getattr(message, child_field_name), delta[child_field_name])
+
+
+def _diff_note(before_note, after_note):
+    changed_field_names = _get_changed_field_names(before_note, after_note)
+    if len(changed_field_names) == 0:
+        return None
+    return {
+        "id": after_note.id,
+        "fieldNames": changed_field_names,
+        "fields": _pack_fields(after_note, changed_field_names)
+    }
+
+
+def _diff_notes(before_notes, after_notes):
+    return _diff_items(before_notes, after_notes, get_id=lambda note: note.id, diff_item=_diff_note)
+
+
+def _apply_notes(notes, notes_delta):
+    _apply_items(notes, notes_delta, song_pb2.Note, get_id=lambda note: note.id,
+                 apply_item=lambda note, note_delta: _apply_fields(note, note_delta["fieldNames"], note_delta["fields"]))
+
+
+def _diff_clips(before_clips, after_clips):
+    return _diff_items(before_clips, after_clips, get_id=lambda clip: clip.id,
+                       diff_item=lambda before, after: _diff_message(before, after, after.id, 'notes', _diff_notes))
+
+
+def _apply_clips(clips, clips_delta):
+    _apply_items(clips, clips_delta, song_pb2.Clip, get_id=lambda clip: clip.id,
+                 apply_item=lambda clip, clip_delta: _apply_message(clip, clip_delta, 'notes', _apply_notes))
+
+
+def _diff_tracks(before_tracks, after_tracks):
+    return _diff_items(before_tracks, after_tracks, get_id=lambda track: track.uuid,
+                       diff_item=lambda before, after: _diff_message(before, after, after.uuid, 'clips', _diff_clips))
+
+
+def _apply_tracks(tracks, tracks_delta):
+    _apply_items(tracks, tracks_delta, song_pb2.Track, get_id=lambda track: track.uuid,
+                 apply_item=lambda track, track_delta: _apply_message(track, track_delta, 'clips', _apply_clips))
+
+
+def compute_song_delta(before_song_bytes: bytes, after_song: Song):
+    '''
+    Computes the changes from the serialized input song to the output song.
+
+    Tracks, clips and notes are matched by their ids, everything else is sent as the changed protobuf fields.
+    '''
+    before_song_proto = song_pb2.Song()
+    before_song_proto.ParseFromString(before_song_bytes)
+    song_delta = _diff_message(before_song_proto, after_song._proto, None, 'tracks', _diff_tracks)
+    if song_delta is None:
+        return {}
+    del song_delta["id"]
+    return song_delta
+
+
+def apply_song_delta(before_song_bytes: bytes, song_delta: dict):
+    song_proto = song_pb2.Song()
+    song_proto.ParseFromString(before_song_bytes)
+    _apply_message(song_proto, song_delta, 'tracks', _apply_tracks)
+    return Song(proto=song_proto)
+
+
+def get_song_response(before_song_bytes: bytes, after_song: Song, response_mode='full'):
+    '''
+    Returns the song fields of a job response, falling back to the full song if the delta is not smaller.
+    '''
+    if response_mode == 'delta':
+        song_delta = compute_song_delta(before_song_bytes, after_song)
+        if len(packb(song_delta)) < after_song._proto.ByteSize():
+            return {"songDelta": song_delta}
+    return {"song": after_song.serialize_to_bytestring()}
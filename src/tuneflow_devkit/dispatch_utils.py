@@ -0,0 +1,89 @@
+from __future__ import annotations
+from tuneflow_py import TuneflowPlugin
+from typing import Dict, List, Tuple, Type
+from types import MappingProxyType
+
+PluginKey = Tuple[str, str]
+
+
+class PluginEntry:
+    def __init__(self, plugin_class: Type[TuneflowPlugin], plugin_info: dict, config=None) -> None:
+        '''
+        Everything the server needs to dispatch a request to one plugin, resolved once at construction.
+        '''
+        self.plugin_class = plugin_class
+        self.provider_id: str = plugin_class.provider_id()
+        self.plugin_id: str = plugin_class.plugin_id()
+        self.key: PluginKey = (self.provider_id, self.plugin_id)
+        self.plugin_info = plugin_info
+        self.config = MappingProxyType(dict(config) if config is not None else {})
+
+    def get_config(self, key: str, default=None):
+        return self.config[key] if key in self.config else default
+
+
+class PluginDispatchTable:
+    def __init__(self, entries: List[PluginEntry]) -> None:
+        '''
+        Immutable index of the plugins in a bundle keyed by provider id and plugin id.
+        '''
+        self._entries: Dict[PluginKey, PluginEntry] = {}
+        for entry in entries:
+            if entry.key in self._entries:
+                raise Exception(f'Plugin {entry.provider_id} {entry.plugin_id} is specified more than once in the plugin list')
+            self._entries[entry.key] = entry
+        self._entries = MappingProxyType(self._entries)  # type: ignore
+
+    @staticmethod
+    def from_bundle(plugin_class_list: List[Type[TuneflowPlugin]], bundle_info: dict):
+        '''
+        Matches plugin classes with their bundle.json entries.
+
+        Raises if a plugin is missing from the bundle or a bundle entry has no plugin class.
+        '''
+        bundle_plugin_infos = {}
+        for plugin_info in bundle_info["plugins"]:
+            # The first match wins, same as `find_match_plugin_info`.
+            bundle_plugin_infos.setdefault((plugin_info["providerId"], plugin_info["pluginId"]), plugin_info)
+        entries = []
+        for plugin_class in plugin_class_list:
+            plugin_key = (plugin_class.provider_id(), plugin_class.plugin_id())
+            if plugin_key not in bundle_plugin_infos:
+                raise Exception(
+                    "plugin not specified in the bundle, check your bundle.json. For more information checkout https://github.com/tuneflow/tuneflow-py")
+            entries.append(PluginEntry(plugin_class=plugin_class, plugin_info=bundle_plugin_infos[plugin_key]))
+        dispatch_table = PluginDispatchTable(entries)
+        # Ensure all entries in bundle.info have corresponding plugin code.
+        for plugin_info in bundle_info["plugins"]:
+            if dispatch_table.get(plugin_info["providerId"], plugin_info["pluginId"]) is None:
+                raise Exception(
+                    f'Plugin {plugin_info["providerId"]} {plugin_info["pluginId"]} has no corresponding source code in the plugin list')
+        return dispatch_table
+
+    def with_plugin_configs(self, plugin_configs=None):
+        '''
+        Returns a new table whose entries hold `plugin_configs[provider_id][plugin_id]`.
+        '''
+        entries = []
+        for entry in self._entries.values():
+            config = None
+            if plugin_configs is not None and entry.provider_id in plugin_configs and \
+                    entry.plugin_id in plugin_configs[entry.provider_id]:
+                config = plugin_configs[entry.provider_id][entry.plugin_id]
+            entries.append(PluginEntry(plugin_class=entry.plugin_class, plugin_info=entry.plugin_info, config=config))
+        return PluginDispatchTable(entries)
+
+    def get(self, provider_id: str, plugin_id: str):
+        '''
+        Returns the entry of the plugin or None.
+        '''
+        return self._entries.get((provider_id, plugin_id))
+
+    def get_plugin_classes(self):
+        return [entry.plugin_class for entry in self._entries.values()]
+
+    def __iter__(self):
+        return iter(self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,432 @@
+from __future__ import annotations
+from tuneflow_py import TuneflowPlugin
+from typing import Type, List, Dict, Tuple
+from tuneflow_devkit.delta_utils import get_song_response
+from tuneflow_devkit.song_utils import deserialize_plugin_song
+from tuneflow_devkit.cancellation_utils import CancellationToken, JobCancelledError, run_with_cancellation_token
+from tuneflow_devkit.progress_utils import ProgressReporter, run_with_progress_reporter
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+import asyncio
+import cProfile
+import io
+import multiprocessing
+import multiprocessing.util
+import os
+import pstats
+import pickle
+import queue
+import threading
+import time
+import traceback
+
+EXECUTOR_MODES = ['thread', 'process', 'inline']
+PROFILE_LINE_LIMIT = 50
+# How often a process pool checks whether a running job was cancelled.
+CANCELLATION_POLL_INTERVAL = 0.05
+# Types of the messages pool workers send while running a job.
+_PROGRESS_MESSAGE = 'progress'
+_RESULT_MESSAGE = 'result'
+
+# Plugin classes loaded in the current worker process, keyed by (provider_id, plugin_id).
+_worker_plugin_classes: Dict[Tuple[str, str], Type[TuneflowPlugin]] = {}
+
+
+def setup_plugins(plugin_class_list: List[Type[TuneflowPlugin]]):
+    '''
+    Calls the optional `setup()` of every plugin class, e.g. to load models before the first job.
+    '''
+    for plugin_class in plugin_class_list:
+        setup = getattr(plugin_class, 'setup', None)
+        if callable(setup):
+            setup()
+
+
+def teardown_plugins(plugin_class_list: List[Type[TuneflowPlugin]]):
+    '''
+    Calls the optional `teardown()` of every plugin class, failures are logged so every plugin gets torn down.
+    '''
+    for plugin_class in plugin_class_list:
+        teardown = getattr(plugin_class, 'teardown', None)
+        if callable(teardown):
+            try:
+                teardown()
+            except Exception:
+                print(traceback.format_exc())
+
+
+def init_worker(plugin_class_list: List[Type[TuneflowPlugin]]):
+    '''
+    Initializes a pool worker process, the plugin classes are imported and set up once per worker.
+    '''
+    for plugin_class in plugin_class_list:
+        _worker_plugin_classes[(plugin_class.provider_id(), plugin_class.plugin_id())] = plugin_class
+    setup_plugins(plugin_class_list)
+    # Pool workers exit without running atexit handlers, but they do run multiprocessing finalizers.
+    multiprocessing.util.Finalize(None, teardown_plugins, args=(plugin_class_list,), exitpriority=10)
+
+
+def init_plugin_task(plugin_class: Type[TuneflowPlugin], song_bytes: bytes):
+    timings = {}
+    try:
+        start_time = time.perf_counter()
+        song, _ = deserialize_plugin_song(plugin_class, song_bytes)
+        timings["deserialize"] = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        params_config = plugin_class.params(song)
+        timings["params"] = time.perf_counter() - start_time
+        return {"status": "OK",
+                "paramsConfig": params_config,
+                "params": plugin_class._get_default_params(param_config=params_config),
+                "timings": timings
+                }
+    except Exception as e:
+        if not isinstance(e, JobCancelledError):
+            print(traceback.format_exc())
+        return {
+            "status": e.status if isinstance(e, JobCancelledError) else "ERROR",
+            "timings": timings
+        }
+
+
+def get_profile_text(profiler: cProfile.Profile, limit=PROFILE_LINE_LIMIT):
+    profile_stream = io.StringIO()
+    pstats.Stats(profiler, stream=profile_stream).sort_stats('cumulative').print_stats(limit)
+    return profile_stream.getvalue()
+
+
+def run_plugin_task(plugin_class: Type[TuneflowPlugin], song_bytes: bytes, params, response_mode='full', profile=False):
+    timings = {}
+    profiler = cProfile.Profile() if profile else None
+    try:
+        start_time = time.perf_counter()
+        # Plugins that declare `song_fields` only get those fields deserialized.
+        song, partial_song = deserialize_plugin_song(plugin_class, song_bytes)
+        timings["deserialize"] = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        if profiler is not None:
+            profiler.runcall(plugin_class.run, song, params)
+        else:
+            plugin_class.run(song, params)
+        timings["run"] = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        response = {
+            "status": "OK"
+        }
+        if partial_song is not None:
+            response.update(partial_song.get_response(song, response_mode=response_mode))
+        else:
+            response.update(get_song_response(song_bytes, song, response_mode=response_mode))
+        timings["serialize"] = time.perf_counter() - start_time
+    except Exception as e:
+        if not isinstance(e, JobCancelledError):
+            print(traceback.format_exc())
+        result = {
+            "status": e.status if isinstance(e, JobCancelledError) else "ERROR",
+            "error": e,
+            "timings": timings
+        }
+        if profiler is not None:
+            result["profile"] = get_profile_text(profiler)
+        return result
+    # Timings are collected by the runner and never sent to clients.
+    response["timings"] = timings
+    if profiler is not None:
+        response["profile"] = get_profile_text(profiler)
+    return response
+
+
+def call_worker_task(task, provider_id: str, plugin_id: str, *args):
+    '''
+    Runs a task inside a pool worker process against the plugin class loaded by `init_worker`.
+    '''
+    result = task(_worker_plugin_classes[(provider_id, plugin_id)], *args)
+    if "error" in result:
+        # The error is sent back to the parent process, make sure it survives pickling.
+        result["error"] = get_picklable_error(result["error"])
+    return result
+
+
+def get_picklable_error(error: BaseException):
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return Exception(repr(error))
+
+
+def run_pool_worker(connection, plugin_class_list: List[Type[TuneflowPlugin]]):
+    '''
+    Main loop of a `KillableProcessPool` worker, runs one task at a time until it receives None.
+    '''
+    try:
+        init_worker(plugin_class_list)
+    except BaseException as e:
+        print(traceback.format_exc())
+        connection.send((False, get_picklable_error(e)))
+        return
+    connection.send((True, None))
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        deadline, progress_interval, task, provider_id, plugin_id, args = message
+        # Progress is rate limited in the worker so that dropped reports never cross the pipe.
+        progress_reporter = ProgressReporter(
+            callback=lambda progress: connection.send((_PROGRESS_MESSAGE, True, progress)),
+            min_interval=progress_interval) if progress_interval is not None else None
+        try:
+            # Plugins in the worker can check the deadline, explicit cancellation kills the worker.
+            result = run_with_cancellation_token(
+                CancellationToken(deadline=deadline), run_with_progress_reporter, progress_reporter,
+                call_worker_task, task, provider_id, plugin_id, *args)
+            connection.send((_RESULT_MESSAGE, True, result))
+        except BaseException as e:
+            connection.send((_RESULT_MESSAGE, False, get_picklable_error(e)))
+
+
+class PoolWorker:
+    def __init__(self, process, connection) -> None:
+        self.process = process
+        self.connection = connection
+
+
+class KillableProcessPool:
+    def __init__(self, max_workers: int, plugin_class_list: List[Type[TuneflowPlugin]]) -> None:
+        '''
+        Process pool that can stop a single job by killing its worker, which is then replaced by a new worker.
+
+        Each job is dispatched from a thread that waits for the result of its worker while watching the
+        cancellation token of the job.
+        '''
+        self.max_workers = max_workers
+        self._plugin_class_list = plugin_class_list
+        self._context = multiprocessing.get_context()
+        self._idle_workers: queue.Queue = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        self._started_count = 0
+        self._is_warm = False
+        self._is_shutdown = False
+        self._dispatch_executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Ask the workers to exit before the interpreter joins them.
+        multiprocessing.util.Finalize(self, KillableProcessPool._stop_workers, args=(self._workers,), exitpriority=20)
+
+    @staticmethod
+    def _stop_workers(workers):
+        for worker in list(workers):
+            try:
+                worker.connection.send(None)
+            except (OSError, ValueError):
+                pass
+
+    def _start_worker(self):
+        parent_connection, child_connection = self._context.Pipe()
+        process = self._context.Process(target=run_pool_worker, args=(child_connection, self._plugin_class_list))
+        process.start()
+        child_connection.close()
+        try:
+            # Waits until the plugins are set up in the new worker.
+            is_ready, error = parent_connection.recv()
+        except EOFError:
+            is_ready, error = False, Exception("Plugin worker process exited during setup")
+        if not is_ready:
+            process.join()
+            raise error
+        worker = PoolWorker(process, parent_connection)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _acquire_worker(self):
+        try:
+            return self._idle_workers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_start_worker = self._started_count < self.max_workers
+            if can_start_worker:
+                self._started_count += 1
+        if not can_start_worker:
+            # At most `max_workers` dispatch threads wait here, so a worker is always returned eventually.
+            return self._idle_workers.get()
+        try:
+            return self._start_worker()
+        except BaseException:
+            with self._lock:
+                self._started_count -= 1
+            raise
+
+    def _release_worker(self, worker: PoolWorker):
+        if self._is_shutdown:
+            self._stop_workers([worker])
+            return
+        self._idle_workers.put(worker)
+
+    def _discard_worker(self, worker: PoolWorker):
+        worker.process.kill()
+        worker.process.join()
+        worker.connection.close()
+        with self._lock:
+            self._workers.discard(worker)
+            self._started_count -= 1
+        if self._is_warm and not self._is_shutdown:
+            # Replace the worker in the background so that the next job does not wait for the plugin setup.
+            threading.Thread(target=self._start_idle_worker, daemon=True).start()
+
+    def _start_idle_worker(self):
+        with self._lock:
+            if self._started_count >= self.max_workers:
+                return
+            self._started_count += 1
+        try:
+            self._release_worker(self._start_worker())
+        except BaseException:
+            with self._lock:
+                self._started_count -= 1
+            print(traceback.format_exc())
+
+    def _run(self, cancellation_token: CancellationToken | None, progress_reporter: ProgressReporter | None, task,
+             provider_id: str, plugin_id: str, args):
+        worker = self._acquire_worker()
+        try:
+            worker.connection.send((cancellation_token.deadline if cancellation_token is not None else None,
+                                    progress_reporter.min_interval if progress_reporter is not None else None,
+                                    task, provider_id, plugin_id, args))
+            while True:
+                if not worker.connection.poll(CANCELLATION_POLL_INTERVAL):
+                    if cancellation_token is not None and cancellation_token.is_cancelled():
+                        self._discard_worker(worker)
+                        raise JobCancelledError(cancellation_token.status)
+                    if not worker.process.is_alive():
+                        self._discard_worker(worker)
+                        raise Exception("Plugin worker process exited unexpectedly")
+                    continue
+                message_type, is_successful, value = worker.connection.recv()
+                if message_type == _RESULT_MESSAGE:
+                    break
+                progress_reporter.callback(value)  # type: ignore
+        except (EOFError, OSError):
+            self._discard_worker(worker)
+            raise Exception("Plugin worker process exited unexpectedly")
+        self._release_worker(worker)
+        if not is_successful:
+            raise value
+        return value
+
+    def submit(self, cancellation_token: CancellationToken | None, progress_reporter: ProgressReporter | None, task,
+               provider_id: str, plugin_id: str, *args) -> Future:
+        return self._dispatch_executor.submit(
+            self._run, cancellation_token, progress_reporter, task, provider_id, plugin_id, args)
+
+    def start_workers(self):
+        '''
+        Starts every worker and waits until their plugins are set up.
+        '''
+        futures = [self._dispatch_executor.submit(self._start_idle_worker) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
+        self._is_warm = True
+        with self._lock:
+            if self._started_count < self.max_workers:
+                raise Exception("Failed to start plugin worker processes")
+
+    def shutdown(self, wait=True):
+        self._is_shutdown = True
+        while True:
+            try:
+                self._stop_workers([self._idle_workers.get_nowait()])
+            except queue.Empty:
+                break
+        self._dispatch_executor.shutdown(wait=wait)
+        if wait:
+            for worker in list(self._workers):
+                worker.process.join()
+
+
+class InlineExecutor(Executor):
+    '''
+    Runs every task directly in the calling thread.
+    '''
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        return future
+
+
+class PluginExecutor:
+    def __init__(self, plugin_class_list: List[Type[TuneflowPlugin]], mode='thread', max_workers=None) -> None:
+        '''
+        Executes plugin tasks in a thread pool, a warm process pool or inline on the event loop.
+
+        Tasks always receive the song as the raw serialized bytestring, or a memoryview of the request buffer,
+        so that in process mode it is only pickled once on its way to the worker.
+        '''
+        if mode not in EXECUTOR_MODES:
+            raise Exception(f"executor mode must be one of {EXECUTOR_MODES}, got {mode}")
+        self.mode = mode
+        self._plugin_class_list = plugin_class_list
+        self._is_setup = False
+        if max_workers is None:
+            if mode == 'process':
+                max_workers = os.cpu_count() or 1
+            elif mode == 'thread':
+                # Same default as `ThreadPoolExecutor`.
+                max_workers = min(32, (os.cpu_count() or 1) + 4)
+            else:
+                max_workers = 1
+        self.max_workers = max_workers
+        if mode == 'process':
+            self._executor = KillableProcessPool(max_workers=max_workers, plugin_class_list=plugin_class_list)
+        elif mode == 'thread':
+            self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        else:
+            self._executor = InlineExecutor()
+
+    def submit(self, task, plugin_class: Type[TuneflowPlugin], *args, cancellation_token: CancellationToken | None = None,
+               progress_reporter: ProgressReporter | None = None) -> Future:
+        '''
+        Submits a task, plugins can read the `cancellation_token` through `get_cancellation_token()` and send
+        progress to the `progress_reporter` through `report_progress()`.
+
+        In process mode a cancelled job is stopped by killing its worker, otherwise cancellation is cooperative.
+        '''
+        if self.mode == 'process':
+            # Memoryviews of request buffers cannot be pickled.
+            return self._executor.submit(  # type: ignore
+                cancellation_token, progress_reporter, task, plugin_class.provider_id(),
+                plugin_class.plugin_id(),
+                *[bytes(arg) if isinstance(arg, memoryview) else arg for arg in args])
+        return self._executor.submit(run_with_cancellation_token, cancellation_token, run_with_progress_reporter,
+                                     progress_reporter, task, plugin_class, *args)
+
+    async def run(self, task, plugin_class: Type[TuneflowPlugin], *args, cancellation_token: CancellationToken | None = None,
+                  progress_reporter: ProgressReporter | None = None):
+        return await asyncio.wrap_future(self.submit(
+            task, plugin_class, *args, cancellation_token=cancellation_token, progress_reporter=progress_reporter))
+
+    def setup(self):
+        '''
+        Sets up the plugins before the first job, blocking until done.
+
+        In process mode every worker of the pool is started, since each worker sets up its own copy of the plugins.
+        '''
+        if self.mode != 'process':
+            setup_plugins(self._plugin_class_list)
+        else:
+            self._executor.start_workers()  # type: ignore
+        self._is_setup = True
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        # Process workers tear down their plugins when they exit.
+        if self._is_setup and self.mode != 'process':
+            teardown_plugins(self._plugin_class_list)
@@ -0,0 +1,26 @@
+from __future__ import annotations
+import importlib
+import json
+
+
+def load_object(object_path: str):
+    '''
+    Imports an object specified as module:name.
+    '''
+    module_name, _, object_name = object_path.partition(':')
+    if not object_name:
+        raise Exception(f"Object must be specified as module:name, got {object_path}")
+    return getattr(importlib.import_module(module_name), object_name)
+
+
+def load_config(config_path: str | None):
+    '''
+    Loads the config from a JSON file, or from a module:name that is a config dict or a function returning one.
+    '''
+    if not config_path:
+        return None
+    if config_path.endswith('.json'):
+        with open(config_path, 'r', encoding='utf-8') as config_file:
+            return json.load(config_file)
+    config = load_object(config_path)
+    return config() if callable(config) else config
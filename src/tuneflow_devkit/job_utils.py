@@ -0,0 +1,160 @@
+from __future__ import annotations
+from collections import OrderedDict
+import sqlite3
+import threading
+import time
+
+
+class JobStatus:
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    ERROR = 'ERROR'
+    CANCELLED = 'CANCELLED'
+
+
+FINISHED_JOB_STATUSES = [JobStatus.DONE, JobStatus.ERROR, JobStatus.CANCELLED]
+
+
+class InMemoryJobRegistry:
+    # Jobs are only visible to the process that created them.
+    shared = False
+
+    def __init__(self, finished_job_ttl=3600, max_jobs=100000) -> None:
+        '''
+        Tracks the status of async jobs in the current process.
+
+        Finished jobs are kept for `finished_job_ttl` seconds, and the oldest jobs are evicted once more than
+        `max_jobs` are tracked.
+        '''
+        self.finished_job_ttl = finished_job_ttl
+        self.max_jobs = max_jobs
+        self._jobs: OrderedDict[str, dict] = OrderedDict()
+
+    def create(self, job_id: str):
+        now = time.time()
+        self._jobs[job_id] = {
+            "jobId": job_id,
+            "status": JobStatus.PENDING,
+            "createdAt": now,
+            "updatedAt": now
+        }
+        self._evict(now)
+
+    def set_status(self, job_id: str, status: str):
+        if job_id not in self._jobs:
+            return
+        job = self._jobs[job_id]
+        job["status"] = status
+        job["updatedAt"] = time.time()
+
+    def get(self, job_id: str):
+        '''
+        Returns a snapshot of the job or None if the job is unknown or expired.
+        '''
+        if job_id not in self._jobs:
+            return None
+        job = self._jobs[job_id]
+        if self._is_expired(job, time.time()):
+            del self._jobs[job_id]
+            return None
+        return dict(job)
+
+    def _is_expired(self, job: dict, now: float):
+        return job["status"] in FINISHED_JOB_STATUSES and now - job["updatedAt"] > self.finished_job_ttl
+
+    def _evict(self, now: float):
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+        # Jobs are ordered by creation, so only the head needs checking on every insertion.
+        while len(self._jobs) > 0:
+            oldest_job_id = next(iter(self._jobs))
+            if not self._is_expired(self._jobs[oldest_job_id], now):
+                break
+            del self._jobs[oldest_job_id]
+
+
+class SqliteJobRegistry:
+    # Jobs are visible to every process that opens the same database file.
+    shared = True
+
+    def __init__(self, path: str, finished_job_ttl=3600, max_jobs=100000) -> None:
+        '''
+        Tracks the status of async jobs in a SQLite database, so that every worker of a server can answer status
+        queries and cancel requests for any job.
+
+        Has the same eviction rules as `InMemoryJobRegistry`.
+        '''
+        self.path = path
+        self.finished_job_ttl = finished_job_ttl
+        self.max_jobs = max_jobs
+        self._local = threading.local()
+        connection = self._get_connection()
+        # WAL lets workers read while another one writes, and only syncs on checkpoints.
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('''CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            cancel_requested INTEGER NOT NULL DEFAULT 0
+        )''')
+        connection.execute('CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at)')
+        connection.execute('CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)')
+
+    def _get_connection(self):
+        # SQLite connections cannot be shared between threads.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def create(self, job_id: str):
+        now = time.time()
+        connection = self._get_connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO jobs (job_id, status, created_at, updated_at) VALUES (?, ?, ?, ?)',
+            (job_id, JobStatus.PENDING, now, now))
+        self._evict(connection, now)
+
+    def set_status(self, job_id: str, status: str):
+        self._get_connection().execute(
+            'UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?', (status, time.time(), job_id))
+
+    def get(self, job_id: str):
+        '''
+        Returns a snapshot of the job or None if the job is unknown or expired.
+        '''
+        row = self._get_connection().execute(
+            'SELECT status, created_at, updated_at FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        status, created_at, updated_at = row
+        if status in FINISHED_JOB_STATUSES and time.time() - updated_at > self.finished_job_ttl:
+            return None
+        return {
+            "jobId": job_id,
+            "status": status,
+            "createdAt": created_at,
+            "updatedAt": updated_at
+        }
+
+    def request_cancel(self, job_id: str):
+        '''
+        Asks the worker that runs the job to cancel it.
+        '''
+        self._get_connection().execute('UPDATE jobs SET cancel_requested = 1 WHERE job_id = ?', (job_id,))
+
+    def is_cancel_requested(self, job_id: str):
+        row = self._get_connection().execute(
+            'SELECT cancel_requested FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return row is not None and bool(row[0])
+
+    def _evict(self, connection: sqlite3.Connection, now: float):
+        connection.execute('DELETE FROM jobs WHERE status IN ({}) AND updated_at < ?'.format(
+            ', '.join('?' for _ in FINISHED_JOB_STATUSES)), (*FINISHED_JOB_STATUSES, now - self.finished_job_ttl))
+        connection.execute(
+            'DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs ORDER BY created_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_jobs,))
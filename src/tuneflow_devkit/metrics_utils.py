@@ -0,0 +1,184 @@
+from __future__ import annotations
+from typing import Dict, Tuple
+import bisect
+import re
+import time
+
+DEFAULT_DURATION_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+DEFAULT_SIZE_BUCKETS = [1024 * 4 ** exponent for exponent in range(10)]
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(label_names, label_values):
+    if len(label_names) == 0:
+        return ''
+    label_pairs = []
+    for label_name, label_value in zip(label_names, label_values):
+        escaped_value = str(label_value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        label_pairs.append(f'{label_name}="{escaped_value}"')
+    return '{' + ','.join(label_pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def to_snake_case(name: str):
+    return re.sub(r'([A-Z])', lambda match: '_' + match.group(1).lower(), name)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, label_names=()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, label_values=(), value=1):
+        self._values[label_values] = self._values.get(label_values, 0) + value
+
+    def get_lines(self):
+        return [f'{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}'
+                for label_values, value in self._values.items()]
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, label_values=(), value=0):
+        self._values[label_values] = value
+
+    def dec(self, label_values=(), value=1):
+        self.inc(label_values, -value)
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, label_names=(), buckets=DEFAULT_DURATION_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = list(buckets)
+        self._bucket_counts: Dict[Tuple, list] = {}
+        self._sums: Dict[Tuple, float] = {}
+
+    def observe(self, label_values=(), value=0):
+        if label_values not in self._bucket_counts:
+            self._bucket_counts[label_values] = [0] * (len(self.buckets) + 1)
+            self._sums[label_values] = 0
+        self._bucket_counts[label_values][bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[label_values] += value
+
+    def get_lines(self):
+        lines = []
+        bucket_label_names = tuple(self.label_names) + ('le',)
+        for label_values, bucket_counts in self._bucket_counts.items():
+            cumulative_count = 0
+            for upper_bound, bucket_count in zip(self.buckets + [float('inf')], bucket_counts):
+                cumulative_count += bucket_count
+                lines.append(
+                    f'{self.name}_bucket{_format_labels(bucket_label_names, tuple(label_values) + (_format_value(upper_bound),))} {cumulative_count}')
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(self._sums[label_values])}')
+            lines.append(f'{self.name}_count{labels} {cumulative_count}')
+        return lines
+
+
+class PluginMetrics:
+    def __init__(self, span_handler=None) -> None:
+        '''
+        Collects per-plugin timings, payload sizes, in-flight jobs and errors in the Prometheus text format.
+
+        `span_handler(name, attributes, start_time, duration)` is additionally called for every timed phase so
+        that spans can be forwarded to an external tracer.
+        '''
+        self.enabled = True
+        self.span_handler = span_handler
+        plugin_label_names = ('provider_id', 'plugin_id')
+        self._phase_durations = Histogram(
+            'tuneflow_devkit_phase_duration_seconds', 'Duration of each request processing phase.',
+            plugin_label_names + ('phase',))
+        self._queue_wait_durations = Histogram(
+            'tuneflow_devkit_queue_wait_seconds', 'Time jobs spent waiting for an execution slot.', plugin_label_names)
+        self._payload_sizes = Histogram(
+            'tuneflow_devkit_payload_size_bytes', 'Size of request and response payloads.',
+            plugin_label_names + ('direction',),
+            buckets=DEFAULT_SIZE_BUCKETS)
+        self._in_flight_jobs = Gauge(
+            'tuneflow_devkit_in_flight_jobs', 'Number of jobs currently executing.', plugin_label_names)
+        self._errors = Counter('tuneflow_devkit_errors_total', 'Number of failed or rejected requests.',
+                               plugin_label_names + ('type',))
+        self._metrics = [self._phase_durations, self._queue_wait_durations,
+                         self._payload_sizes, self._in_flight_jobs, self._errors]
+
+    def observe_phase(self, provider_id: str, plugin_id: str, phase: str, duration: float, start_time: float | None = None):
+        self._phase_durations.observe((provider_id, plugin_id, phase), duration)
+        if self.span_handler is not None:
+            self.span_handler(phase, {"providerId": provider_id, "pluginId": plugin_id},
+                              start_time if start_time is not None else time.time() - duration, duration)
+
+    def observe_queue_wait(self, provider_id: str, plugin_id: str, duration: float):
+        self._queue_wait_durations.observe((provider_id, plugin_id), duration)
+
+    def observe_payload_size(self, provider_id: str, plugin_id: str, direction: str, size: int):
+        self._payload_sizes.observe((provider_id, plugin_id, direction), size)
+
+    def inc_in_flight(self, provider_id: str, plugin_id: str):
+        self._in_flight_jobs.inc((provider_id, plugin_id))
+
+    def dec_in_flight(self, provider_id: str, plugin_id: str):
+        self._in_flight_jobs.dec((provider_id, plugin_id))
+
+    def inc_error(self, provider_id: str, plugin_id: str, error_type: str):
+        self._errors.inc((provider_id, plugin_id, error_type))
+
+    def render(self, gauges: Dict[str, float] | None = None):
+        '''
+        Renders all metrics, plus unlabeled gauges sampled at scrape time.
+        '''
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.get_lines())
+        if gauges is not None:
+            for name, value in gauges.items():
+                lines.append(f'# TYPE {name} gauge')
+                lines.append(f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class DisabledPluginMetrics(PluginMetrics):
+    '''
+    Drop-in replacement that records nothing when metrics are disabled.
+    '''
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.span_handler = None
+
+    def observe_phase(self, provider_id, plugin_id, phase, duration, start_time=None):
+        pass
+
+    def observe_queue_wait(self, provider_id, plugin_id, duration):
+        pass
+
+    def observe_payload_size(self, provider_id, plugin_id, direction, size):
+        pass
+
+    def inc_in_flight(self, provider_id, plugin_id):
+        pass
+
+    def dec_in_flight(self, provider_id, plugin_id):
+        pass
+
+    def inc_error(self, provider_id, plugin_id, error_type):
+        pass
+
+    def render(self, gauges=None):
+        return ''
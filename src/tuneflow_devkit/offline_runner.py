@@ -0,0 +1,183 @@
+from __future__ import annotations
+from tuneflow_py import TuneflowPlugin
+from typing import List, Type
+from tuneflow_devkit.validation_utils import validate_plugin
+from tuneflow_devkit.dispatch_utils import PluginDispatchTable
+from tuneflow_devkit.executor_utils import PluginExecutor, run_plugin_task
+from concurrent.futures import FIRST_COMPLETED, wait
+from msgpack import Unpacker
+import json
+import os
+import re
+import tempfile
+import time
+
+DEFAULT_PROGRESS_FILE_NAME = 'progress.jsonl'
+# Resulting songs are kept apart from the progress file, so that no item id can overwrite it.
+SONGS_DIR_NAME = 'songs'
+MAX_STREAM_BUFFER_SIZE = 2 ** 31 - 1
+# Item ids become file names, so they cannot contain path separators or start with a dot.
+_ITEM_ID_PATTERN = re.compile(r'^\w[\w. -]{0,254}$')
+
+
+def is_valid_item_id(item_id: str):
+    return _ITEM_ID_PATTERN.match(item_id) is not None
+
+
+def iterate_input_items(input_path: str):
+    '''
+    Yields (item_id, song_bytes, params) from a directory of serialized songs or a msgpack stream of
+    `{"id", "song", "params"}` maps, where `id` and `params` are optional.
+
+    Params are None unless the item specifies its own.
+    '''
+    if os.path.isdir(input_path):
+        for file_name in sorted(os.listdir(input_path)):
+            file_path = os.path.join(input_path, file_name)
+            if not os.path.isfile(file_path):
+                continue
+            with open(file_path, 'rb') as song_file:
+                yield file_name, song_file.read(), None
+        return
+    with open(input_path, 'rb') as stream_file:
+        for index, item in enumerate(Unpacker(stream_file, max_buffer_size=MAX_STREAM_BUFFER_SIZE)):
+            yield str(item["id"]) if "id" in item else f'{index}.song', item["song"], item["params"] if "params" in item else None
+
+
+def load_completed_ids(progress_file_path: str):
+    '''
+    Returns the ids of the items that finished successfully in previous runs.
+    '''
+    completed_ids = set()
+    if not os.path.exists(progress_file_path):
+        return completed_ids
+    with open(progress_file_path, 'r', encoding='utf-8') as progress_file:
+        for line in progress_file:
+            try:
+                progress = json.loads(line)
+            except ValueError:
+                # The last line may be partial if the previous run was killed.
+                continue
+            if progress["status"] == "OK":
+                completed_ids.add(progress["id"])
+    return completed_ids
+
+
+def write_file_atomically(file_path: str, data: bytes):
+    file_descriptor, temp_file_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'wb') as temp_file:
+            temp_file.write(data)
+        os.replace(temp_file_path, file_path)
+    except BaseException:
+        os.remove(temp_file_path)
+        raise
+
+
+class OfflineRunner:
+    def __init__(self, plugin_class_list: List[Type[TuneflowPlugin]], bundle_file_path: str) -> None:
+        '''
+        Runs plugins of a bundle over songs on disk without starting a server.
+        '''
+        for plugin_class in plugin_class_list:
+            validate_plugin(plugin_class=plugin_class)
+        self._plugin_class_list = plugin_class_list
+        with open(bundle_file_path, 'r', encoding='utf-8') as bundle_file:
+            # Validate plugin and bundle.
+            self._dispatch_table = PluginDispatchTable.from_bundle(
+                plugin_class_list=plugin_class_list, bundle_info=json.load(bundle_file))
+
+    def _find_plugin_class(self, provider_id: str | None, plugin_id: str | None):
+        if provider_id is None and plugin_id is None:
+            if len(self._dispatch_table) != 1:
+                raise Exception("provider_id and plugin_id must be provided when the bundle has multiple plugins")
+            return next(iter(self._dispatch_table)).plugin_class
+        entry = self._dispatch_table.get(provider_id, plugin_id)  # type: ignore
+        if entry is None:
+            raise Exception(f"Cannot find plugin by id {provider_id} {plugin_id}")
+        return entry.plugin_class
+
+    def run(self, input_path: str, output_dir: str, provider_id: str | None = None, plugin_id: str | None = None,
+            params=None, mode='process', max_workers=None, progress_file_path: str | None = None):
+        '''
+        Runs the plugin over every song of `input_path` and writes the resulting songs into `output_dir/songs`.
+
+        Finished items are appended to a progress file, `output_dir/progress.jsonl` by default, and skipped when
+        the run is started again. Items with an invalid or duplicate id, and items whose result cannot be written,
+        fail on their own. Returns the number of succeeded, failed and skipped items.
+        '''
+        plugin_class = self._find_plugin_class(provider_id, plugin_id)
+        songs_dir = os.path.join(output_dir, SONGS_DIR_NAME)
+        os.makedirs(songs_dir, exist_ok=True)
+        if progress_file_path is None:
+            progress_file_path = os.path.join(output_dir, DEFAULT_PROGRESS_FILE_NAME)
+        completed_ids = load_completed_ids(progress_file_path)
+        plugin_executor = PluginExecutor(plugin_class_list=self._plugin_class_list, mode=mode, max_workers=max_workers)
+        # Keep the workers busy without loading every song into memory.
+        max_in_flight = plugin_executor.max_workers * 2
+        stats = {"ok": 0, "error": 0, "skipped": 0, "inputBytes": 0}
+        start_time = time.perf_counter()
+        pending_items = {}
+        seen_ids = set()
+
+        def record_progress(item_id: str, error):
+            if error is None:
+                progress = {"id": item_id, "status": "OK"}
+                stats["ok"] += 1
+            else:
+                progress = {"id": item_id, "status": "ERROR", "error": repr(error)}
+                stats["error"] += 1
+            progress_file.write(json.dumps(progress) + '\n')
+            progress_file.flush()
+
+        def handle_done_items(done_futures):
+            for future in done_futures:
+                item_id = pending_items.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"status": "ERROR", "error": e}
+                error = None
+                if result["status"] == "OK":
+                    try:
+                        write_file_atomically(os.path.join(songs_dir, item_id), result["song"])
+                    except OSError as e:
+                        error = e
+                else:
+                    error = result["error"] if "error" in result else result["status"]
+                record_progress(item_id, error)
+
+        with open(progress_file_path, 'a', encoding='utf-8') as progress_file:
+            try:
+                plugin_executor.setup()
+                for item_id, song_bytes, item_params in iterate_input_items(input_path):
+                    if not is_valid_item_id(item_id):
+                        record_progress(item_id, Exception(f"Invalid item id {item_id!r}"))
+                        continue
+                    if item_id in seen_ids:
+                        record_progress(item_id, Exception(f"Duplicate item id {item_id!r}"))
+                        continue
+                    seen_ids.add(item_id)
+                    if item_id in completed_ids:
+                        stats["skipped"] += 1
+                        continue
+                    while len(pending_items) >= max_in_flight:
+                        done_futures, _ = wait(list(pending_items.keys()), return_when=FIRST_COMPLETED)
+                        handle_done_items(done_futures)
+                    future = plugin_executor.submit(
+                        run_plugin_task, plugin_class, song_bytes, item_params if item_params is not None else (params or {}))
+                    pending_items[future] = item_id
+                    stats["inputBytes"] += len(song_bytes)
+                while len(pending_items) > 0:
+                    done_futures, _ = wait(list(pending_items.keys()), return_when=FIRST_COMPLETED)
+                    handle_done_items(done_futures)
+            finally:
+                plugin_executor.shutdown(wait=True)
+        elapsed = time.perf_counter() - start_time
+        processed_count = stats["ok"] + stats["error"]
+        stats["seconds"] = elapsed
+        print(f'Processed {processed_count} songs in {elapsed:.2f}s '
+              f'({processed_count / elapsed if elapsed > 0 else 0:.2f} songs/s, '
+              f'{stats["inputBytes"] / 1024 / 1024 / elapsed if elapsed > 0 else 0:.2f} MB/s), '
+              f'{stats["ok"]} succeeded, {stats["error"]} failed, {stats["skipped"]} skipped')
+        return stats
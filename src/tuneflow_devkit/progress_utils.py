@@ -0,0 +1,155 @@
+from __future__ import annotations
+from tuneflow_py import Song
+import asyncio
+import base64
+import json
+import threading
+import time
+
+DEFAULT_PROGRESS_INTERVAL = 0.5
+# Progress a slow subscriber has not read yet, older progress is dropped first.
+MAX_PENDING_PROGRESS = 16
+# Comment lines sent to idle event streams so that proxies keep the connection open.
+KEEP_ALIVE_INTERVAL = 15
+
+
+class ProgressReporter:
+    def __init__(self, callback, min_interval=DEFAULT_PROGRESS_INTERVAL) -> None:
+        '''
+        Forwards the progress of a job to `callback(progress)`, at most once per `min_interval` seconds.
+
+        Reports that come too early are dropped, except the ones that change the stage or finish the job. The
+        callback runs in the plugin thread and must not block.
+        '''
+        self.callback = callback
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._last_report_time = None
+        self._last_stage = None
+
+    def report(self, progress: float | None = None, stage: str | None = None, song: Song | None = None):
+        '''
+        Reports the completed fraction of the job between 0 and 1, the current stage, and optionally a snapshot
+        of the song so far. Returns False if the report was dropped.
+        '''
+        now = time.monotonic()
+        with self._lock:
+            is_final = progress is not None and progress >= 1
+            if not is_final and stage == self._last_stage and self._last_report_time is not None and \
+                    now - self._last_report_time < self.min_interval:
+                return False
+            self._last_report_time = now
+            self._last_stage = stage
+        job_progress = {
+            "progress": progress,
+            "stage": stage
+        }
+        # Songs are only serialized for the reports that are sent.
+        if song is not None:
+            job_progress["song"] = song.serialize_to_bytestring()
+        self.callback(job_progress)
+        return True
+
+
+class _NoProgressReporter(ProgressReporter):
+    def __init__(self) -> None:
+        super().__init__(callback=None)
+
+    def report(self, progress=None, stage=None, song=None):
+        return False
+
+
+# Reporter of the job running in the current thread.
+_local = threading.local()
+_no_progress_reporter = _NoProgressReporter()
+
+
+def get_progress_reporter() -> ProgressReporter:
+    '''
+    Returns the progress reporter of the job running in the current thread, reports are ignored outside of a job or
+    if nobody listens to the job.
+    '''
+    reporter = getattr(_local, 'reporter', None)
+    return reporter if reporter is not None else _no_progress_reporter
+
+
+def report_progress(progress: float | None = None, stage: str | None = None, song: Song | None = None):
+    '''
+    Reports the progress of the current job, see `ProgressReporter.report`.
+    '''
+    return get_progress_reporter().report(progress=progress, stage=stage, song=song)
+
+
+def run_with_progress_reporter(progress_reporter: ProgressReporter | None, function, *args):
+    previous_reporter = getattr(_local, 'reporter', None)
+    _local.reporter = progress_reporter
+    try:
+        return function(*args)
+    finally:
+        _local.reporter = previous_reporter
+
+
+class ProgressChannel:
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        '''
+        Fans out the progress of a job to the subscribers on the event loop.
+        '''
+        self._loop = loop
+        self._subscribers = set()
+        self.latest_progress = None
+        self.closed = False
+
+    def publish_threadsafe(self, progress: dict):
+        self._loop.call_soon_threadsafe(self.publish, progress)
+
+    def publish(self, progress: dict | None):
+        if self.closed:
+            return
+        if progress is not None:
+            self.latest_progress = progress
+        else:
+            self.closed = True
+        for queue in self._subscribers:
+            if queue.full():
+                # Slow subscribers only miss intermediate progress.
+                queue.get_nowait()
+            queue.put_nowait(progress)
+
+    def close(self):
+        self.publish(None)
+
+    async def subscribe(self):
+        '''
+        Yields the latest progress and then every new progress until the channel is closed. Yields None when there
+        was no progress for `KEEP_ALIVE_INTERVAL` seconds.
+        '''
+        queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_PENDING_PROGRESS)
+        if self.latest_progress is not None:
+            queue.put_nowait(self.latest_progress)
+        if self.closed:
+            queue.put_nowait(None)
+        self._subscribers.add(queue)
+        try:
+            while True:
+                try:
+                    progress = await asyncio.wait_for(queue.get(), timeout=KEEP_ALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if progress is None:
+                    return
+                yield progress
+        finally:
+            self._subscribers.discard(queue)
+
+
+def format_server_sent_event(event: str | None, data: dict | None = None):
+    '''
+    Formats an event of a `text/event-stream`, song snapshots are base64 encoded. Without an event a comment is
+    returned to keep the connection alive.
+    '''
+    if event is None:
+        return b': keep-alive\n\n'
+    if data is not None and "song" in data:
+        data = dict(data, song=base64.b64encode(data["song"]).decode('ascii'))
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode('utf-8')
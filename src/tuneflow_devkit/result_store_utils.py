@@ -0,0 +1,200 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import os
+import re
+import tempfile
+import threading
+import time
+
+# Job ids are nanoids, anything else is rejected so that ids cannot escape the store directory.
+_JOB_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,128}$')
+
+
+def is_valid_job_id(job_id: str):
+    return _JOB_ID_PATTERN.match(job_id) is not None
+
+
+class ResultTooLargeError(Exception):
+    pass
+
+
+class ResultStore(ABC):
+    '''
+    Stores the packed results of async jobs.
+
+    External stores implement `put` and `get`, and may implement `get_result_url` to let clients download results
+    from elsewhere. Stores on local disk can also implement `get_file_path` so that results are sent from the file.
+    All methods may do blocking IO, they are called from worker threads.
+    '''
+
+    @abstractmethod
+    def put(self, job_id: str, result: bytes):
+        '''
+        Stores a result, raises `ResultTooLargeError` if the store cannot keep a result of this size.
+        '''
+
+    @abstractmethod
+    def get(self, job_id: str) -> bytes | None:
+        '''
+        Returns a stored result, or None if it is missing or expired.
+        '''
+
+    def get_file_path(self, job_id: str) -> str | None:
+        return None
+
+    def get_result_url(self, job_id: str) -> str | None:
+        '''
+        Returns the URL clients download the result from, or None to serve it from `GET /jobs/{job_id}/result`.
+        '''
+        return None
+
+
+class InMemoryResultStore(ResultStore):
+    def __init__(self, ttl=3600, max_memory_bytes=256 * 1024 * 1024) -> None:
+        '''
+        Keeps results in memory for `ttl` seconds, the oldest results are evicted once they take more than
+        `max_memory_bytes`.
+        '''
+        self.ttl = ttl
+        self.max_memory_bytes = max_memory_bytes
+        self._lock = threading.Lock()
+        self._results: OrderedDict[str, tuple] = OrderedDict()
+        self._memory_bytes = 0
+
+    def put(self, job_id: str, result: bytes):
+        if len(result) > self.max_memory_bytes:
+            raise ResultTooLargeError(f"Result of {len(result)} bytes exceeds the limit of {self.max_memory_bytes} bytes")
+        now = time.time()
+        with self._lock:
+            if job_id in self._results:
+                self._memory_bytes -= len(self._results.pop(job_id)[0])
+            self._results[job_id] = (result, now)
+            self._memory_bytes += len(result)
+            # Results are ordered by insertion, so expired ones are at the head.
+            while len(self._results) > 0:
+                oldest_result, stored_at = next(iter(self._results.values()))
+                if self._memory_bytes <= self.max_memory_bytes and now - stored_at <= self.ttl:
+                    break
+                self._results.popitem(last=False)
+                self._memory_bytes -= len(oldest_result)
+
+    def get(self, job_id: str):
+        with self._lock:
+            if job_id not in self._results:
+                return None
+            result, stored_at = self._results[job_id]
+            if time.time() - stored_at > self.ttl:
+                del self._results[job_id]
+                self._memory_bytes -= len(result)
+                return None
+            return result
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "results": len(self._results),
+                "memoryBytes": self._memory_bytes
+            }
+
+
+class FileSystemResultStore(ResultStore):
+    def __init__(self, directory: str, ttl=3600, max_disk_bytes=1024 * 1024 * 1024, cleanup_interval=60) -> None:
+        '''
+        Writes results into `directory` atomically, so readers never see a partial result.
+
+        Results older than `ttl` seconds are removed at most every `cleanup_interval` seconds, and the oldest results
+        are removed once the directory takes more than `max_disk_bytes`.
+        '''
+        self.directory = directory
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self.cleanup_interval = cleanup_interval
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        self._last_cleanup_time = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self._cleanup()
+
+    def _get_file_path(self, job_id: str):
+        if not is_valid_job_id(job_id):
+            raise ValueError(f"Invalid job id {job_id!r}")
+        return os.path.join(self.directory, job_id)
+
+    def put(self, job_id: str, result: bytes):
+        if len(result) > self.max_disk_bytes:
+            raise ResultTooLargeError(f"Result of {len(result)} bytes exceeds the limit of {self.max_disk_bytes} bytes")
+        file_path = self._get_file_path(job_id)
+        file_descriptor, temp_file_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(file_descriptor, 'wb') as temp_file:
+            temp_file.write(result)
+        os.replace(temp_file_path, file_path)
+        with self._lock:
+            self._disk_bytes += len(result)
+            needs_cleanup = self._disk_bytes > self.max_disk_bytes or \
+                time.time() - self._last_cleanup_time >= self.cleanup_interval
+        if needs_cleanup:
+            self._cleanup()
+
+    def get_file_path(self, job_id: str):
+        '''
+        Returns the path of the result file, or None if the result does not exist or expired.
+        '''
+        if not is_valid_job_id(job_id):
+            return None
+        file_path = self._get_file_path(job_id)
+        try:
+            file_stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        if time.time() - file_stat.st_mtime > self.ttl:
+            return None
+        return file_path
+
+    def get(self, job_id: str):
+        file_path = self.get_file_path(job_id)
+        if file_path is None:
+            return None
+        try:
+            with open(file_path, 'rb') as result_file:
+                return result_file.read()
+        except FileNotFoundError:
+            return None
+
+    def _cleanup(self):
+        now = time.time()
+        result_files = []
+        for file_name in os.listdir(self.directory):
+            file_path = os.path.join(self.directory, file_name)
+            try:
+                file_stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            # Temporary files are left by writes that did not finish, remove them once they are old enough.
+            if now - file_stat.st_mtime > self.ttl or (file_name.endswith('.tmp') and now - file_stat.st_mtime > 60):
+                self._remove_file(file_path)
+                continue
+            if not file_name.endswith('.tmp'):
+                result_files.append((file_stat.st_mtime, file_stat.st_size, file_path))
+        result_files.sort()
+        disk_bytes = sum(file_size for _, file_size, _ in result_files)
+        for _, file_size, file_path in result_files:
+            if disk_bytes <= self.max_disk_bytes:
+                break
+            self._remove_file(file_path)
+            disk_bytes -= file_size
+        with self._lock:
+            self._disk_bytes = disk_bytes
+            self._last_cleanup_time = now
+
+    def _remove_file(self, file_path: str):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "diskBytes": self._disk_bytes
+            }
@@ -1,18 +1,42 @@
 from __future__ import annotations
-from tuneflow_py import TuneflowPlugin, Song
+from tuneflow_py import TuneflowPlugin
 from typing import Type, List
 import json
-from msgpack import unpackb, packb
-from tuneflow_devkit.validation_utils import validate_plugin, find_match_plugin_info
-from collections import defaultdict
+from msgpack import packb
+from tuneflow_devkit.validation_utils import validate_plugin
+from tuneflow_devkit.dispatch_utils import PluginDispatchTable, PluginEntry
+from tuneflow_devkit.executor_utils import PluginExecutor, init_plugin_task, run_plugin_task
+from tuneflow_devkit.bundle_utils import BundleInfoStore
+from tuneflow_devkit.cache_utils import ResultCache, SingleFlight, compute_cache_key
+from tuneflow_devkit.cancellation_utils import CANCELLED, TIMEOUT, CancellationToken
+from tuneflow_devkit.codec_utils import BodyTooLargeError, DEFAULT_CHUNK_SIZE, InvalidContentLengthError, \
+    get_packed_chunks, read_msgpack_body
+from tuneflow_devkit.compression_utils import DEFAULT_ENCODINGS, DEFAULT_MIN_COMPRESSION_SIZE, UnsupportedEncodingError, \
+    InvalidCompressedDataError, compress_chunks, get_available_encodings, negotiate_encoding
+from tuneflow_devkit.delta_utils import RESPONSE_MODES
+from tuneflow_devkit.job_utils import FINISHED_JOB_STATUSES, InMemoryJobRegistry, JobStatus, SqliteJobRegistry
+from tuneflow_devkit.progress_utils import DEFAULT_PROGRESS_INTERVAL, ProgressChannel, ProgressReporter, \
+    format_server_sent_event
+from tuneflow_devkit.result_store_utils import FileSystemResultStore, InMemoryResultStore, ResultTooLargeError, \
+    is_valid_job_id
+from tuneflow_devkit.metrics_utils import DisabledPluginMetrics, METRICS_CONTENT_TYPE, PluginMetrics, to_snake_case
+from tuneflow_devkit.scheduler_utils import DEFAULT_QUEUE_SIZE_PER_SLOT, JobScheduler, JobTicket, SchedulerSaturatedError
 from fastapi import FastAPI, Request, Response, Depends, BackgroundTasks
+from fastapi.responses import FileResponse, StreamingResponse
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import functools
+import inspect
+import random
+import time
 from fastapi.middleware.cors import CORSMiddleware
 import traceback
 from nanoid import generate as generate_nanoid
 from urllib.parse import urljoin
 
+# How often a worker checks the shared job registry for jobs that run in other workers.
+SHARED_JOB_POLL_INTERVAL = 1
+
 
 class Runner:
     def __init__(self, plugin_class_list: List[Type[TuneflowPlugin]], bundle_file_path: str) -> None:
@@ -24,33 +48,28 @@ class Runner:
         for plugin_class in plugin_class_list:
             validate_plugin(plugin_class=plugin_class)
         self._plugin_class_list = plugin_class_list
-        self._plugin_info_map = defaultdict(dict)
+        self._bundle_file_path = bundle_file_path
         self._bundle_info: dict | None = None
-        with open(bundle_file_path, 'r', encoding='utf-8') as bundle_file:
+        self.reload_bundle()
+
+    def reload_bundle(self):
+        '''
+        Reads the bundle.json again, raises if it does not match the plugin list.
+        '''
+        with open(self._bundle_file_path, 'r', encoding='utf-8') as bundle_file:
             bundle_info = json.load(bundle_file)
-            self._bundle_info = bundle_info
             # Validate plugin and bundle.
-            for plugin_class in plugin_class_list:
-                provider_id = plugin_class.provider_id()
-                plugin_id = plugin_class.plugin_id()
-                plugin_info = find_match_plugin_info(
-                    bundle_info=bundle_info, provider_id=provider_id,
-                    plugin_id=plugin_id)
-                if plugin_info is None:
-                    raise Exception(
-                        "plugin not specified in the bundle, check your bundle.json. For more information checkout https://github.com/tuneflow/tuneflow-py")
-                self._plugin_info_map[provider_id][plugin_id] = plugin_info
-            # Ensure all entries in bundle.info have corresponding plugin code.
-            for plugin_info in bundle_info["plugins"]:
-                if not any(
-                        plugin_class.provider_id() == plugin_info["providerId"] and plugin_class.plugin_id() ==
-                        plugin_info["pluginId"] for plugin_class in plugin_class_list):
-                    raise Exception(
-                        f'Plugin {plugin_info["providerId"]} {plugin_info["pluginId"]} has no corresponding source code in the plugin list')
+            self._dispatch_table = PluginDispatchTable.from_bundle(
+                plugin_class_list=self._plugin_class_list, bundle_info=bundle_info)
+            self._bundle_info = bundle_info
+        return bundle_info
 
     def start(self, path_prefix='/', config=None):
         '''
         @param port Port to run the server
+
+        Plugins are set up when the app starts, or on the first job or readiness check if the server runs without
+        lifespan events. Plugin teardown only runs on a lifespan shutdown.
         '''
 
         app = FastAPI()
@@ -69,11 +88,139 @@ class Runner:
 
         async_config = config["async"] if config and "async" in config else None
         exception_handler = config["exception"]["handler"] if config and "exception" in config and "handler" in config["exception"] else None
+        executor_config = config["executor"] if config and "executor" in config else {}
+        plugin_executor = PluginExecutor(
+            plugin_class_list=self._plugin_class_list,
+            mode=executor_config["mode"] if "mode" in executor_config else 'thread',
+            max_workers=executor_config["maxWorkers"] if "maxWorkers" in executor_config else None)
+        print(f'Running plugins in {plugin_executor.mode} mode')
+        # Seconds a job may take, including its time in the queue, plugins can override it with their own `timeout`.
+        default_timeout = executor_config["timeout"] if "timeout" in executor_config else None
+        plugin_configs = config["plugins"] if config and "plugins" in config else None
+        dispatch_table = self._dispatch_table.with_plugin_configs(plugin_configs)
+        routing_config = config["routing"] if config and "routing" in config else {}
+        per_plugin_routes = routing_config["perPluginRoutes"] if "perPluginRoutes" in routing_config else False
+        scheduler_config = config["scheduler"] if config and "scheduler" in config else {}
+        max_concurrency = scheduler_config["maxConcurrency"] \
+            if "maxConcurrency" in scheduler_config else plugin_executor.max_workers
+        job_scheduler = JobScheduler(
+            max_concurrency=max_concurrency,
+            # The queue is bounded by default, `maxQueueSize: None` lets it grow without limit.
+            max_queue_size=scheduler_config["maxQueueSize"]
+            if "maxQueueSize" in scheduler_config else max_concurrency * DEFAULT_QUEUE_SIZE_PER_SLOT,
+            plugin_configs=plugin_configs,
+            retry_after=scheduler_config["retryAfter"] if "retryAfter" in scheduler_config else 1)
+        app.state.job_scheduler = job_scheduler
+        jobs_config = config["jobs"] if config and "jobs" in config else {}
+        finished_job_ttl = jobs_config["finishedJobTtl"] if "finishedJobTtl" in jobs_config else 3600
+        max_jobs = jobs_config["maxJobs"] if "maxJobs" in jobs_config else 100000
+        # Servers with several worker processes need a shared registry so that any worker can answer for any job.
+        if "backend" in jobs_config:
+            job_registry = jobs_config["backend"]
+        elif "registry" in jobs_config and jobs_config["registry"] == 'sqlite':
+            job_registry = SqliteJobRegistry(path=jobs_config["path"], finished_job_ttl=finished_job_ttl, max_jobs=max_jobs)
+        else:
+            job_registry = InMemoryJobRegistry(finished_job_ttl=finished_job_ttl, max_jobs=max_jobs)
+        is_job_registry_shared = getattr(job_registry, 'shared', False)
+        app.state.job_registry = job_registry
+        # Cancellation tokens of the async jobs that have not finished.
+        job_cancellation_tokens = {}
+        # Progress of the async jobs that have not finished, streamed by `GET /jobs/{job_id}/events`.
+        job_progress_channels = {}
+        progress_config = config["progress"] if config and "progress" in config else {}
+        progress_interval = progress_config["minInterval"] if "minInterval" in progress_config else DEFAULT_PROGRESS_INTERVAL
+        batch_config = config["batch"] if config and "batch" in config else {}
+        max_batch_items = batch_config["maxItems"] if "maxItems" in batch_config else 10000
+        # Number of items of one batch submitted to the scheduler at a time.
+        batch_concurrency = batch_config["maxConcurrency"] if "maxConcurrency" in batch_config else job_scheduler.max_concurrency
+        streaming_config = config["streaming"] if config and "streaming" in config else {}
+        max_body_size = streaming_config["maxBodySize"] if "maxBodySize" in streaming_config else None
+        response_chunk_size = streaming_config["chunkSize"] if "chunkSize" in streaming_config else DEFAULT_CHUNK_SIZE
+        compression_config = config["compression"] if config and "compression" in config else {}
+        compression_enabled = "enabled" not in compression_config or compression_config["enabled"]
+        # Encodings used for responses in order of preference, compressed requests are accepted regardless.
+        response_encodings = [encoding for encoding in (
+            compression_config["encodings"] if "encodings" in compression_config else DEFAULT_ENCODINGS)
+            if compression_enabled and encoding in get_available_encodings()]
+        min_compression_size = compression_config["minSize"] if "minSize" in compression_config else DEFAULT_MIN_COMPRESSION_SIZE
+        compression_levels = compression_config["levels"] if "levels" in compression_config else {}
+        print(f'Compressing responses with: {response_encodings}')
+        cache_config = config["cache"] if config and "cache" in config else None
+        result_cache = None
+        if cache_config is not None and ("enabled" not in cache_config or cache_config["enabled"]) and "backend" in cache_config:
+            # Custom caches implement `get`, `put` and `get_stats` like `ResultCache`.
+            result_cache = cache_config["backend"]
+        elif cache_config is not None and ("enabled" not in cache_config or cache_config["enabled"]):
+            # The disk tier can be shared by the workers of a server, the memory tier belongs to each worker.
+            result_cache = ResultCache(
+                max_memory_bytes=cache_config["maxMemoryBytes"] if "maxMemoryBytes" in cache_config else 256 * 1024 * 1024,
+                directory=cache_config["directory"] if "directory" in cache_config else None,
+                max_disk_bytes=cache_config["maxDiskBytes"] if "maxDiskBytes" in cache_config else 1024 * 1024 * 1024)
+        # Exposes the cache hit/miss counters through `app.state.result_cache.get_stats()`.
+        app.state.result_cache = result_cache
+        single_flight_config = config["singleFlight"] if config and "singleFlight" in config else None
+        single_flight = SingleFlight() if single_flight_config is not None and (
+            "enabled" not in single_flight_config or single_flight_config["enabled"]) else None
+        app.state.single_flight = single_flight
+        profiling_config = config["profiling"] if config and "profiling" in config else None
+        profiling_enabled = profiling_config is not None and (
+            "enabled" not in profiling_config or profiling_config["enabled"])
+        profiling_sample_rate = profiling_config["sampleRate"] if profiling_enabled and "sampleRate" in profiling_config else 0
+        bundle_info_config = config["bundleInfo"] if config and "bundleInfo" in config else {}
+        bundle_info_store = BundleInfoStore(
+            bundle_file_path=self._bundle_file_path, load_bundle_info=self.reload_bundle, bundle_info=self._bundle_info,
+            compress=bundle_info_config["gzip"] if "gzip" in bundle_info_config else True,
+            reload_interval=(bundle_info_config["reloadInterval"] if "reloadInterval" in bundle_info_config else 1)
+            if "hotReload" in bundle_info_config and bundle_info_config["hotReload"] else None)
+        bundle_info_cache_control = bundle_info_config["cacheControl"] if "cacheControl" in bundle_info_config else 'no-cache'
+        # Call `app.state.bundle_info_store.reload()` to pick up bundle changes on demand.
+        app.state.bundle_info_store = bundle_info_store
+        metrics_config = config["metrics"] if config and "metrics" in config else None
+        if metrics_config is not None and ("enabled" not in metrics_config or metrics_config["enabled"]):
+            plugin_metrics = PluginMetrics(
+                span_handler=metrics_config["spanHandler"] if "spanHandler" in metrics_config else None)
+        else:
+            plugin_metrics = DisabledPluginMetrics()
+
+        # Future of the plugin setup, which loads models and starts the workers before the first job.
+        warm_up_state = {"future": None}
+
+        def start_plugin_warm_up():
+            '''
+            Starts the plugin setup unless it was started already, and returns its future.
+
+            The setup starts with the ASGI lifespan. Apps that run without lifespan, for example when mounted as a
+            sub-app or served with `--lifespan off`, set up their plugins on the first job or readiness check.
+            '''
+            if warm_up_state["future"] is not None:
+                return warm_up_state["future"]
+            # Runs in the background so that the readiness endpoint can be polled while plugins warm up. The future
+            # is not bound to an event loop, since apps without lifespan may serve each request on a new loop.
+            setup_thread_pool = ThreadPoolExecutor(max_workers=1)
+            warm_up_future = setup_thread_pool.submit(plugin_executor.setup)
+            setup_thread_pool.shutdown(wait=False)
+
+            def log_warm_up_result(future):
+                if not future.cancelled() and future.exception() is not None:
+                    print(f'Plugin setup failed: {future.exception()!r}')
+                else:
+                    print('Plugins are ready')
+            warm_up_future.add_done_callback(log_warm_up_result)
+            warm_up_state["future"] = warm_up_future
+            return warm_up_future
+
+        @app.on_event("startup")
+        def handle_startup():
+            start_plugin_warm_up()
+
+        @app.on_event("shutdown")
+        def shutdown_plugin_executor():
+            plugin_executor.shutdown(wait=False)
 
         @app.middleware("http")
         async def add_vary_origin_header(request: Request, call_next):
             response = await call_next(request)
-            response.headers["Vary"] = 'Origin'
+            response.headers["Vary"] = f'{response.headers["Vary"]}, Origin' if "Vary" in response.headers else 'Origin'
             return response
 
         if not path_prefix.endswith('/'):
@@ -82,99 +229,732 @@ class Runner:
         get_info_path = urljoin(path_prefix, 'plugin-bundle-info')
         init_plugin_path = urljoin(path_prefix, 'init-plugin-params')
         run_plugin_path = urljoin(path_prefix, 'jobs')
+        job_status_path = urljoin(path_prefix, 'jobs/{job_id}')
+        job_result_path = urljoin(path_prefix, 'jobs/{job_id}/result')
+        job_events_path = urljoin(path_prefix, 'jobs/{job_id}/events')
+        batch_jobs_path = urljoin(path_prefix, 'batch-jobs')
+        metrics_path = urljoin(path_prefix, 'metrics')
+        ready_path = urljoin(path_prefix, 'ready')
 
         print(f'Serving bundle info at: {get_info_path}')
 
-        def init_plugin_task(plugin_class: Type[TuneflowPlugin], song: Song):
+        # Async results go to a built-in store served by `GET /jobs/{job_id}/result`, a custom `backend` store, or
+        # a custom `uploader`. Without any of them results are kept in memory.
+        store_config = async_config["store"] if async_config and "store" in async_config else {}
+        store_type = store_config["type"] if "type" in store_config else (
+            'memory' if async_config and "uploader" not in store_config else None)
+        result_store = None
+        if "backend" in store_config:
+            result_store = store_config["backend"]
+        elif store_type == 'memory':
+            result_store = InMemoryResultStore(
+                ttl=store_config["ttl"] if "ttl" in store_config else 3600,
+                max_memory_bytes=store_config["maxMemoryBytes"] if "maxMemoryBytes" in store_config else 256 * 1024 * 1024)
+        elif store_type == 'filesystem':
+            result_store = FileSystemResultStore(
+                directory=store_config["directory"],
+                ttl=store_config["ttl"] if "ttl" in store_config else 3600,
+                max_disk_bytes=store_config["maxDiskBytes"] if "maxDiskBytes" in store_config else 1024 * 1024 * 1024)
+        elif store_type is not None:
+            raise Exception(f'Unknown async result store type {store_type}')
+        app.state.result_store = result_store
+        store_uploader = result_store.put if result_store is not None else (
+            store_config["uploader"] if "uploader" in store_config else None)
+
+        def resolve_result_url(job_id: str):
+            if "resultUrlResolver" in store_config:
+                return store_config["resultUrlResolver"](job_id)
+            result_url = result_store.get_result_url(job_id) if result_store is not None else None
+            return result_url if result_url is not None else job_result_path.replace('{job_id}', job_id)
+
+        async def upload_result(store_uploader, job_id: str, result: bytes):
+            if inspect.iscoroutinefunction(store_uploader):
+                await store_uploader(job_id, result)
+                return
+            # Synchronous uploaders usually do blocking network IO, keep them off the event loop.
+            upload_result = await asyncio.get_event_loop().run_in_executor(None, functools.partial(store_uploader, job_id, result))
+            if inspect.isawaitable(upload_result):
+                await upload_result
+
+        def is_cache_enabled(entry: PluginEntry):
+            return result_cache is not None and entry.get_config("cache", True)
+
+        def is_single_flight_enabled(entry: PluginEntry):
+            return single_flight is not None and entry.get_config("singleFlight", True)
+
+        async def get_job_key(task_name: str, entry: PluginEntry, params, song_bytes: bytes):
+            if not is_cache_enabled(entry) and not is_single_flight_enabled(entry):
+                return None
+            # Hashing multi-MB songs releases the GIL, so it can run in a thread without blocking the event loop.
+            return await asyncio.get_event_loop().run_in_executor(None, functools.partial(
+                compute_cache_key, task_name=task_name, provider_id=entry.provider_id, plugin_id=entry.plugin_id,
+                params=params, song_bytes=song_bytes))
+
+        def create_cancellation_token(entry: PluginEntry, body: dict):
+            '''
+            Creates the token of a job, its deadline is the shorter of the plugin timeout and the `timeout` of the request.
+            '''
+            timeouts = [entry.get_config("timeout", default_timeout)]
+            if "timeout" in body and body["timeout"] is not None:
+                timeouts.append(float(body["timeout"]))
+            timeouts = [timeout for timeout in timeouts if timeout is not None]
+            return CancellationToken(timeout=min(timeouts) if len(timeouts) > 0 else None)
+
+        async def wait_unless_cancelled(future: asyncio.Future, cancellation_token: CancellationToken):
+            '''
+            Waits for the future, returns False if the job is cancelled or reaches its deadline first.
+            '''
+            if future.done():
+                return True
+            if cancellation_token.is_cancelled():
+                return False
+            loop = asyncio.get_event_loop()
+            cancelled_future = loop.create_future()
+
+            def set_cancelled(_=None):
+                if not cancelled_future.done():
+                    cancelled_future.set_result(None)
+
+            def notify_cancelled():
+                # Tokens can be cancelled from any thread.
+                loop.call_soon_threadsafe(set_cancelled)
+            cancellation_token.add_callback(notify_cancelled)
             try:
-                params_config = plugin_class.params(song)
-                return {"status": "OK",
-                        "paramsConfig": params_config,
-                        "params": plugin_class._get_default_params(param_config=params_config)
-                        }
-            except Exception as e:
-                print(traceback.format_exc())
-                return {
-                    "status": "ERROR"
-                }
+                await asyncio.wait([future, cancelled_future], timeout=cancellation_token.get_remaining_time(),
+                                   return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                cancellation_token.remove_callback(notify_cancelled)
+                cancelled_future.cancel()
+            if future.done():
+                return True
+            # Does nothing if the job was already cancelled.
+            cancellation_token.cancel(TIMEOUT)
+            return False
+
+        async def get_job_result(get_result, cancellation_token: CancellationToken):
+            '''
+            Awaits the result of a job, or returns a CANCELLED or TIMEOUT result once the job should stop.
+            '''
+            future = asyncio.ensure_future(get_result)
+            if not await wait_unless_cancelled(future, cancellation_token):
+                return {"status": cancellation_token.status}
+            return future.result()
 
-        def run_plugin_task(plugin_class: Type[TuneflowPlugin], song, params):
+        async def cancel_on_disconnect(request: Request, cancellation_token: CancellationToken):
+            # The body was read already, so the next message is the disconnect. `request.is_disconnected()` misses it
+            # behind the http middleware.
+            while True:
+                message = await request.receive()
+                if message["type"] == "http.disconnect":
+                    cancellation_token.cancel(CANCELLED)
+                    return
+
+        async def get_sync_job_result(request: Request, get_result, cancellation_token: CancellationToken):
+            '''
+            Same as `get_job_result`, but also cancels the job if the client disconnects.
+            '''
+            disconnect_task = asyncio.ensure_future(cancel_on_disconnect(request, cancellation_token))
             try:
-                plugin_class.run(song, params)
+                return await get_job_result(get_result, cancellation_token)
+            finally:
+                disconnect_task.cancel()
+
+        async def execute_plugin_task(task, entry: PluginEntry, ticket: JobTicket, cache_key: str | None, *args, on_start=None,
+                                      cancellation_token: CancellationToken | None = None,
+                                      progress_reporter: ProgressReporter | None = None):
+            provider_id = entry.provider_id
+            plugin_id = entry.plugin_id
+            if cancellation_token is None:
+                cancellation_token = CancellationToken()
+            wait_start_time = time.perf_counter()
+            run_future = None
+
+            def release_slot(_=None):
+                if run_future is not None:
+                    if not run_future.cancelled():
+                        # Retrieves the error of a job that was stopped before it finished.
+                        run_future.exception()
+                    plugin_metrics.dec_in_flight(provider_id, plugin_id)
+                job_scheduler.release(ticket)
+            try:
+                is_running = await wait_unless_cancelled(ticket.future, cancellation_token)
+                if is_running:
+                    warm_up_future = asyncio.wrap_future(start_plugin_warm_up())
+                    # Marks the setup error as retrieved, it is reported by the job status and the readiness check.
+                    warm_up_future.add_done_callback(lambda future: future.cancelled() or future.exception())
+                    is_running = await wait_unless_cancelled(warm_up_future, cancellation_token)
+                if is_running and (warm_up_future.cancelled() or warm_up_future.exception() is not None):
+                    # The error was logged when the setup finished.
+                    plugin_metrics.inc_error(provider_id, plugin_id, 'setup_failed')
+                    return {"status": "SETUP_FAILED"}
+                if is_running:
+                    plugin_metrics.observe_queue_wait(provider_id, plugin_id, time.perf_counter() - wait_start_time)
+                    if on_start is not None:
+                        await on_start()
+                    plugin_metrics.inc_in_flight(provider_id, plugin_id)
+                    run_future = asyncio.ensure_future(plugin_executor.run(
+                        task, entry.plugin_class, *args, cancellation_token=cancellation_token,
+                        progress_reporter=progress_reporter))
+                    is_running = await wait_unless_cancelled(run_future, cancellation_token)
+                if not is_running:
+                    status = cancellation_token.status
+                    plugin_metrics.inc_error(provider_id, plugin_id, status.lower())
+                    return {"status": status}
+                result = run_future.result()  # type: ignore
+            finally:
+                if run_future is None or run_future.done():
+                    release_slot()
+                else:
+                    # Plugins in threads can only stop cooperatively, their slot is freed once they return.
+                    run_future.add_done_callback(release_slot)
+            for phase, duration in result.pop("timings", {}).items():
+                plugin_metrics.observe_phase(provider_id, plugin_id, phase, duration)
+            if result["status"] != "OK":
+                plugin_metrics.inc_error(provider_id, plugin_id,
+                                         result["status"].lower() if result["status"] in [CANCELLED, TIMEOUT] else 'plugin')
+            if cache_key is not None and result["status"] == "OK":
+                await asyncio.get_event_loop().run_in_executor(None, result_cache.put, cache_key, result)  # type: ignore
+            return result
+
+        async def submit_plugin_task(task_name: str, task, entry: PluginEntry, params, song_bytes: bytes, *args, on_start=None, reuse_results=True,
+                                     cancellation_token: CancellationToken | None = None,
+                                     progress_reporter: ProgressReporter | None = None):
+            '''
+            Returns an awaitable of the task result, which may come from the cache or from an identical in-flight job
+            unless `reuse_results` is False.
+
+            An execution shared with identical jobs keeps the deadline of the token but is not cancelled by any one
+            of them, pass the awaitable to `get_job_result` to stop waiting for it. Only the job that started the
+            execution gets its progress.
+
+            Raises `SchedulerSaturatedError` if a new execution cannot be admitted.
+            '''
+            job_key = await get_job_key(task_name, entry, params, song_bytes) if reuse_results else None
+            cache_key = job_key if is_cache_enabled(entry) else None
+            if cache_key is not None:
+                cached_result = await asyncio.get_event_loop().run_in_executor(None, result_cache.get, cache_key)  # type: ignore
+                if cached_result is not None:
+                    future = asyncio.get_event_loop().create_future()
+                    future.set_result(cached_result)
+                    return future
+            use_single_flight = job_key is not None and is_single_flight_enabled(entry)
+            if use_single_flight:
+                in_flight_result = single_flight.get(job_key)  # type: ignore
+                if in_flight_result is not None:
+                    return in_flight_result
+            ticket = job_scheduler.admit(entry.key)
+            if use_single_flight and cancellation_token is not None:
+                cancellation_token = CancellationToken(deadline=cancellation_token.deadline)
+            execution = execute_plugin_task(task, entry, ticket, cache_key, song_bytes, *args, on_start=on_start,
+                                            cancellation_token=cancellation_token, progress_reporter=progress_reporter)
+            if use_single_flight:
+                return single_flight.start(job_key, execution)  # type: ignore
+            return execution
+
+        async def handle_profile(result: dict, profile_id: str, return_profile: bool):
+            '''
+            Stores the profile of a profiled run, and keeps it in the result only if the client asked for it.
+            '''
+            if "profile" not in result:
+                return
+            profile_text = result["profile"]
+            if not return_profile:
+                del result["profile"]
+            if "uploader" in profiling_config:  # type: ignore
+                await upload_result(profiling_config["uploader"], profile_id, profile_text)  # type: ignore
+            elif not return_profile:
+                print(f'========================= Profile of job {profile_id} =========================')
+                print(profile_text)
+
+        async def call_job_registry(method, *args):
+            '''
+            Calls a method of the job registry. Registries other than the in-memory one may block on IO, so they are
+            called in a thread to keep the event loop free.
+            '''
+            if isinstance(job_registry, InMemoryJobRegistry):
+                return method(*args)
+            return await asyncio.get_event_loop().run_in_executor(None, method, *args)
+
+        async def watch_cancel_requests(job_id: str, cancellation_token: CancellationToken):
+            # Cancel requests for the jobs of this worker may arrive at other workers.
+            while not cancellation_token.is_cancelled():
+                await asyncio.sleep(SHARED_JOB_POLL_INTERVAL)
+                if await call_job_registry(job_registry.is_cancel_requested, job_id):
+                    cancellation_token.cancel(CANCELLED)
+
+        async def run_plugin_async_task(job_id: str, store_uploader, get_response, cancellation_token: CancellationToken,
+                                        return_profile=False):
+            cancel_watcher = asyncio.ensure_future(watch_cancel_requests(job_id, cancellation_token)) \
+                if is_job_registry_shared else None
+            try:
+                # The response may be shared with coalesced jobs, copy it before adding the job id.
+                response = dict(await get_job_result(get_response, cancellation_token))
+                await handle_profile(response, job_id, return_profile)
+                error = response["error"] if "error" in response else None
+                if "error" in response:
+                    del response["error"]
+                response["jobId"] = job_id
+                try:
+                    await upload_result(store_uploader, job_id, packb(response))
+                except ResultTooLargeError as e:
+                    # Clients fetching the result learn why there is none instead of getting a 404.
+                    print(f'Result of job {job_id} was not stored: {e}')
+                    plugin_metrics.inc_error('', '', 'result_too_large')
+                    response = {
+                        "status": "RESULT_TOO_LARGE",
+                        "jobId": job_id,
+                        "error": str(e)
+                    }
+                    await upload_result(store_uploader, job_id, packb(response))
             except Exception as e:
                 print(traceback.format_exc())
-                return {
-                    "status": "ERROR",
-                    "error": e
-                }
-            return {
-                "status": "OK",
-                "song": song.serialize_to_bytestring()
-            }
-
-        async def run_plugin_async_task(plugin_class: Type[TuneflowPlugin], song, params, job_id: str, store_uploader):
-            # TODO: Revisit to see if we can call run_plugin_task directly.
-            response = run_plugin_task(plugin_class=plugin_class, song=song, params=params)
-            error = response["error"] if "error" in response else None
-            if "error" in response:
-                del response["error"]
-            response["jobId"] = job_id
-            store_uploader(job_id, packb(response))
+                await call_job_registry(job_registry.set_status, job_id, JobStatus.ERROR)
+                if exception_handler is not None:
+                    exception_handler(e)
+                return
+            finally:
+                if cancel_watcher is not None:
+                    cancel_watcher.cancel()
+                job_cancellation_tokens.pop(job_id, None)
+                if job_id in job_progress_channels:
+                    # Subscribers read the final job status once the channel is closed.
+                    job_progress_channels.pop(job_id).close()
+            if response["status"] == "OK":
+                job_status = JobStatus.DONE
+            else:
+                job_status = JobStatus.CANCELLED if response["status"] == CANCELLED else JobStatus.ERROR
+            await call_job_registry(job_registry.set_status, job_id, job_status)
             if response["status"] == "ERROR" and error is not None and exception_handler is not None:
                 exception_handler(error)
 
-        def find_plugin_by_id(plugin_class_list: List[Type[TuneflowPlugin]], provider_id, plugin_id):
-            for plugin_class in plugin_class_list:
-                if plugin_class.provider_id() == provider_id and plugin_class.plugin_id() == plugin_id:
-                    return plugin_class
-            raise Exception(f"Cannot find plugin by id {provider_id} {plugin_id}")
+        def create_not_found_response():
+            return Response(packb({
+                "status": "NOT_FOUND"
+            }), status_code=404, headers={"Content-Type": "application/octet-stream"})
+
+        def create_saturated_response(error: SchedulerSaturatedError, provider_id: str, plugin_id: str):
+            plugin_metrics.inc_error(provider_id, plugin_id, 'rejected')
+            return Response(packb({
+                "status": "BUSY"
+            }), status_code=error.status_code, headers={"Content-Type": "application/octet-stream", "Retry-After": str(error.retry_after)})
+
+        def create_setup_failed_response():
+            return Response(packb({
+                "status": "SETUP_FAILED"
+            }), status_code=503, headers={"Content-Type": "application/octet-stream", "Retry-After": str(job_scheduler.retry_after)})
+
+        def create_body_too_large_response():
+            plugin_metrics.inc_error('', '', 'body_too_large')
+            return Response(packb({
+                "status": "BODY_TOO_LARGE"
+            }), status_code=413, headers={"Content-Type": "application/octet-stream"})
+
+        def create_invalid_content_length_response():
+            plugin_metrics.inc_error('', '', 'invalid_content_length')
+            return Response(packb({
+                "status": "INVALID_CONTENT_LENGTH"
+            }), status_code=400, headers={"Content-Type": "application/octet-stream"})
+
+        def observe_request(provider_id: str, plugin_id: str, body_stats: dict):
+            plugin_metrics.observe_phase(provider_id, plugin_id, 'read_body', body_stats["readBody"])
+            plugin_metrics.observe_phase(provider_id, plugin_id, 'unpack', body_stats["unpack"])
+            plugin_metrics.observe_payload_size(provider_id, plugin_id, 'request', body_stats["size"])
+
+        def create_unsupported_encoding_response():
+            plugin_metrics.inc_error('', '', 'unsupported_encoding')
+            return Response(packb({
+                "status": "UNSUPPORTED_ENCODING"
+            }), status_code=415, headers={"Content-Type": "application/octet-stream"})
+
+        def create_invalid_compressed_data_response():
+            plugin_metrics.inc_error('', '', 'invalid_compressed_data')
+            return Response(packb({
+                "status": "INVALID_COMPRESSED_DATA"
+            }), status_code=400, headers={"Content-Type": "application/octet-stream"})
+
+        async def create_streaming_response(request: Request, result: dict, provider_id: str, plugin_id: str):
+            # Streams the serialized song in chunks instead of packing it into another full-size buffer.
+            start_time = time.perf_counter()
+            chunks = get_packed_chunks(result, chunk_size=response_chunk_size)
+            content_length = sum(len(chunk) for chunk in chunks)
+            plugin_metrics.observe_phase(provider_id, plugin_id, 'pack', time.perf_counter() - start_time)
+            headers = {"Content-Type": "application/octet-stream"}
+            if len(response_encodings) > 0:
+                headers["Vary"] = "Accept-Encoding"
+            encoding = negotiate_encoding(request.headers.get('accept-encoding'), response_encodings) \
+                if content_length >= min_compression_size else None
+            if encoding is not None:
+                start_time = time.perf_counter()
+                # Compression releases the GIL, so it runs in a thread instead of blocking the event loop.
+                body = await asyncio.get_event_loop().run_in_executor(None, functools.partial(
+                    compress_chunks, chunks, encoding,
+                    compression_levels[encoding] if encoding in compression_levels else None))
+                plugin_metrics.observe_phase(provider_id, plugin_id, 'compress', time.perf_counter() - start_time)
+                plugin_metrics.observe_payload_size(provider_id, plugin_id, 'response', len(body))
+                headers["Content-Encoding"] = encoding
+                return Response(body, headers=headers)
+            plugin_metrics.observe_payload_size(provider_id, plugin_id, 'response', content_length)
+
+            async def iterate_chunks():
+                for chunk in chunks:
+                    yield chunk if isinstance(chunk, bytes) else bytes(chunk)
+            headers["Content-Length"] = str(content_length)
+            return StreamingResponse(iterate_chunks(), headers=headers)
+
+        def create_batch_too_large_response(provider_id: str, plugin_id: str):
+            plugin_metrics.inc_error(provider_id, plugin_id, 'batch_too_large')
+            return Response(packb({
+                "status": "BATCH_TOO_LARGE"
+            }), status_code=413, headers={"Content-Type": "application/octet-stream"})
 
         def no_auth_handler():
             pass
         auth_handler = config["auth"]["handler"] if config is not None and "auth" in config and "handler" in config["auth"] else None
 
         @app.get(get_info_path)
-        def handle_get_bundle_info():
-            return self._bundle_info
+        def handle_get_bundle_info(request: Request):
+            # Served from pre-encoded bodies, clients polling with If-None-Match get a 304.
+            status_code, body, headers = bundle_info_store.get().get_response(
+                accept=request.headers.get('accept'), accept_encoding=request.headers.get('accept-encoding'),
+                if_none_match=request.headers.get('if-none-match'), cache_control=bundle_info_cache_control)
+            return Response(body, status_code=status_code, headers=headers)
 
-        @app.post(init_plugin_path, dependencies=[Depends(auth_handler if auth_handler else no_auth_handler)])
-        async def handle_init_plugin(request: Request):
-            raw_body = await request.body()
-            body = unpackb(raw_body)
-            song = Song.deserialize_from_bytestring(body["song"])
-            provider_id = body["providerId"]
-            plugin_id = body["pluginId"]
-            plugin_class = find_plugin_by_id(self._plugin_class_list, provider_id=provider_id, plugin_id=plugin_id)
-            response = await asyncio.get_event_loop().run_in_executor(None, functools.partial(init_plugin_task, plugin_class=plugin_class, song=song))
-            return Response(packb(response), headers={"Content-Type": "application/octet-stream"})
-
-        @app.post(run_plugin_path, dependencies=[Depends(auth_handler if auth_handler else no_auth_handler)])
-        async def handle_run_plugin(request: Request, background_tasks: BackgroundTasks):
-            body = await request.body()
-            decoded_data = unpackb(body)
+        async def init_plugin(request: Request, entry: PluginEntry | None = None):
+            body_stats = {}
+            try:
+                body = await read_msgpack_body(request, max_body_size=max_body_size, stats=body_stats)
+            except BodyTooLargeError:
+                return create_body_too_large_response()
+            except InvalidContentLengthError:
+                return create_invalid_content_length_response()
+            except UnsupportedEncodingError:
+                return create_unsupported_encoding_response()
+            except InvalidCompressedDataError:
+                return create_invalid_compressed_data_response()
+            if entry is None:
+                entry = dispatch_table.get(body["providerId"], body["pluginId"])
+                if entry is None:
+                    return create_not_found_response()
+            provider_id = entry.provider_id
+            plugin_id = entry.plugin_id
+            observe_request(provider_id, plugin_id, body_stats)
+            cancellation_token = create_cancellation_token(entry, body)
+            try:
+                get_response = await submit_plugin_task('init', init_plugin_task, entry, None, body["song"],
+                                                        cancellation_token=cancellation_token)
+            except SchedulerSaturatedError as e:
+                return create_saturated_response(e, provider_id, plugin_id)
+            response = await get_sync_job_result(request, get_response, cancellation_token)
+            if response["status"] == "SETUP_FAILED":
+                return create_setup_failed_response()
+            return await create_streaming_response(request, response, provider_id, plugin_id)
+
+        async def run_plugin(request: Request, background_tasks: BackgroundTasks, entry: PluginEntry | None = None):
+            body_stats = {}
+            try:
+                decoded_data = await read_msgpack_body(request, max_body_size=max_body_size, stats=body_stats)
+            except BodyTooLargeError:
+                return create_body_too_large_response()
+            except InvalidContentLengthError:
+                return create_invalid_content_length_response()
+            except UnsupportedEncodingError:
+                return create_unsupported_encoding_response()
+            except InvalidCompressedDataError:
+                return create_invalid_compressed_data_response()
+            if entry is None:
+                entry = dispatch_table.get(decoded_data["providerId"], decoded_data["pluginId"])
+                if entry is None:
+                    return create_not_found_response()
             params = decoded_data["params"]
-            provider_id = decoded_data["providerId"]
-            plugin_id = decoded_data["pluginId"]
-            plugin_class = find_plugin_by_id(self._plugin_class_list, provider_id=provider_id, plugin_id=plugin_id)
-            song = Song.deserialize_from_bytestring(decoded_data["song"])
+            provider_id = entry.provider_id
+            plugin_id = entry.plugin_id
+            observe_request(provider_id, plugin_id, body_stats)
+            song_bytes = decoded_data["song"]
+            # Clients can ask for only the changes to their song instead of the full song.
+            response_mode = decoded_data["responseMode"] if "responseMode" in decoded_data and decoded_data["responseMode"] in RESPONSE_MODES else 'full'
+            job_id = generate_nanoid() if async_config else None
+            # Profiling is only available to clients that passed the auth handler of this endpoint.
+            profile_requested = profiling_enabled and "profile" in decoded_data and bool(decoded_data["profile"])
+            profile = profile_requested or (profiling_sample_rate > 0 and random.random() < profiling_sample_rate)
+            cancellation_token = create_cancellation_token(entry, decoded_data)
+            progress_channel = ProgressChannel(asyncio.get_event_loop()) if job_id else None
+            if job_id:
+                # Created before the job is submitted, so that the job cannot start before its record exists.
+                await call_job_registry(job_registry.create, job_id)
+            try:
+                get_result = await submit_plugin_task(
+                    f'run:{response_mode}', run_plugin_task, entry, params, song_bytes, params, response_mode, profile,
+                    on_start=functools.partial(call_job_registry, job_registry.set_status, job_id, JobStatus.RUNNING) if job_id else None,
+                    reuse_results=not profile, cancellation_token=cancellation_token,
+                    progress_reporter=ProgressReporter(callback=progress_channel.publish_threadsafe, min_interval=progress_interval)
+                    if progress_channel is not None else None)
+            except SchedulerSaturatedError as e:
+                if job_id:
+                    await call_job_registry(job_registry.set_status, job_id, JobStatus.ERROR)
+                return create_saturated_response(e, provider_id, plugin_id)
             if async_config:
                 # Run in async path.
-                job_id = generate_nanoid()
+                job_cancellation_tokens[job_id] = cancellation_token
+                job_progress_channels[job_id] = progress_channel
                 background_tasks.add_task(
-                    run_plugin_async_task, plugin_class=plugin_class, song=song, params=params, job_id=job_id,
-                    store_uploader=async_config["store"]["uploader"])
+                    run_plugin_async_task, job_id=job_id, store_uploader=store_uploader,
+                    get_response=get_result, cancellation_token=cancellation_token, return_profile=profile_requested)
                 return Response(packb({
                     "status": "ACCEPTED",
                     "jobId": job_id,
-                    "resultUrl": async_config["store"]["resultUrlResolver"](job_id)
+                    "resultUrl": resolve_result_url(job_id)
                 }), headers={"Content-Type": "application/octet-stream"})
             else:
-                result = await asyncio.get_event_loop().run_in_executor(None,  functools.partial(run_plugin_task, plugin_class=plugin_class, song=song, params=params))
+                result = dict(await get_sync_job_result(request, get_result, cancellation_token))
+                if result["status"] == "SETUP_FAILED":
+                    return create_setup_failed_response()
+                await handle_profile(result, generate_nanoid(), profile_requested)
                 if result["status"] == "ERROR" and "error" in result:
                     if exception_handler:
                         exception_handler(result["error"])
                 if "error" in result:
                     del result["error"]
-                return Response(packb(result), headers={"Content-Type": "application/octet-stream"})
+                return await create_streaming_response(request, result, provider_id, plugin_id)
+
+        async def run_batch_item(entry: PluginEntry, index: int, song_bytes: bytes, params, response_mode: str,
+                                 cancellation_token: CancellationToken):
+            try:
+                get_result = await submit_plugin_task(
+                    f'run:{response_mode}', run_plugin_task, entry, params, song_bytes, params, response_mode, False,
+                    cancellation_token=cancellation_token)
+                result = dict(await get_job_result(get_result, cancellation_token))
+            except SchedulerSaturatedError:
+                plugin_metrics.inc_error(entry.provider_id, entry.plugin_id, 'rejected')
+                # Clients retry the rejected items, the rest of the batch keeps going.
+                return {
+                    "index": index,
+                    "status": "BUSY"
+                }
+            except asyncio.CancelledError:
+                # The batch was aborted, stop the item too.
+                cancellation_token.cancel(CANCELLED)
+                raise
+            except Exception as e:
+                # A crashed worker only fails its own item.
+                print(traceback.format_exc())
+                plugin_metrics.inc_error(entry.provider_id, entry.plugin_id, 'plugin')
+                if exception_handler:
+                    exception_handler(e)
+                return {
+                    "index": index,
+                    "status": "ERROR"
+                }
+            if "error" in result:
+                if exception_handler:
+                    exception_handler(result["error"])
+                del result["error"]
+            result["index"] = index
+            return result
+
+        async def iterate_batch_results(entry: PluginEntry, items: list, response_mode: str, body: dict):
+            '''
+            Yields packed results in completion order, with at most `batch_concurrency` items in flight.
+
+            The timeout applies to each item.
+            '''
+            pending_tasks = set()
+            next_index = 0
+            try:
+                while next_index < len(items) or len(pending_tasks) > 0:
+                    while next_index < len(items) and len(pending_tasks) < batch_concurrency:
+                        song_bytes, params = items[next_index]
+                        pending_tasks.add(asyncio.ensure_future(
+                            run_batch_item(entry, next_index, song_bytes, params, response_mode,
+                                           create_cancellation_token(entry, body))))
+                        next_index += 1
+                    done_tasks, pending_tasks = await asyncio.wait(pending_tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for done_task in done_tasks:
+                        chunks = get_packed_chunks(done_task.result(), chunk_size=response_chunk_size)
+                        plugin_metrics.observe_payload_size(entry.provider_id, entry.plugin_id, 'response',
+                                                            sum(len(chunk) for chunk in chunks))
+                        for chunk in chunks:
+                            yield chunk if isinstance(chunk, bytes) else bytes(chunk)
+            finally:
+                # The client went away, stop the items that have not finished.
+                for pending_task in pending_tasks:
+                    pending_task.cancel()
+
+        async def run_batch(request: Request, entry: PluginEntry | None = None):
+            '''
+            Runs one plugin over a list of `items` with their own song and params, or over one `song` with a
+            `paramsList`, and streams back one msgpack map per item as each completes.
+            '''
+            body_stats = {}
+            try:
+                decoded_data = await read_msgpack_body(request, max_body_size=max_body_size, stats=body_stats)
+            except BodyTooLargeError:
+                return create_body_too_large_response()
+            except InvalidContentLengthError:
+                return create_invalid_content_length_response()
+            except UnsupportedEncodingError:
+                return create_unsupported_encoding_response()
+            except InvalidCompressedDataError:
+                return create_invalid_compressed_data_response()
+            if entry is None:
+                entry = dispatch_table.get(decoded_data["providerId"], decoded_data["pluginId"])
+                if entry is None:
+                    return create_not_found_response()
+            observe_request(entry.provider_id, entry.plugin_id, body_stats)
+            if "items" in decoded_data:
+                items = [(item["song"], item["params"]) for item in decoded_data["items"]]
+            else:
+                items = [(decoded_data["song"], params) for params in decoded_data["paramsList"]]
+            if len(items) > max_batch_items:
+                return create_batch_too_large_response(entry.provider_id, entry.plugin_id)
+            response_mode = decoded_data["responseMode"] if "responseMode" in decoded_data and decoded_data["responseMode"] in RESPONSE_MODES else 'full'
+            return StreamingResponse(iterate_batch_results(entry, items, response_mode, decoded_data), headers={
+                "Content-Type": "application/octet-stream"
+            })
+
+        auth_dependencies = [Depends(auth_handler if auth_handler else no_auth_handler)]
+
+        @app.post(init_plugin_path, dependencies=auth_dependencies)
+        async def handle_init_plugin(request: Request):
+            return await init_plugin(request)
+
+        @app.post(run_plugin_path, dependencies=auth_dependencies)
+        async def handle_run_plugin(request: Request, background_tasks: BackgroundTasks):
+            return await run_plugin(request, background_tasks)
+
+        @app.post(batch_jobs_path, dependencies=auth_dependencies)
+        async def handle_run_batch(request: Request):
+            return await run_batch(request)
+
+        def add_plugin_routes(entry: PluginEntry):
+            # Static paths per plugin, so requests are routed before their body is decoded.
+            async def handle_init_plugin_by_path(request: Request):
+                return await init_plugin(request, entry)
+
+            async def handle_run_plugin_by_path(request: Request, background_tasks: BackgroundTasks):
+                return await run_plugin(request, background_tasks, entry)
+
+            async def handle_run_batch_by_path(request: Request):
+                return await run_batch(request, entry)
+            app.add_api_route(urljoin(path_prefix, f'init-plugin-params/{entry.provider_id}/{entry.plugin_id}'),
+                              handle_init_plugin_by_path, methods=["POST"], dependencies=auth_dependencies)
+            app.add_api_route(urljoin(path_prefix, f'jobs/{entry.provider_id}/{entry.plugin_id}'),
+                              handle_run_plugin_by_path, methods=["POST"], dependencies=auth_dependencies)
+            app.add_api_route(urljoin(path_prefix, f'batch-jobs/{entry.provider_id}/{entry.plugin_id}'),
+                              handle_run_batch_by_path, methods=["POST"], dependencies=auth_dependencies)
+
+        if per_plugin_routes:
+            for entry in dispatch_table:
+                add_plugin_routes(entry)
+
+        @app.get(job_status_path, dependencies=auth_dependencies)
+        async def handle_get_job_status(job_id: str):
+            job = await call_job_registry(job_registry.get, job_id)
+            if job is None:
+                return create_not_found_response()
+            return Response(packb({
+                "status": "OK",
+                "jobId": job_id,
+                "jobStatus": job["status"],
+                "resultUrl": resolve_result_url(job_id)
+            }), headers={"Content-Type": "application/octet-stream"})
+
+        @app.get(job_result_path, dependencies=auth_dependencies)
+        async def handle_get_job_result(job_id: str):
+            if result_store is None or not is_valid_job_id(job_id):
+                return create_not_found_response()
+            # Files are streamed from disk without loading the whole result into memory.
+            file_path = await asyncio.get_event_loop().run_in_executor(None, result_store.get_file_path, job_id)
+            if file_path is not None:
+                return FileResponse(file_path, media_type="application/octet-stream")
+            result = await asyncio.get_event_loop().run_in_executor(None, result_store.get, job_id)
+            if result is not None:
+                return Response(result, headers={"Content-Type": "application/octet-stream"})
+            job = await call_job_registry(job_registry.get, job_id)
+            if job is not None and job["status"] not in FINISHED_JOB_STATUSES:
+                return Response(packb({
+                    "status": "NOT_READY",
+                    "jobId": job_id,
+                    "jobStatus": job["status"]
+                }), status_code=202, headers={"Content-Type": "application/octet-stream"})
+            return create_not_found_response()
+
+        @app.get(job_events_path, dependencies=auth_dependencies)
+        async def handle_get_job_events(job_id: str):
+            if await call_job_registry(job_registry.get, job_id) is None:
+                return create_not_found_response()
+            progress_channel = job_progress_channels.get(job_id)
+
+            async def iterate_events():
+                if progress_channel is not None:
+                    async for progress in progress_channel.subscribe():
+                        yield format_server_sent_event('progress' if progress is not None else None, progress)
+                elif is_job_registry_shared:
+                    # The job runs in another worker, only its status is visible here.
+                    while True:
+                        job = await call_job_registry(job_registry.get, job_id)
+                        if job is None or job["status"] in FINISHED_JOB_STATUSES:
+                            break
+                        yield format_server_sent_event(None)
+                        await asyncio.sleep(SHARED_JOB_POLL_INTERVAL)
+                job = await call_job_registry(job_registry.get, job_id)
+                yield format_server_sent_event('done', {
+                    "jobId": job_id,
+                    "jobStatus": job["status"] if job is not None else None
+                })
+            return StreamingResponse(iterate_events(), headers={
+                "Content-Type": "text/event-stream",
+                "Cache-Control": "no-store"
+            })
+
+        @app.delete(job_status_path, dependencies=auth_dependencies)
+        async def handle_cancel_job(job_id: str):
+            job = await call_job_registry(job_registry.get, job_id)
+            if job is None:
+                return create_not_found_response()
+            if job["status"] in FINISHED_JOB_STATUSES or (job_id not in job_cancellation_tokens and not is_job_registry_shared):
+                return Response(packb({
+                    "status": "ALREADY_FINISHED",
+                    "jobId": job_id,
+                    "jobStatus": job["status"]
+                }), status_code=409, headers={"Content-Type": "application/octet-stream"})
+            # The job status becomes CANCELLED once the job has stopped.
+            if job_id in job_cancellation_tokens:
+                job_cancellation_tokens[job_id].cancel(CANCELLED)
+            else:
+                await call_job_registry(job_registry.request_cancel, job_id)
+            return Response(packb({
+                "status": "OK",
+                "jobId": job_id
+            }), headers={"Content-Type": "application/octet-stream"})
+
+        @app.get(ready_path)
+        async def handle_get_readiness():
+            warm_up_future = start_plugin_warm_up()
+            if not warm_up_future.done():
+                status, status_code = "WARMING_UP", 503
+            elif warm_up_future.cancelled() or warm_up_future.exception() is not None:
+                status, status_code = "SETUP_FAILED", 503
+            else:
+                status, status_code = "READY", 200
+            return Response(json.dumps({"status": status}), status_code=status_code,
+                            headers={"Content-Type": "application/json", "Cache-Control": "no-store"})
+
+        if plugin_metrics.enabled:
+            # Runs on the event loop like every metric update, since the metrics are not locked.
+            @app.get(metrics_path)
+            async def handle_get_metrics():
+                gauges = {}
+                for key, value in job_scheduler.get_stats().items():
+                    gauges[f'tuneflow_devkit_scheduler_{key}_jobs'] = value
+                if result_cache is not None:
+                    for key, value in result_cache.get_stats().items():
+                        gauges[f'tuneflow_devkit_cache_{to_snake_case(key)}'] = value
+                if single_flight is not None:
+                    for key, value in single_flight.get_stats().items():
+                        gauges[f'tuneflow_devkit_single_flight_{to_snake_case(key)}'] = value
+                if isinstance(result_store, (InMemoryResultStore, FileSystemResultStore)):
+                    for key, value in result_store.get_stats().items():
+                        gauges[f'tuneflow_devkit_result_store_{to_snake_case(key)}'] = value
+                return Response(plugin_metrics.render(gauges=gauges), headers={"Content-Type": METRICS_CONTENT_TYPE})
 
         return app
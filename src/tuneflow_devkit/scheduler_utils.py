@@ -0,0 +1,127 @@
+from __future__ import annotations
+from typing import Dict, Tuple
+from collections import defaultdict, deque
+import asyncio
+
+PluginKey = Tuple[str, str]
+# Waiting jobs allowed per execution slot when no queue size is configured.
+DEFAULT_QUEUE_SIZE_PER_SLOT = 16
+
+
+class SchedulerSaturatedError(Exception):
+    def __init__(self, message: str, status_code: int, retry_after: int) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class JobTicket:
+    def __init__(self, plugin_key: PluginKey, future: asyncio.Future) -> None:
+        self.plugin_key = plugin_key
+        self.future = future
+        self.granted = False
+
+
+class JobScheduler:
+    def __init__(self, max_concurrency: int, max_queue_size: int | None = None, plugin_configs=None,
+                 retry_after=1) -> None:
+        '''
+        Admits jobs into a bounded wait queue and grants them execution slots.
+
+        Each plugin can be limited with `maxConcurrency` and `maxQueueSize` and weighted with `priority` through
+        `plugin_configs[provider_id][plugin_id]`. Free slots are handed out with weighted fair queuing so that a
+        busy plugin cannot starve the other plugins in the bundle.
+        '''
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self.retry_after = retry_after
+        self._plugin_configs = plugin_configs if plugin_configs is not None else {}
+        for provider_id, provider_configs in self._plugin_configs.items():
+            for plugin_id, plugin_config in provider_configs.items():
+                if "priority" in plugin_config and not (
+                        isinstance(plugin_config["priority"], (int, float)) and plugin_config["priority"] > 0):
+                    raise Exception(
+                        f'priority of plugin {provider_id} {plugin_id} must be a positive number, got {plugin_config["priority"]!r}')
+        self._running_count = 0
+        self._running: Dict[PluginKey, int] = defaultdict(int)
+        self._waiting: Dict[PluginKey, deque] = defaultdict(deque)
+        self._waiting_count = 0
+        self._virtual_time: Dict[PluginKey, float] = defaultdict(float)
+        self._virtual_clock = 0.0
+
+    def _get_plugin_config(self, plugin_key: PluginKey, key: str, default=None):
+        provider_id, plugin_id = plugin_key
+        if provider_id in self._plugin_configs and plugin_id in self._plugin_configs[provider_id]:
+            plugin_config = self._plugin_configs[provider_id][plugin_id]
+            if key in plugin_config:
+                return plugin_config[key]
+        return default
+
+    def admit(self, plugin_key: PluginKey) -> JobTicket:
+        '''
+        Reserves a place in the wait queue, raises `SchedulerSaturatedError` if the job must be shed.
+        '''
+        if len(self._waiting[plugin_key]) == 0 and self._running[plugin_key] == 0:
+            # A plugin becoming active again must not claim the share it did not use while idle.
+            self._virtual_time[plugin_key] = max(self._virtual_time[plugin_key], self._virtual_clock)
+        ticket = JobTicket(plugin_key=plugin_key, future=asyncio.get_event_loop().create_future())
+        self._waiting[plugin_key].append(ticket)
+        self._waiting_count += 1
+        self._dispatch()
+        if ticket.granted:
+            return ticket
+        saturated_error = None
+        plugin_max_queue_size = self._get_plugin_config(plugin_key, "maxQueueSize")
+        if plugin_max_queue_size is not None and len(self._waiting[plugin_key]) > plugin_max_queue_size:
+            saturated_error = SchedulerSaturatedError(
+                f"Job queue of plugin {plugin_key[0]} {plugin_key[1]} is full", status_code=429,
+                retry_after=self.retry_after)
+        elif self.max_queue_size is not None and self._waiting_count > self.max_queue_size:
+            saturated_error = SchedulerSaturatedError(
+                "Job queue is full", status_code=503, retry_after=self.retry_after)
+        if saturated_error is not None:
+            self._waiting[plugin_key].remove(ticket)
+            self._waiting_count -= 1
+            raise saturated_error
+        return ticket
+
+    def _dispatch(self):
+        while self._running_count < self.max_concurrency:
+            next_plugin_key = None
+            for plugin_key, waiting in self._waiting.items():
+                if len(waiting) == 0:
+                    continue
+                plugin_max_concurrency = self._get_plugin_config(plugin_key, "maxConcurrency")
+                if plugin_max_concurrency is not None and self._running[plugin_key] >= plugin_max_concurrency:
+                    continue
+                if next_plugin_key is None or self._virtual_time[plugin_key] < self._virtual_time[next_plugin_key]:
+                    next_plugin_key = plugin_key
+            if next_plugin_key is None:
+                return
+            ticket = self._waiting[next_plugin_key].popleft()
+            self._waiting_count -= 1
+            if ticket.future.done():
+                # The waiter went away before it got a slot.
+                continue
+            ticket.granted = True
+            self._running_count += 1
+            self._running[next_plugin_key] += 1
+            self._virtual_clock = self._virtual_time[next_plugin_key]
+            self._virtual_time[next_plugin_key] += 1.0 / self._get_plugin_config(next_plugin_key, "priority", 1)
+            ticket.future.set_result(None)
+
+    def release(self, ticket: JobTicket):
+        if ticket.granted:
+            ticket.granted = False
+            self._running_count -= 1
+            self._running[ticket.plugin_key] -= 1
+        elif ticket in self._waiting[ticket.plugin_key]:
+            self._waiting[ticket.plugin_key].remove(ticket)
+            self._waiting_count -= 1
+        self._dispatch()
+
+    def get_stats(self):
+        return {
+            "running": self._running_count,
+            "waiting": self._waiting_count
+        }
@@ -0,0 +1,127 @@
+from __future__ import annotations
+from tuneflow_py import TuneflowPlugin, Song
+from tuneflow_py.models.protos import song_pb2
+from tuneflow_devkit.delta_utils import compute_song_delta
+from typing import Dict, List, Type
+from msgpack import packb
+
+SONG_FIELD_NAMES = [field.name for field in song_pb2.Song.DESCRIPTOR.fields]
+_SONG_FIELD_NUMBERS = {field.name: field.number for field in song_pb2.Song.DESCRIPTOR.fields}
+# Fields that are loaded even if the plugin does not declare them. Without the PPQ the song has a resolution of 0,
+# which breaks every conversion between ticks and seconds.
+REQUIRED_SONG_FIELD_NAMES = ['PPQ']
+
+
+def get_plugin_song_fields(plugin_class: Type[TuneflowPlugin]):
+    '''
+    Returns the top-level song fields declared in the `song_fields` attribute of the plugin class, or None if the
+    plugin needs the whole song.
+
+    The fields in `REQUIRED_SONG_FIELD_NAMES` are always loaded and need not be declared.
+    '''
+    song_fields = getattr(plugin_class, 'song_fields', None)
+    return list(song_fields) if song_fields is not None else None
+
+
+def _read_varint(data, offset: int):
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError("Unexpected end of song data")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def split_song_fields(song_bytes):
+    '''
+    Scans the top level of a serialized song and returns the byte ranges of each field number, without parsing
+    the fields themselves.
+    '''
+    field_ranges: Dict[int, List[tuple]] = {}
+    offset = 0
+    while offset < len(song_bytes):
+        start = offset
+        tag, offset = _read_varint(song_bytes, offset)
+        wire_type = tag & 0x07
+        if wire_type == 0:
+            _, offset = _read_varint(song_bytes, offset)
+        elif wire_type == 1:
+            offset += 8
+        elif wire_type == 2:
+            length, offset = _read_varint(song_bytes, offset)
+            offset += length
+        elif wire_type == 5:
+            offset += 4
+        else:
+            raise ValueError(f"Unsupported wire type {wire_type} in song data")
+        if offset > len(song_bytes):
+            raise ValueError("Unexpected end of song data")
+        field_ranges.setdefault(tag >> 3, []).append((start, offset))
+    return field_ranges
+
+
+class PartialSong:
+    def __init__(self, song_bytes, field_names: List[str]) -> None:
+        '''
+        Deserializes only the given top-level fields of a serialized song, plus the fields in
+        `REQUIRED_SONG_FIELD_NAMES`.
+
+        Fields that were not loaded are copied from the original bytes when the song is serialized again, so the
+        plugin must not modify them.
+        '''
+        self.song_bytes = song_bytes
+        self.field_names = list(field_names) + [field_name for field_name in REQUIRED_SONG_FIELD_NAMES
+                                                 if field_name not in field_names]
+        song_view = memoryview(song_bytes)
+        field_numbers = set(_SONG_FIELD_NUMBERS[field_name] for field_name in self.field_names)
+        self._loaded_chunks = []
+        self._skipped_chunks = []
+        for field_number, field_ranges in split_song_fields(song_view).items():
+            chunks = self._loaded_chunks if field_number in field_numbers else self._skipped_chunks
+            chunks.extend(song_view[start:end] for start, end in field_ranges)
+        self.loaded_bytes = b''.join(self._loaded_chunks)
+
+    def deserialize(self):
+        return Song.deserialize_from_bytestring(self.loaded_bytes)
+
+    def _check_undeclared_fields(self, song: Song):
+        modified_field_names = [field.name for field, _ in song._proto.ListFields()
+                                if field.name not in self.field_names]
+        if len(modified_field_names) > 0:
+            raise Exception(f"Plugin modified song fields it did not declare in song_fields: {modified_field_names}")
+
+    def serialize(self, song: Song):
+        '''
+        Serializes the loaded fields of the song and merges them with the fields that were not loaded.
+        '''
+        self._check_undeclared_fields(song)
+        return b''.join(self._skipped_chunks + [song.serialize_to_bytestring()])
+
+    def get_response(self, song: Song, response_mode='full'):
+        '''
+        Same as `get_song_response`, the delta only covers the loaded fields since the others cannot change.
+        '''
+        if response_mode == 'delta':
+            self._check_undeclared_fields(song)
+            song_delta = compute_song_delta(self.loaded_bytes, song)
+            if len(packb(song_delta)) < song._proto.ByteSize() + sum(len(chunk) for chunk in self._skipped_chunks):
+                return {"songDelta": song_delta}
+        return {"song": self.serialize(song)}
+
+
+def deserialize_plugin_song(plugin_class: Type[TuneflowPlugin], song_bytes):
+    '''
+    Deserializes the parts of the song the plugin declared in `song_fields`.
+
+    Returns the song and the `PartialSong` it was loaded from, which is None if the whole song was loaded.
+    '''
+    song_fields = get_plugin_song_fields(plugin_class)
+    if song_fields is None:
+        return Song.deserialize_from_bytestring(song_bytes), None
+    partial_song = PartialSong(song_bytes, song_fields)
+    return partial_song.deserialize(), partial_song
@@ -1,12 +1,18 @@
 from locale import getlocale
 from tuneflow_py import LabelText, Song
+import functools
 
 
 def get_system_locale():
     return getlocale()
 
 
+@functools.lru_cache(maxsize=None)
 def get_system_lang_or_default():
+    '''
+    Returns the language of the system locale, which is resolved once per process. Call
+    `get_system_lang_or_default.cache_clear()` after changing the locale.
+    '''
     current_locale: str = get_system_locale()[0]
     current_lang = current_locale.split(
         '_')[0] if current_locale is not None else 'en'
@@ -1,5 +1,6 @@
 from typing import Type
 from tuneflow_py import TuneflowPlugin
+from tuneflow_devkit.song_utils import SONG_FIELD_NAMES
 import re
 
 
@@ -23,6 +24,12 @@ def validate_plugin(plugin_class: Type[TuneflowPlugin]):
     if re.compile(r'[a-zA-Z]+[0-9a-zA-Z-]*').fullmatch(plugin_class.provider_id()) is None:
         raise Exception('provider_id must only use [0-9a-zA-Z-] and the first letter cannot be a digit`')
 
+    song_fields = getattr(plugin_class, 'song_fields', None)
+    if song_fields is not None:
+        for field_name in song_fields:
+            if field_name not in SONG_FIELD_NAMES:
+                raise Exception(f"song_fields must only contain fields of the song, one of {SONG_FIELD_NAMES}")
+
 
 def find_match_plugin_info(bundle_info, provider_id: str, plugin_id: str):
     for plugin_info in bundle_info["plugins"]:
@@ -0,0 +1,29 @@
+from fastapi.testclient import TestClient
+from tuneflow_devkit.app_factory import create_app
+from unittest import mock
+import os
+import pathlib
+import pytest
+import unittest
+
+TEST_CONFIG = {"routing": {"perPluginRoutes": True}}
+
+
+class TestAppFactory(unittest.TestCase):
+    def test_create_app(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        with mock.patch.dict(os.environ, {
+            "TUNEFLOW_DEVKIT_PLUGINS": "hello_world_plugin:HelloWorldPlugin",
+            "TUNEFLOW_DEVKIT_BUNDLE": bundle_file_path,
+            "TUNEFLOW_DEVKIT_CONFIG": "test_app_factory:TEST_CONFIG",
+            "TUNEFLOW_DEVKIT_PATH_PREFIX": "/plugins"
+        }):
+            app = create_app()
+        with TestClient(app) as client:
+            assert client.get("/plugins/plugin-bundle-info").status_code == 200
+            assert client.get("/plugins/ready").status_code == 200
+        with mock.patch.dict(os.environ, {"TUNEFLOW_DEVKIT_BUNDLE": bundle_file_path}):
+            os.environ.pop("TUNEFLOW_DEVKIT_PLUGINS", None)
+            with pytest.raises(Exception):
+                create_app()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+from tuneflow_devkit.bundle_utils import BundleInfoStore, EncodedBundleInfo, negotiate_media_type, etag_matches
+from msgpack import unpackb
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+
+def create_bundle_info(description_length=10):
+    return {
+        "plugins": [{"providerId": "andantei", "pluginId": "hello-world", "pluginDescription": "a" * description_length}]
+    }
+
+
+class TestBundleUtils(unittest.TestCase):
+    def test_negotiate_media_type(self):
+        assert negotiate_media_type(None) == 'application/json'
+        assert negotiate_media_type('*/*') == 'application/json'
+        assert negotiate_media_type('application/x-msgpack') == 'application/msgpack'
+        assert negotiate_media_type('application/json;q=0.5, application/msgpack') == 'application/msgpack'
+        assert negotiate_media_type('application/json, application/msgpack;q=0.5') == 'application/json'
+
+    def test_etag_matches(self):
+        assert etag_matches('"abc"', '"abc"')
+        assert etag_matches('W/"abc", "def"', '"abc"')
+        assert etag_matches('*', '"abc"')
+        assert not etag_matches('"def"', '"abc"')
+        assert not etag_matches(None, '"abc"')
+
+    def test_encoded_bundle_info(self):
+        bundle_info = create_bundle_info(description_length=2000)
+        encoded_bundle_info = EncodedBundleInfo(bundle_info)
+        status_code, body, headers = encoded_bundle_info.get_response()
+        assert status_code == 200
+        assert json.loads(body) == bundle_info
+        assert headers["Content-Type"] == 'application/json'
+
+        status_code, body, msgpack_headers = encoded_bundle_info.get_response(accept='application/msgpack')
+        assert unpackb(body) == bundle_info
+        assert msgpack_headers["ETag"] != headers["ETag"]
+
+        status_code, body, gzip_headers = encoded_bundle_info.get_response(accept_encoding='gzip, br')
+        assert gzip_headers["Content-Encoding"] == 'gzip'
+        assert json.loads(gzip.decompress(body)) == bundle_info
+
+        status_code, body, _ = encoded_bundle_info.get_response(if_none_match=headers["ETag"])
+        assert status_code == 304
+        assert body == b''
+
+        # Small bodies are not compressed.
+        _, _, headers = EncodedBundleInfo(create_bundle_info()).get_response(accept_encoding='gzip')
+        assert "Content-Encoding" not in headers
+
+    def test_bundle_info_store_reload(self):
+        with tempfile.TemporaryDirectory() as directory:
+            bundle_file_path = os.path.join(directory, 'bundle.json')
+
+            def write_bundle_info(bundle_info):
+                with open(bundle_file_path, 'w') as bundle_file:
+                    json.dump(bundle_info, bundle_file)
+
+            def load_bundle_info():
+                with open(bundle_file_path, 'r') as bundle_file:
+                    bundle_info = json.load(bundle_file)
+                    if "plugins" not in bundle_info:
+                        raise Exception("invalid bundle")
+                    return bundle_info
+
+            write_bundle_info(create_bundle_info(description_length=1))
+            store = BundleInfoStore(bundle_file_path, load_bundle_info=load_bundle_info, reload_interval=0)
+            etag = store.get().get_response()[2]["ETag"]
+
+            write_bundle_info(create_bundle_info(description_length=2))
+            assert store.get().bundle_info == create_bundle_info(description_length=2)
+            assert store.get().get_response()[2]["ETag"] != etag
+
+            write_bundle_info({})
+            assert store.get().bundle_info == create_bundle_info(description_length=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
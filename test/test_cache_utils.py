@@ -0,0 +1,43 @@
+from tuneflow_devkit.cache_utils import ResultCache, compute_cache_key
+import unittest
+import tempfile
+import os
+
+
+class TestResultCache(unittest.TestCase):
+    def test_cache_key(self):
+        key = compute_cache_key('run', 'a', 'b', {"x": 1, "y": {"c": 2, "d": 3}}, b'song')
+        assert key == compute_cache_key('run', 'a', 'b', {"y": {"d": 3, "c": 2}, "x": 1}, b'song')
+        assert key != compute_cache_key('run', 'a', 'b', {"x": 1, "y": {"c": 2, "d": 3}}, b'other song')
+        assert key != compute_cache_key('run', 'a', 'b', {"x": 2, "y": {"c": 2, "d": 3}}, b'song')
+        assert key != compute_cache_key('init', 'a', 'b', {"x": 1, "y": {"c": 2, "d": 3}}, b'song')
+
+    def test_memory_lru(self):
+        cache = ResultCache(max_memory_bytes=40)
+        cache.put('a', {"song": b'0' * 10})
+        cache.put('b', {"song": b'1' * 10})
+        self.assertEqual(cache.get('a'), {"song": b'0' * 10})
+        cache.put('c', {"song": b'2' * 10})
+        # 'b' is the least recently used entry.
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+        stats = cache.get_stats()
+        assert stats["hits"] == 3
+        assert stats["misses"] == 1
+        assert stats["memoryEntries"] == 2
+
+    def test_disk_tier(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(max_memory_bytes=0, directory=directory, max_disk_bytes=40)
+            cache.put('a', {"song": b'0' * 10})
+            cache.put('b', {"song": b'1' * 10})
+            os.utime(os.path.join(directory, 'a'), (0, 0))
+            cache.put('c', {"song": b'2' * 10})
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get('b'), {"song": b'1' * 10})
+            assert cache.get_stats()["diskHits"] == 1
+
+            reopened_cache = ResultCache(directory=directory, max_disk_bytes=40)
+            self.assertEqual(reopened_cache.get('c'), {"song": b'2' * 10})
+            assert reopened_cache.get_stats()["diskBytes"] == cache.get_stats()["diskBytes"]
@@ -0,0 +1,43 @@
+from tuneflow_devkit.cancellation_utils import CANCELLED, TIMEOUT, CancellationToken, JobCancelledError, \
+    get_cancellation_token, run_with_cancellation_token
+import pickle
+import pytest
+import time
+import unittest
+
+
+class TestCancellationToken(unittest.TestCase):
+    def test_cancel(self):
+        token = CancellationToken()
+        calls = []
+        token.add_callback(lambda: calls.append('cancelled'))
+        assert not token.is_cancelled()
+        assert token.get_remaining_time() is None
+        token.cancel()
+        token.cancel(TIMEOUT)
+        assert token.status == CANCELLED
+        assert calls == ['cancelled']
+        with pytest.raises(JobCancelledError) as e_info:
+            token.raise_if_cancelled()
+        assert e_info.value.status == CANCELLED
+        # Callbacks added after cancellation run immediately.
+        token.add_callback(lambda: calls.append('late'))
+        assert calls == ['cancelled', 'late']
+
+    def test_deadline(self):
+        token = CancellationToken(timeout=0.05)
+        assert token.status is None
+        assert 0 < token.get_remaining_time() <= 0.05
+        time.sleep(0.1)
+        assert token.status == TIMEOUT
+        assert token.get_remaining_time() == 0
+
+    def test_current_token(self):
+        token = CancellationToken()
+        assert not get_cancellation_token().is_cancelled()
+        assert run_with_cancellation_token(token, get_cancellation_token) is token
+        assert get_cancellation_token() is not token
+
+    def test_pickle_error(self):
+        error = pickle.loads(pickle.dumps(JobCancelledError(TIMEOUT)))
+        assert error.status == TIMEOUT
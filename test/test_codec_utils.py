@@ -0,0 +1,73 @@
+from tuneflow_devkit.codec_utils import BodyTooLargeError, InvalidContentLengthError, decompress_body, \
+    get_packed_chunks, parse_content_length, unpack_with_views
+from tuneflow_devkit.compression_utils import InvalidCompressedDataError, UnsupportedEncodingError
+from msgpack import ExtType, packb
+import gzip
+import pytest
+import tracemalloc
+import unittest
+
+
+class TestCodecUtils(unittest.TestCase):
+    def test_packed_chunks(self):
+        for response in [
+            {"status": "OK", "song": b'\x01' * 1000},
+            {"status": "OK", "song": b'\x02' * 100000, "jobId": "abc"},
+            {"status": "OK", "song": b'\x03' * 10},
+            {str(i): i for i in range(20)},
+        ]:
+            chunks = get_packed_chunks(response, chunk_size=64)
+            assert b''.join(chunks) == packb(response)
+
+    def test_unpack_with_views(self):
+        body = {
+            "providerId": "andantei",
+            "params": {"a": [1, -1, 2 ** 40, 1.5, None, True, "x" * 40, b'\x00' * 300, {"b": ExtType(1, b'ext')}]},
+            "song": b'\x01' * 70000,
+            "small": b'\x02',
+            "responseMode": "delta"
+        }
+        packed_body = bytearray(packb(body))
+        decoded_body = unpack_with_views(packed_body)
+        assert isinstance(decoded_body["song"], memoryview)
+        assert decoded_body["song"].obj is packed_body
+        assert {key: bytes(value) if isinstance(value, memoryview) else value
+                for key, value in decoded_body.items()} == body
+        assert unpack_with_views(packb([1, 2])) == [1, 2]
+        with pytest.raises(ValueError):
+            unpack_with_views(packed_body[:-10])
+        with pytest.raises(ValueError):
+            unpack_with_views(packed_body + b'\x01')
+
+    def test_decompress_body(self):
+        body = packb({"song": b'\x01' * 200000})
+        assert decompress_body(body, None) == body
+        assert decompress_body(gzip.compress(body), 'gzip', max_size=len(body)) == body
+        assert decompress_body(gzip.compress(gzip.compress(body)), 'gzip, gzip') == body
+        with pytest.raises(BodyTooLargeError):
+            decompress_body(gzip.compress(body), 'gzip', max_size=len(body) - 1)
+        with pytest.raises(UnsupportedEncodingError):
+            decompress_body(body, 'compress')
+        with pytest.raises(InvalidCompressedDataError):
+            decompress_body(gzip.compress(body)[:-8], 'gzip')
+
+    def test_decompress_body_memory(self):
+        compressed_body = gzip.compress(b'\x00' * 100 * 1024 * 1024)
+        tracemalloc.start()
+        try:
+            with pytest.raises(BodyTooLargeError):
+                decompress_body(compressed_body, 'gzip', max_size=1024 * 1024)
+            _, peak_size = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        # Output is produced in bounded chunks, so the peak stays close to the limit.
+        assert peak_size < 4 * 1024 * 1024
+
+    def test_parse_content_length(self):
+        self.assertIsNone(parse_content_length(None))
+        assert parse_content_length('0') == 0
+        assert parse_content_length(' 1024 ') == 1024
+        # Non-ASCII digits pass `str.isdigit` but not `int`.
+        for content_length in ['abc', '-1', '1.5', '', '0x10', '\u00b2', '1\u00b2']:
+            with pytest.raises(InvalidContentLengthError):
+                parse_content_length(content_length)
@@ -0,0 +1,38 @@
+from tuneflow_devkit.compression_utils import InvalidCompressedDataError, UnsupportedEncodingError, compress_chunks, \
+    decompress_chunks, get_available_encodings, negotiate_encoding
+import gzip
+import pytest
+import unittest
+
+
+class TestCompressionUtils(unittest.TestCase):
+    def test_negotiate_encoding(self):
+        encodings = ['zstd', 'br', 'gzip']
+        assert negotiate_encoding(None, encodings) is None
+        assert negotiate_encoding('gzip, deflate', encodings) == 'gzip'
+        assert negotiate_encoding('gzip, zstd', encodings) == 'zstd'
+        assert negotiate_encoding('gzip;q=1, zstd;q=0.5', encodings) == 'gzip'
+        assert negotiate_encoding('*', encodings) == 'zstd'
+        assert negotiate_encoding('*, zstd;q=0', encodings) == 'br'
+        assert negotiate_encoding('identity', encodings) is None
+
+    def test_compress_chunks(self):
+        chunks = [b'song' * 1000, memoryview(b'data' * 1000)]
+        for encoding in get_available_encodings():
+            compressed = compress_chunks(chunks, encoding)
+            assert len(compressed) < 8000
+            assert b''.join(decompress_chunks(compressed, encoding, 1024)) == b'song' * 1000 + b'data' * 1000
+            # Highly compressed data is still decoded in bounded chunks.
+            decompressed_chunks = list(decompress_chunks(
+                compress_chunks([b'\x00' * 1024 * 1024], encoding), encoding, 1024))
+            assert sum(len(chunk) for chunk in decompressed_chunks) == 1024 * 1024
+            assert max(len(chunk) for chunk in decompressed_chunks) <= 64 * 1024
+            with pytest.raises(InvalidCompressedDataError):
+                list(decompress_chunks(compressed[:-5], encoding, 1024))
+            with pytest.raises(InvalidCompressedDataError):
+                list(decompress_chunks(b'not compressed', encoding, 1024))
+        assert gzip.decompress(compress_chunks(chunks, 'gzip')) == b'song' * 1000 + b'data' * 1000
+        # Output is stable so that it can be used with ETags.
+        assert compress_chunks(chunks, 'gzip') == compress_chunks(chunks, 'gzip')
+        with pytest.raises(UnsupportedEncodingError):
+            compress_chunks(chunks, 'compress')
@@ -0,0 +1,184 @@
+from tuneflow_devkit import Debugger, get_cancellation_token
+from tuneflow_devkit.debugger import DebugSession
+from tuneflow_py import Song, TuneflowPlugin
+from msgpack import packb, unpackb
+import asyncio
+import os
+import pathlib
+import sys
+import tempfile
+import time
+import unittest
+
+PLUGIN_SOURCE = '''
+from tuneflow_py import TuneflowPlugin
+
+
+class ReloadedPlugin(TuneflowPlugin):
+    @staticmethod
+    def provider_id():
+        return "andantei"
+
+    @staticmethod
+    def plugin_id():
+        return "hello-world"
+
+    @staticmethod
+    def params(song):
+        return {}
+
+    @staticmethod
+    def run(song, params):
+        %s
+'''
+
+
+class SlowPlugin(TuneflowPlugin):
+    @staticmethod
+    def provider_id():
+        return "andantei"
+
+    @staticmethod
+    def plugin_id():
+        return "hello-world"
+
+    @staticmethod
+    def params(song):
+        return {}
+
+    @staticmethod
+    def run(song, params):
+        end_time = time.perf_counter() + params["seconds"]
+        while time.perf_counter() < end_time:
+            get_cancellation_token().raise_if_cancelled()
+            time.sleep(0.01)
+
+
+class FakeSocketServer:
+    def __init__(self) -> None:
+        self.events = []
+
+    async def emit(self, event, data, to=None, namespace=None):
+        self.events.append((event, to, unpackb(data)))
+
+
+class TestDebugger(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        sys.path.insert(0, self.directory.name)
+        self.module_file_path = os.path.join(self.directory.name, 'reloaded_plugin.py')
+        self.write_plugin('pass')
+        self.bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+
+    def tearDown(self):
+        sys.path.remove(self.directory.name)
+        sys.modules.pop('reloaded_plugin', None)
+        self.directory.cleanup()
+
+    def write_plugin(self, run_body: str):
+        with open(self.module_file_path, 'w') as module_file:
+            module_file.write(PLUGIN_SOURCE % run_body)
+        # Moves the mtime forward so that neither the watcher nor the bytecode cache miss the change.
+        mtime = os.stat(self.module_file_path).st_mtime + (0 if 'reloaded_plugin' not in sys.modules else 10)
+        os.utime(self.module_file_path, (mtime, mtime))
+
+    def test_reload_and_replay(self):
+        from reloaded_plugin import ReloadedPlugin  # type: ignore
+        replay_file_path = os.path.join(self.directory.name, 'last_input.msgpack')
+        debugger = Debugger(plugin_class=ReloadedPlugin, bundle_file_path=self.bundle_file_path,
+                            hot_reload=True, replay_file_path=replay_file_path)
+        self.assertIsNone(debugger.replay())
+        assert not debugger.has_changed()
+
+        debugger._cache_input(Song().serialize_to_bytestring(), {}, 'full')
+        assert debugger.replay()["status"] == "OK"
+
+        self.write_plugin('raise Exception("broken")')
+        assert debugger.has_changed()
+        assert debugger.reload_plugin()
+        assert debugger._plugin_class is not ReloadedPlugin
+        assert debugger.replay()["status"] == "RUN_PLUGIN_EXCEPTION"
+
+        # Code that fails to load keeps the previous class.
+        reloaded_plugin_class = debugger._plugin_class
+        self.write_plugin('return (')
+        assert not debugger.reload_plugin()
+        assert debugger._plugin_class is reloaded_plugin_class
+
+        # The last input survives restarts.
+        other_debugger = Debugger(plugin_class=ReloadedPlugin, bundle_file_path=self.bundle_file_path,
+                                  replay_file_path=replay_file_path)
+        assert other_debugger.replay()["status"] == "OK"
+
+    def test_song_chunks(self):
+        session = DebugSession('daw-1')
+        # Chunk storage grows with the chunks received, not with the declared count.
+        session.receive_chunk('song-1', 0, 50000000, b'1', max_size=1024)
+        assert len(session._transfers['song-1']) == 1
+        session.discard_transfer('song-1')
+
+        # A resent chunk replaces the earlier one without counting twice towards the limit.
+        for _ in range(3):
+            session.receive_chunk('song-2', 1, 2, b'2' * 400, max_size=1024)
+        session.receive_chunk('song-2', 0, 2, b'1' * 400, max_size=1024)
+        assert session.take_song('song-2') == b'1' * 400 + b'2' * 400
+
+        session.receive_chunk('song-3', 0, 2, b'1', max_size=1024)
+        with self.assertRaises(Exception):
+            session.take_song('song-3')
+        with self.assertRaises(Exception):
+            session.receive_chunk('song-4', 0, 1, b'1' * 1025, max_size=1024)
+
+    def test_sessions(self):
+        debugger = Debugger(plugin_class=SlowPlugin, bundle_file_path=self.bundle_file_path, max_workers=4)
+        debugger.create_app()
+        sio = FakeSocketServer()
+        debugger._sio = sio  # type: ignore
+        song_bytes = Song().serialize_to_bytestring()
+
+        async def run_sessions():
+            await debugger._handle_connect('daw-1', {})
+            await debugger._handle_connect('daw-2', {})
+            # A slow run in one session does not block the other session.
+            slow_run = asyncio.ensure_future(debugger._handle_run_plugin('daw-1', packb({
+                "song": song_bytes,
+                "params": {"seconds": 10}
+            })))
+            await asyncio.sleep(0.1)
+            start_time = time.perf_counter()
+            assert (await debugger._handle_get_bundle_info('daw-2'))["status"] == "OK"
+            half_size = len(song_bytes) // 2
+            for index, chunk in reversed(list(enumerate([song_bytes[:half_size], song_bytes[half_size:]]))):
+                response = await debugger._handle_song_chunk('daw-2', packb({
+                    "transferId": "song-1",
+                    "index": index,
+                    "total": 2,
+                    "data": chunk
+                }))
+                assert unpackb(response)["status"] == "OK"
+            response = unpackb(await debugger._handle_run_plugin('daw-2', packb({
+                "songTransferId": "song-1",
+                "params": {"seconds": 0},
+                "resultChunkSize": 1
+            })))
+            assert time.perf_counter() - start_time < 5
+            chunks = [event[2] for event in sio.events if event[0] == 'result-chunk']
+            assert response["resultChunkCount"] == len(chunks)
+            assert all(event[1] == 'daw-2' for event in sio.events)
+            result = unpackb(b''.join(chunk["data"] for chunk in sorted(chunks, key=lambda chunk: chunk["index"])))
+            assert result["status"] == "OK"
+            assert response["status"] == "OK"
+            response = unpackb(await debugger._handle_run_plugin('daw-2', packb({
+                "songTransferId": "song-1",
+                "params": {"seconds": 0}
+            })))
+            assert response["status"] == "SONG_TRANSFER_ERROR"
+
+            # Disconnecting stops the run of the session.
+            await debugger._handle_disconnect('daw-1')
+            assert unpackb(await slow_run)["status"] == "CANCELLED"
+            assert time.perf_counter() - start_time < 5
+
+        asyncio.run(run_sessions())
+        debugger._executor.shutdown()  # type: ignore
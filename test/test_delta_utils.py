@@ -0,0 +1,59 @@
+from tuneflow_py import Song, TrackType
+from tuneflow_devkit.delta_utils import compute_song_delta, apply_song_delta, get_song_response
+from msgpack import packb, unpackb
+import unittest
+
+
+def create_test_song():
+    song = Song()
+    for _ in range(4):
+        track = song.create_track(type=TrackType.MIDI_TRACK)
+        clip = track.create_midi_clip(clip_start_tick=0, clip_end_tick=10000)
+        for note_index in range(100):
+            clip.create_note(pitch=60, velocity=100, start_tick=note_index * 10, end_tick=note_index * 10 + 5)
+    return song
+
+
+class TestDeltaUtils(unittest.TestCase):
+    def test_round_trip(self):
+        song_bytes = create_test_song().serialize_to_bytestring()
+        song = Song.deserialize_from_bytestring(song_bytes)
+        track = song.get_track_at(2)
+        clip = track.get_clip_at(0)
+        clip.create_note(pitch=72, velocity=80, start_tick=5, end_tick=9)
+        clip.get_raw_note_at(3).set_pitch(64)
+        clip.delete_note_at(10)
+        track.set_pan(30)
+        song.remove_track(song.get_track_at(0).get_id())
+        song.create_track(type=TrackType.MIDI_TRACK, index=0)
+        song.get_tempo_event_at(0)._proto.bpm = 90
+
+        song_delta = compute_song_delta(song_bytes, song)
+        # Deltas travel inside msgpack responses.
+        song_delta = unpackb(packb(song_delta))
+        assert len(packb(song_delta)) < len(song.serialize_to_bytestring()) / 10
+        applied_song = apply_song_delta(song_bytes, song_delta)
+        assert applied_song._proto == song._proto
+
+    def test_reorder_tracks(self):
+        song_bytes = create_test_song().serialize_to_bytestring()
+        song = Song.deserialize_from_bytestring(song_bytes)
+        first_track = song.get_track_at(0)._proto
+        song._proto.tracks.append(first_track)
+        del song._proto.tracks[0]
+        song_delta = compute_song_delta(song_bytes, song)
+        assert "order" in song_delta["tracks"]
+        assert apply_song_delta(song_bytes, song_delta)._proto == song._proto
+
+    def test_unchanged_song(self):
+        song_bytes = create_test_song().serialize_to_bytestring()
+        song = Song.deserialize_from_bytestring(song_bytes)
+        assert compute_song_delta(song_bytes, song) == {}
+        assert get_song_response(song_bytes, song, response_mode='delta') == {"songDelta": {}}
+
+    def test_fall_back_to_full_song(self):
+        song_bytes = Song().serialize_to_bytestring()
+        song = create_test_song()
+        assert get_song_response(song_bytes, song, response_mode='delta') == {
+            "song": song.serialize_to_bytestring()}
+        assert get_song_response(song_bytes, song) == {"song": song.serialize_to_bytestring()}
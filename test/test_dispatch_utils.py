@@ -0,0 +1,48 @@
+from __future__ import annotations
+from tuneflow_devkit.dispatch_utils import PluginDispatchTable
+from hello_world_plugin import HelloWorldPlugin
+import unittest
+import pytest
+
+
+def create_bundle_info(plugin_ids):
+    return {
+        "plugins": [{"providerId": "andantei", "pluginId": plugin_id} for plugin_id in plugin_ids]
+    }
+
+
+class TestDispatchUtils(unittest.TestCase):
+    def test_from_bundle(self):
+        dispatch_table = PluginDispatchTable.from_bundle([HelloWorldPlugin], create_bundle_info(['hello-world']))
+        entry = dispatch_table.get('andantei', 'hello-world')
+        assert entry is not None
+        assert entry.plugin_class is HelloWorldPlugin
+        assert entry.plugin_info["pluginId"] == 'hello-world'
+        assert dispatch_table.get('andantei', 'unknown') is None
+        assert len(dispatch_table) == 1
+
+    def test_mismatched_bundle(self):
+        with pytest.raises(Exception, match='not specified in the bundle'):
+            PluginDispatchTable.from_bundle([HelloWorldPlugin], create_bundle_info([]))
+        with pytest.raises(Exception, match='has no corresponding source code'):
+            PluginDispatchTable.from_bundle([HelloWorldPlugin], create_bundle_info(['hello-world', 'missing']))
+        with pytest.raises(Exception, match='more than once'):
+            PluginDispatchTable.from_bundle([HelloWorldPlugin, HelloWorldPlugin], create_bundle_info(['hello-world']))
+
+    def test_with_plugin_configs(self):
+        dispatch_table = PluginDispatchTable.from_bundle([HelloWorldPlugin], create_bundle_info(['hello-world']))
+        configured_table = dispatch_table.with_plugin_configs({
+            "andantei": {
+                "hello-world": {
+                    "cache": False
+                }
+            }
+        })
+        assert configured_table.get('andantei', 'hello-world').get_config("cache", True) is False
+        assert dispatch_table.get('andantei', 'hello-world').get_config("cache", True) is True
+        with pytest.raises(TypeError):
+            configured_table.get('andantei', 'hello-world').config["cache"] = True  # type: ignore
+
+
+if __name__ == '__main__':
+    unittest.main()
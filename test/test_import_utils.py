@@ -0,0 +1,29 @@
+from tuneflow_devkit.import_utils import load_config, load_object
+import json
+import os
+import pytest
+import tempfile
+import unittest
+
+TEST_CONFIG = {"routing": {"perPluginRoutes": True}}
+
+
+def create_test_config():
+    return TEST_CONFIG
+
+
+class TestImportUtils(unittest.TestCase):
+    def test_load_object(self):
+        assert load_object('test_import_utils:TEST_CONFIG') is TEST_CONFIG
+        with pytest.raises(Exception):
+            load_object('test_import_utils')
+
+    def test_load_config(self):
+        assert load_config(None) is None
+        assert load_config("test_import_utils:TEST_CONFIG") == TEST_CONFIG
+        assert load_config("test_import_utils:create_test_config") == TEST_CONFIG
+        with tempfile.TemporaryDirectory() as directory:
+            config_file_path = os.path.join(directory, 'config.json')
+            with open(config_file_path, 'w') as config_file:
+                json.dump(TEST_CONFIG, config_file)
+            assert load_config(config_file_path) == TEST_CONFIG
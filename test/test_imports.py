@@ -0,0 +1,42 @@
+import os
+import pathlib
+import pytest
+import subprocess
+import sys
+import tuneflow_devkit
+import unittest
+
+SRC_DIR = str(pathlib.PurePath(__file__).parent.parent.joinpath('src'))
+
+
+def get_imported_modules(statement: str):
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join([SRC_DIR, environment.get("PYTHONPATH", "")])
+    output = subprocess.check_output(
+        [sys.executable, '-c', f'import sys\n{statement}\nprint(" ".join(sys.modules.keys()))'], env=environment)
+    return set(output.decode('utf-8').split())
+
+
+class TestImports(unittest.TestCase):
+    def test_lazy_imports(self):
+        modules = get_imported_modules('import tuneflow_devkit')
+        assert 'tuneflow_devkit.runner' not in modules
+        assert 'tuneflow_devkit.debugger' not in modules
+        # Plugin worker processes only need the executor.
+        modules = get_imported_modules('import tuneflow_devkit.executor_utils')
+        for module_name in ['fastapi', 'socketio', 'uvicorn']:
+            assert module_name not in modules
+        # The offline CLI bypasses HTTP.
+        modules = get_imported_modules('import tuneflow_devkit.__main__')
+        for module_name in ['fastapi', 'socketio', 'uvicorn']:
+            assert module_name not in modules
+        modules = get_imported_modules('from tuneflow_devkit import Runner')
+        assert 'fastapi' in modules
+        assert 'socketio' not in modules
+
+    def test_public_names(self):
+        for name in tuneflow_devkit.__all__:
+            assert getattr(tuneflow_devkit, name) is not None
+            assert name in dir(tuneflow_devkit)
+        with pytest.raises(AttributeError):
+            tuneflow_devkit.NotAName  # type: ignore
@@ -0,0 +1,53 @@
+from tuneflow_devkit.job_utils import InMemoryJobRegistry, JobStatus, SqliteJobRegistry
+import os
+import tempfile
+import unittest
+
+
+class TestInMemoryJobRegistry(unittest.TestCase):
+    def test_status_transitions(self):
+        registry = InMemoryJobRegistry()
+        registry.create('job-1')
+        assert registry.get('job-1')["status"] == JobStatus.PENDING
+        registry.set_status('job-1', JobStatus.RUNNING)
+        assert registry.get('job-1')["status"] == JobStatus.RUNNING
+        registry.set_status('job-1', JobStatus.DONE)
+        assert registry.get('job-1')["status"] == JobStatus.DONE
+        self.assertIsNone(registry.get('job-2'))
+
+    def test_eviction(self):
+        registry = InMemoryJobRegistry(finished_job_ttl=-1, max_jobs=2)
+        registry.create('job-1')
+        registry.create('job-2')
+        registry.create('job-3')
+        self.assertIsNone(registry.get('job-1'))
+        registry.set_status('job-2', JobStatus.ERROR)
+        self.assertIsNone(registry.get('job-2'))
+        assert registry.get('job-3')["status"] == JobStatus.PENDING
+
+
+class TestSqliteJobRegistry(unittest.TestCase):
+    def test_shared_jobs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'jobs.db')
+            registry = SqliteJobRegistry(path)
+            other_registry = SqliteJobRegistry(path)
+            registry.create('job-1')
+            assert other_registry.get('job-1')["status"] == JobStatus.PENDING
+            other_registry.set_status('job-1', JobStatus.RUNNING)
+            assert registry.get('job-1')["status"] == JobStatus.RUNNING
+            assert not registry.is_cancel_requested('job-1')
+            other_registry.request_cancel('job-1')
+            assert registry.is_cancel_requested('job-1')
+            self.assertIsNone(registry.get('job-2'))
+
+    def test_eviction(self):
+        with tempfile.TemporaryDirectory() as directory:
+            registry = SqliteJobRegistry(os.path.join(directory, 'jobs.db'), finished_job_ttl=-1, max_jobs=2)
+            registry.create('job-1')
+            registry.create('job-2')
+            registry.create('job-3')
+            self.assertIsNone(registry.get('job-1'))
+            registry.set_status('job-2', JobStatus.ERROR)
+            self.assertIsNone(registry.get('job-2'))
+            assert registry.get('job-3')["status"] == JobStatus.PENDING
@@ -0,0 +1,82 @@
+from __future__ import annotations
+from tuneflow_devkit import OfflineRunner
+from tuneflow_py import Song
+from hello_world_plugin import HelloWorldPlugin
+from msgpack import packb
+import json
+import os
+import pathlib
+import tempfile
+import unittest
+
+
+class TestOfflineRunner(unittest.TestCase):
+    def test_directory_input(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        offline_runner = OfflineRunner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path)
+        with tempfile.TemporaryDirectory() as directory:
+            input_dir = os.path.join(directory, 'input')
+            output_dir = os.path.join(directory, 'output')
+            os.makedirs(input_dir)
+            for index in range(3):
+                with open(os.path.join(input_dir, f'{index}.song'), 'wb') as song_file:
+                    song_file.write(Song().serialize_to_bytestring())
+            with open(os.path.join(input_dir, 'invalid.song'), 'wb') as song_file:
+                song_file.write(b'\xff\xff')
+
+            stats = offline_runner.run(input_path=input_dir, output_dir=output_dir, mode='thread')
+            assert stats["ok"] == 3
+            assert stats["error"] == 1
+            with open(os.path.join(output_dir, 'songs', '0.song'), 'rb') as song_file:
+                Song.deserialize_from_bytestring(song_file.read())
+
+            # Only the failed item runs again.
+            stats = offline_runner.run(input_path=input_dir, output_dir=output_dir, mode='thread')
+            assert stats["skipped"] == 3
+            assert stats["error"] == 1
+            with open(os.path.join(output_dir, 'progress.jsonl'), 'r') as progress_file:
+                assert len(progress_file.readlines()) == 5
+
+    def test_stream_input(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        offline_runner = OfflineRunner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path)
+        with tempfile.TemporaryDirectory() as directory:
+            stream_file_path = os.path.join(directory, 'songs.msgpack')
+            with open(stream_file_path, 'wb') as stream_file:
+                stream_file.write(packb({"id": "first", "song": Song().serialize_to_bytestring(), "params": {}}))
+                stream_file.write(packb({"song": Song().serialize_to_bytestring()}))
+            output_dir = os.path.join(directory, 'output')
+            stats = offline_runner.run(input_path=stream_file_path, output_dir=output_dir, mode='process', max_workers=2)
+            assert stats["ok"] == 2
+            assert sorted(os.listdir(output_dir)) == ['progress.jsonl', 'songs']
+            assert sorted(os.listdir(os.path.join(output_dir, 'songs'))) == ['1.song', 'first']
+            with open(os.path.join(output_dir, 'progress.jsonl'), 'r') as progress_file:
+                assert json.loads(progress_file.readline())["status"] == "OK"
+
+    def test_item_ids(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        offline_runner = OfflineRunner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path)
+        with tempfile.TemporaryDirectory() as directory:
+            stream_file_path = os.path.join(directory, 'songs.msgpack')
+            with open(stream_file_path, 'wb') as stream_file:
+                for item_id in ['progress.jsonl', '..', '', '../escaped', 'song', 'song', 'blocked']:
+                    stream_file.write(packb({"id": item_id, "song": Song().serialize_to_bytestring()}))
+            output_dir = os.path.join(directory, 'output')
+            # Results that cannot be written fail their own item.
+            os.makedirs(os.path.join(output_dir, 'songs', 'blocked'))
+            stats = offline_runner.run(input_path=stream_file_path, output_dir=output_dir, mode='thread')
+            # Invalid and duplicate ids only fail their own item.
+            assert stats["ok"] == 2
+            assert stats["error"] == 5
+            assert sorted(os.listdir(directory)) == ['output', 'songs.msgpack']
+            assert sorted(os.listdir(os.path.join(output_dir, 'songs'))) == ['blocked', 'progress.jsonl', 'song']
+            # The progress file is still readable when resuming.
+            stats = offline_runner.run(input_path=stream_file_path, output_dir=output_dir, mode='thread')
+            assert stats["skipped"] == 2
+
+
+if __name__ == '__main__':
+    unittest.main()
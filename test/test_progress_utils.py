@@ -0,0 +1,47 @@
+from tuneflow_devkit.progress_utils import ProgressChannel, ProgressReporter, format_server_sent_event, \
+    report_progress, run_with_progress_reporter
+from tuneflow_py import Song
+import asyncio
+import base64
+import json
+import unittest
+
+
+class TestProgressUtils(unittest.TestCase):
+    def test_rate_limit(self):
+        reports = []
+        reporter = ProgressReporter(callback=reports.append, min_interval=60)
+        assert reporter.report(0.1, 'loading')
+        assert not reporter.report(0.2, 'loading')
+        # Stage changes and the final report are never dropped.
+        assert reporter.report(0.3, 'generating')
+        assert reporter.report(1, 'generating', song=Song())
+        assert [report["progress"] for report in reports] == [0.1, 0.3, 1]
+        assert isinstance(reports[-1]["song"], bytes)
+
+    def test_current_reporter(self):
+        reports = []
+        assert not report_progress(0.5)
+        assert run_with_progress_reporter(ProgressReporter(callback=reports.append), report_progress, 0.5)
+        assert reports == [{"progress": 0.5, "stage": None}]
+
+    def test_progress_channel(self):
+        async def collect():
+            channel = ProgressChannel(asyncio.get_event_loop())
+            channel.publish({"progress": 0.1, "stage": None})
+            subscription = channel.subscribe()
+            # New subscribers start from the latest progress.
+            assert (await subscription.__anext__())["progress"] == 0.1
+            channel.publish_threadsafe({"progress": 0.5, "stage": None})
+            assert (await subscription.__anext__())["progress"] == 0.5
+            channel.close()
+            return [progress async for progress in subscription]
+        assert asyncio.new_event_loop().run_until_complete(collect()) == []
+
+    def test_format_server_sent_event(self):
+        event = format_server_sent_event('progress', {"progress": 1, "song": b'\x01\x02'}).decode('utf-8')
+        assert event.startswith('event: progress\ndata: ')
+        assert event.endswith('\n\n')
+        data = json.loads(event.split('data: ')[1])
+        assert base64.b64decode(data["song"]) == b'\x01\x02'
+        assert format_server_sent_event(None) == b': keep-alive\n\n'
@@ -0,0 +1,60 @@
+from tuneflow_devkit.result_store_utils import FileSystemResultStore, InMemoryResultStore, ResultStore, \
+    ResultTooLargeError
+import os
+import pytest
+import tempfile
+import time
+import unittest
+
+
+class PutOnlyResultStore(ResultStore):
+    def put(self, job_id: str, result: bytes):
+        pass
+
+
+class TestResultStores(unittest.TestCase):
+    def test_incomplete_result_store(self):
+        # Stores must implement both `put` and `get`.
+        with pytest.raises(TypeError):
+            PutOnlyResultStore()
+
+    def test_in_memory_result_store(self):
+        store = InMemoryResultStore(ttl=3600, max_memory_bytes=10)
+        store.put('job-1', b'12345')
+        store.put('job-2', b'12345')
+        assert store.get('job-1') == b'12345'
+        store.put('job-3', b'123')
+        # The oldest result is evicted once the store is full.
+        self.assertIsNone(store.get('job-1'))
+        assert store.get('job-2') == b'12345'
+        assert store.get_stats() == {"results": 2, "memoryBytes": 8}
+        self.assertIsNone(store.get('missing'))
+        with pytest.raises(ResultTooLargeError):
+            store.put('job-4', b'12345678901')
+
+        expired_store = InMemoryResultStore(ttl=-1)
+        expired_store.put('job-1', b'12345')
+        self.assertIsNone(expired_store.get('job-1'))
+
+    def test_file_system_result_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = FileSystemResultStore(directory=directory, max_disk_bytes=10)
+            store.put('job-1', b'12345')
+            assert store.get('job-1') == b'12345'
+            assert store.get_file_path('job-1') == os.path.join(directory, 'job-1')
+            # Make job-1 the oldest result.
+            os.utime(os.path.join(directory, 'job-1'), (time.time() - 10, time.time() - 10))
+            store.put('job-2', b'12345')
+            store.put('job-3', b'123')
+            self.assertIsNone(store.get('job-1'))
+            assert store.get('job-3') == b'123'
+            assert not any(file_name.endswith('.tmp') for file_name in os.listdir(directory))
+            self.assertIsNone(store.get_file_path('../job-2'))
+            with pytest.raises(ValueError):
+                store.put('../job-4', b'1')
+            with pytest.raises(ResultTooLargeError):
+                store.put('job-5', b'12345678901')
+
+            # Results written by a previous process are served until they expire.
+            assert FileSystemResultStore(directory=directory).get('job-2') == b'12345'
+            self.assertIsNone(FileSystemResultStore(directory=directory, ttl=-1).get('job-2'))
@@ -1,14 +1,251 @@
 from __future__ import annotations
 from fastapi import Request, HTTPException, status
 from fastapi.testclient import TestClient
-from tuneflow_devkit import Runner
-from tuneflow_py import Song
+from tuneflow_devkit import Runner, get_cancellation_token, report_progress
+from tuneflow_devkit.delta_utils import apply_song_delta
+from tuneflow_devkit.job_utils import InMemoryJobRegistry, SqliteJobRegistry
+from tuneflow_py import Song, TuneflowPlugin, TrackType
 from hello_world_plugin import HelloWorldPlugin
 import unittest
+import asyncio
+import httpx
+import time
+import pytest
 import pathlib
+import base64
+import gzip
 import json
+import os
+import tempfile
+import threading
 from typing import Optional
-from msgpack import packb, unpackb
+from msgpack import Unpacker, packb, unpackb
+
+
+class CountingPlugin(TuneflowPlugin):
+    run_count = 0
+
+    @staticmethod
+    def provider_id() -> str:
+        return "andantei"
+
+    @staticmethod
+    def plugin_id() -> str:
+        return "hello-world"
+
+    @staticmethod
+    def run(song: Song, params):
+        CountingPlugin.run_count += 1
+
+
+class SlowCountingPlugin(TuneflowPlugin):
+    run_count = 0
+
+    @staticmethod
+    def provider_id() -> str:
+        return "andantei"
+
+    @staticmethod
+    def plugin_id() -> str:
+        return "hello-world"
+
+    @staticmethod
+    def run(song: Song, params):
+        SlowCountingPlugin.run_count += 1
+        time.sleep(0.2)
+
+
+class TransposePlugin(TuneflowPlugin):
+    @staticmethod
+    def provider_id() -> str:
+        return "andantei"
+
+    @staticmethod
+    def plugin_id() -> str:
+        return "hello-world"
+
+    @staticmethod
+    def run(song: Song, params):
+        for note in song.get_track_at(0).get_clip_at(0).get_notes():
+            note.set_pitch(note.get_pitch() + 1)
+
+
+class TempoPlugin(TuneflowPlugin):
+    song_fields = ['tempos']
+
+    @staticmethod
+    def provider_id() -> str:
+        return "andantei"
+
+    @staticmethod
+    def plugin_id() -> str:
+        return "hello-world"
+
+    @staticmethod
+    def run(song: Song, params):
+        assert song.get_track_count() == 0
+        song.get_tempo_event_at(0)._proto.bpm = params["bpm"]
+
+
+class CrashingPlugin(TuneflowPlugin):
+    @staticmethod
+    def provider_id() -> str:
+        return "andantei"
+
+    @staticmethod
+    def plugin_id() -> str:
+        return "hello-world"
+
+    @staticmethod
+    def run(song: Song, params):
+        if params["crash"]:
+            os._exit(1)
+
+
+class LifecyclePlugin(TuneflowPlugin):
+    events = []
+
+    @staticmethod
+    def provider_id() -> str:
+        return "andantei"
+
+    @staticmethod
+    def plugin_id() -> str:
+        return "hello-world"
+
+    @staticmethod
+    def setup():
+        time.sleep(0.2)
+        LifecyclePlugin.events.append('setup')
+
+    @staticmethod
+    def teardown():
+        LifecyclePlugin.events.append('teardown')
+
+    @staticmethod
+    def run(song: Song, params):
+        LifecyclePlugin.events.append('run')
+
+
+class FailingSetupPlugin(TuneflowPlugin):
+    @staticmethod
+    def provider_id() -> str:
+        return "andantei"
+
+    @staticmethod
+    def plugin_id() -> str:
+        return "hello-world"
+
+    @staticmethod
+    def setup():
+        raise Exception('Model not found')
+
+    @staticmethod
+    def run(song: Song, params):
+        pass
+
+
+class SleepingPlugin(TuneflowPlugin):
+    @staticmethod
+    def provider_id() -> str:
+        return "andantei"
+
+    @staticmethod
+    def plugin_id() -> str:
+        return "hello-world"
+
+    @staticmethod
+    def run(song: Song, params):
+        end_time = time.time() + params["seconds"]
+        while time.time() < end_time:
+            if params["cooperative"]:
+                get_cancellation_token().raise_if_cancelled()
+            time.sleep(0.01)
+
+
+class DisconnectPlugin(TuneflowPlugin):
+    started = threading.Event()
+    statuses = []
+
+    @staticmethod
+    def provider_id() -> str:
+        return "andantei"
+
+    @staticmethod
+    def plugin_id() -> str:
+        return "hello-world"
+
+    @staticmethod
+    def run(song: Song, params):
+        cancellation_token = get_cancellation_token()
+        DisconnectPlugin.started.set()
+        end_time = time.time() + 10
+        while time.time() < end_time and not cancellation_token.is_cancelled():
+            time.sleep(0.01)
+        DisconnectPlugin.statuses.append(cancellation_token.status)
+        cancellation_token.raise_if_cancelled()
+
+
+class ProgressPlugin(TuneflowPlugin):
+    @staticmethod
+    def provider_id() -> str:
+        return "andantei"
+
+    @staticmethod
+    def plugin_id() -> str:
+        return "hello-world"
+
+    @staticmethod
+    def run(song: Song, params):
+        report_progress(0.5, 'generating')
+        time.sleep(0.3)
+        song.create_track(type=TrackType.MIDI_TRACK)
+        report_progress(1, 'generating', song=song)
+
+
+class EventLoopCheckingJobRegistry(SqliteJobRegistry):
+    loop_calls = []
+
+    def _check_thread(self, method_name: str):
+        try:
+            asyncio.get_running_loop()
+            self.loop_calls.append(method_name)
+        except RuntimeError:
+            pass
+
+    def create(self, job_id):
+        self._check_thread('create')
+        return super().create(job_id)
+
+    def set_status(self, job_id, status):
+        self._check_thread('set_status')
+        return super().set_status(job_id, status)
+
+    def get(self, job_id):
+        self._check_thread('get')
+        return super().get(job_id)
+
+
+class OffLoopCheckingJobRegistry(InMemoryJobRegistry):
+    off_loop_calls = []
+
+    def _check_thread(self, method_name: str):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.off_loop_calls.append(method_name)
+
+    def create(self, job_id):
+        self._check_thread('create')
+        return super().create(job_id)
+
+    def set_status(self, job_id, status):
+        self._check_thread('set_status')
+        return super().set_status(job_id, status)
+
+    def get(self, job_id):
+        self._check_thread('get')
+        return super().get(job_id)
 
 
 class TestPluginCases(unittest.TestCase):
@@ -23,6 +260,12 @@ class TestPluginCases(unittest.TestCase):
         with open(bundle_file_path, 'r') as bundle_file:
             bundle_info = json.load(bundle_file)
             assert response.json() == bundle_info
+
+        assert "ETag" in response.headers
+        response = client.get("/plugin-bundle-info", headers={"If-None-Match": response.headers["ETag"]})
+        assert response.status_code == 304
+        response = client.get("/plugin-bundle-info", headers={"Accept": "application/msgpack"})
+        assert unpackb(response.content) == bundle_info
     
     def test_runner_path_prefix(self):
         bundle_file_path = str(pathlib.PurePath(
@@ -73,6 +316,50 @@ class TestPluginCases(unittest.TestCase):
         assert parsed_actual_result["status"] == "OK"
         assert parsed_actual_result["song"] is not None
 
+    def test_executor_modes(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+
+        for mode in ['thread', 'process', 'inline']:
+            app = Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start(config={
+                "executor": {
+                    "mode": mode,
+                    "maxWorkers": 2
+                }
+            })
+
+            with TestClient(app) as client:
+                response = client.post("/init-plugin-params", data=packb({
+                    "providerId": "andantei",
+                    "pluginId": "hello-world",
+                    "song": Song().serialize_to_bytestring()
+                }))
+                parsed_init_result = unpackb(response.content)
+                assert parsed_init_result["status"] == "OK"
+                assert parsed_init_result["params"] == {}
+
+                response = client.post("/jobs", data=packb({
+                    "providerId": "andantei",
+                    "pluginId": "hello-world",
+                    "params": {},
+                    "song": Song().serialize_to_bytestring()
+                }))
+                parsed_run_result = unpackb(response.content)
+                assert parsed_run_result["status"] == "OK"
+                assert parsed_run_result["song"] is not None
+
+    def test_invalid_executor_mode(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+
+        with pytest.raises(Exception) as e_info:
+            Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start(config={
+                "executor": {
+                    "mode": "fiber"
+                }
+            })
+        self.assertIn("executor mode must be one of", e_info.value.args[0])
+
     def test_async_runner(self):
         bundle_file_path = str(pathlib.PurePath(
             __file__).parent.joinpath('hello_world_plugin.bundle.json'))
@@ -118,6 +405,846 @@ class TestPluginCases(unittest.TestCase):
             job_id=parsed_actual_result["jobId"])
         assert actual_job_id == parsed_actual_result["jobId"]
 
+        status_result = client.get(f'/jobs/{parsed_accepted_result["jobId"]}')
+        parsed_status_result = unpackb(status_result.content)
+        assert parsed_status_result["status"] == "OK"
+        assert parsed_status_result["jobStatus"] == "DONE"
+        assert parsed_status_result["resultUrl"] == parsed_accepted_result["resultUrl"]
+
+        missing_status_result = client.get('/jobs/missing-job')
+        assert missing_status_result.status_code == 404
+
+    def test_async_result_stores(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        with tempfile.TemporaryDirectory() as directory:
+            # Without a store config results are kept in memory.
+            for async_config in [{"enabled": True}, {"store": {"type": "memory"}},
+                                 {"store": {"type": "filesystem", "directory": directory}}]:
+                app = Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start(config={
+                    "async": async_config
+                }, path_prefix='/plugins')
+                client = TestClient(app)
+                parsed_accepted_result = unpackb(client.post("/plugins/jobs", data=packb({
+                    "providerId": "andantei",
+                    "pluginId": "hello-world",
+                    "params": {},
+                    "song": Song().serialize_to_bytestring()
+                })).content)
+                job_id = parsed_accepted_result["jobId"]
+                assert parsed_accepted_result["resultUrl"] == f'/plugins/jobs/{job_id}/result'
+                response = client.get(parsed_accepted_result["resultUrl"])
+                assert response.status_code == 200
+                parsed_result = unpackb(response.content)
+                assert parsed_result["status"] == "OK"
+                assert parsed_result["jobId"] == job_id
+                assert parsed_result["song"] is not None
+                assert client.get('/plugins/jobs/missing-job/result').status_code == 404
+
+    def test_async_result_too_large(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        song = Song()
+        clip = song.create_track(type=TrackType.MIDI_TRACK).create_midi_clip(clip_start_tick=0, clip_end_tick=100000)
+        for index in range(200):
+            clip.create_note(pitch=60, velocity=100, start_tick=index * 100, end_tick=index * 100 + 50)
+        with tempfile.TemporaryDirectory() as directory:
+            for store_config in [{"type": "memory", "maxMemoryBytes": 512},
+                                 {"type": "filesystem", "directory": directory, "maxDiskBytes": 512}]:
+                app = Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start(config={
+                    "async": {
+                        "store": store_config
+                    }
+                })
+                client = TestClient(app)
+                job_id = unpackb(client.post("/jobs", data=packb({
+                    "providerId": "andantei",
+                    "pluginId": "hello-world",
+                    "params": {},
+                    "song": song.serialize_to_bytestring()
+                })).content)["jobId"]
+                assert unpackb(client.get(f'/jobs/{job_id}').content)["jobStatus"] == "ERROR"
+                response = client.get(f'/jobs/{job_id}/result')
+                assert response.status_code == 200
+                parsed_result = unpackb(response.content)
+                assert parsed_result["status"] == "RESULT_TOO_LARGE"
+                assert "exceeds the limit" in parsed_result["error"]
+
+    def test_async_runner_awaitable_uploader(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        uploaded_results = {}
+
+        async def test_store_uploader(job_id, result):
+            uploaded_results[job_id] = result
+
+        app = Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start(config={
+            "async": {
+                "store": {
+                    "uploader": test_store_uploader,
+                    "resultUrlResolver": lambda job_id: f"http://download.link/{job_id}"
+                }
+            }
+        })
+
+        client = TestClient(app)
+        accepted_result = client.post("/jobs", data=packb({
+            "providerId": "andantei",
+            "pluginId": "hello-world",
+            "params": {},
+            "song": Song().serialize_to_bytestring()
+        }))
+        job_id = unpackb(accepted_result.content)["jobId"]
+        assert unpackb(uploaded_results[job_id])["status"] == "OK"
+        assert unpackb(client.get(f'/jobs/{job_id}').content)["jobStatus"] == "DONE"
+
+    def test_result_cache(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+
+        for plugin_cache_enabled in [True, False]:
+            CountingPlugin.run_count = 0
+            app = Runner(plugin_class_list=[CountingPlugin], bundle_file_path=bundle_file_path).start(config={
+                "cache": {},
+                "plugins": {
+                    "andantei": {
+                        "hello-world": {
+                            "cache": plugin_cache_enabled
+                        }
+                    }
+                }
+            })
+
+            client = TestClient(app)
+            song_bytes = Song().serialize_to_bytestring()
+            for params in [{"a": 1, "b": 2}, {"b": 2, "a": 1}, {"a": 2, "b": 2}]:
+                response = client.post("/jobs", data=packb({
+                    "providerId": "andantei",
+                    "pluginId": "hello-world",
+                    "params": params,
+                    "song": song_bytes
+                }))
+                assert unpackb(response.content)["status"] == "OK"
+
+            stats = app.state.result_cache.get_stats()
+            if plugin_cache_enabled:
+                assert CountingPlugin.run_count == 2
+                assert stats["hits"] == 1
+                assert stats["misses"] == 2
+            else:
+                assert CountingPlugin.run_count == 3
+                assert stats["hits"] == 0
+
+    def test_single_flight(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        SlowCountingPlugin.run_count = 0
+        uploaded_results = {}
+
+        def test_store_uploader(job_id, result):
+            uploaded_results[job_id] = result
+
+        sync_app = Runner(plugin_class_list=[SlowCountingPlugin], bundle_file_path=bundle_file_path).start(config={
+            "singleFlight": {}
+        })
+        async_app = Runner(plugin_class_list=[SlowCountingPlugin], bundle_file_path=bundle_file_path).start(config={
+            "singleFlight": {},
+            "async": {
+                "store": {
+                    "uploader": test_store_uploader,
+                    "resultUrlResolver": lambda job_id: f"http://download.link/{job_id}"
+                }
+            }
+        })
+        request_body = packb({
+            "providerId": "andantei",
+            "pluginId": "hello-world",
+            "params": {},
+            "song": Song().serialize_to_bytestring()
+        })
+
+        async def send_concurrent_requests(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                return await asyncio.gather(*[client.post("/jobs", content=request_body) for _ in range(3)])
+
+        responses = asyncio.run(send_concurrent_requests(sync_app))
+        assert SlowCountingPlugin.run_count == 1
+        parsed_results = [unpackb(response.content) for response in responses]
+        assert all(parsed_result["status"] == "OK" for parsed_result in parsed_results)
+        assert all(parsed_result["song"] == parsed_results[0]["song"] for parsed_result in parsed_results)
+        assert sync_app.state.single_flight.get_stats()["coalesced"] == 2
+
+        responses = asyncio.run(send_concurrent_requests(async_app))
+        assert SlowCountingPlugin.run_count == 2
+        job_ids = [unpackb(response.content)["jobId"] for response in responses]
+        assert len(set(job_ids)) == 3
+        for job_id in job_ids:
+            uploaded_result = unpackb(uploaded_results[job_id])
+            assert uploaded_result["status"] == "OK"
+            assert uploaded_result["jobId"] == job_id
+
+    def test_streaming_body(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        song = Song()
+        song.create_track(type=TrackType.MIDI_TRACK)
+        song_bytes = song.serialize_to_bytestring()
+        request_body = packb({
+            "providerId": "andantei",
+            "pluginId": "hello-world",
+            "params": {},
+            "song": song_bytes
+        })
+
+        app = Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start(config={
+            "streaming": {
+                "maxBodySize": len(request_body),
+                "chunkSize": 16
+            }
+        })
+        client = TestClient(app)
+        response = client.post("/jobs", data=request_body)
+        assert response.status_code == 200
+        assert int(response.headers["Content-Length"]) == len(response.content)
+        parsed_result = unpackb(response.content)
+        assert parsed_result["status"] == "OK"
+        assert parsed_result["song"] == song_bytes
+
+        response = client.post("/jobs", data=request_body + b'\x00')
+        assert response.status_code == 413
+        assert unpackb(response.content)["status"] == "BODY_TOO_LARGE"
+
+        response = client.post("/jobs", data=request_body, headers={"Content-Length": "abc"})
+        assert response.status_code == 400
+        assert unpackb(response.content)["status"] == "INVALID_CONTENT_LENGTH"
+
+        # Without a limit, a forged Content-Length does not allocate the declared size up front.
+        unlimited_app = Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start()
+        response = TestClient(unlimited_app).post(
+            "/jobs", data=request_body, headers={"Content-Length": "1000000000000000"})
+        assert response.status_code == 200
+        assert unpackb(response.content)["song"] == song_bytes
+
+    def test_compression(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        song = Song()
+        clip = song.create_track(type=TrackType.MIDI_TRACK).create_midi_clip(clip_start_tick=0, clip_end_tick=100000)
+        for index in range(200):
+            clip.create_note(pitch=60, velocity=100, start_tick=index * 100, end_tick=index * 100 + 50)
+        song_bytes = song.serialize_to_bytestring()
+        request_body = packb({
+            "providerId": "andantei",
+            "pluginId": "hello-world",
+            "params": {},
+            "song": song_bytes
+        })
+
+        app = Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start(config={
+            "compression": {
+                "minSize": 1024,
+                "levels": {"gzip": 1}
+            }
+        })
+        client = TestClient(app)
+        response = client.post("/jobs", data=gzip.compress(request_body), headers={
+            "Content-Encoding": "gzip",
+            "Accept-Encoding": "gzip"
+        })
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert int(response.headers["Content-Length"]) < len(song_bytes)
+        assert unpackb(response.content)["song"] == song_bytes
+
+        response = client.post("/jobs", data=request_body, headers={"Accept-Encoding": "identity"})
+        assert "Content-Encoding" not in response.headers
+        assert unpackb(response.content)["song"] == song_bytes
+
+        response = client.post("/jobs", data=request_body, headers={"Content-Encoding": "compress"})
+        assert response.status_code == 415
+        assert unpackb(response.content)["status"] == "UNSUPPORTED_ENCODING"
+
+        response = client.post("/jobs", data=gzip.compress(request_body)[:-8], headers={"Content-Encoding": "gzip"})
+        assert response.status_code == 400
+        assert unpackb(response.content)["status"] == "INVALID_COMPRESSED_DATA"
+
+    def test_delta_response(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        song = Song()
+        for _ in range(8):
+            clip = song.create_track(type=TrackType.MIDI_TRACK).create_midi_clip(clip_start_tick=0, clip_end_tick=1000)
+            clip.create_note(pitch=60, velocity=100, start_tick=0, end_tick=100)
+        song_bytes = song.serialize_to_bytestring()
+
+        app = Runner(plugin_class_list=[TransposePlugin], bundle_file_path=bundle_file_path).start()
+        client = TestClient(app)
+        for response_mode in ['full', 'delta']:
+            response = client.post("/jobs", data=packb({
+                "providerId": "andantei",
+                "pluginId": "hello-world",
+                "params": {},
+                "song": song_bytes,
+                "responseMode": response_mode
+            }))
+            parsed_result = unpackb(response.content)
+            assert parsed_result["status"] == "OK"
+            if response_mode == 'full':
+                result_song = Song.deserialize_from_bytestring(parsed_result["song"])
+            else:
+                assert "song" not in parsed_result
+                result_song = apply_song_delta(song_bytes, parsed_result["songDelta"])
+            assert next(result_song.get_track_at(0).get_clip_at(0).get_notes()).get_pitch() == 61
+
+    def test_metrics(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        spans = []
+        app = Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start(config={
+            "metrics": {
+                "spanHandler": lambda name, attributes, start_time, duration: spans.append(name)
+            },
+            "cache": {}
+        })
+        client = TestClient(app)
+        response = client.post("/jobs", data=packb({
+            "providerId": "andantei",
+            "pluginId": "hello-world",
+            "params": {},
+            "song": Song().serialize_to_bytestring()
+        }))
+        assert "timings" not in unpackb(response.content)
+        metrics_response = client.get("/metrics")
+        assert metrics_response.status_code == 200
+        # Rendering runs on the event loop, where the metrics are updated, not in the threadpool.
+        metrics_route = next(route for route in app.routes if getattr(route, 'path', None) == '/metrics')
+        assert asyncio.iscoroutinefunction(metrics_route.endpoint)  # type: ignore
+        metrics_text = metrics_response.text
+        for phase in ['read_body', 'unpack', 'deserialize', 'run', 'serialize', 'pack']:
+            assert f'tuneflow_devkit_phase_duration_seconds_count{{provider_id="andantei",plugin_id="hello-world",phase="{phase}"}} 1' in metrics_text
+            assert phase in spans
+        assert 'tuneflow_devkit_queue_wait_seconds_count{provider_id="andantei",plugin_id="hello-world"} 1' in metrics_text
+        assert 'tuneflow_devkit_in_flight_jobs{provider_id="andantei",plugin_id="hello-world"} 0' in metrics_text
+        assert 'tuneflow_devkit_cache_misses 1' in metrics_text
+
+        disabled_app = Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start()
+        assert TestClient(disabled_app).get("/metrics").status_code == 404
+
+    def test_profiling(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        stored_profiles = {}
+
+        def profile_uploader(profile_id, profile_text):
+            stored_profiles[profile_id] = profile_text
+
+        song = Song()
+        song.create_track(type=TrackType.MIDI_TRACK).create_midi_clip(clip_start_tick=0, clip_end_tick=1000)
+        request_body = {
+            "providerId": "andantei",
+            "pluginId": "hello-world",
+            "params": {},
+            "song": song.serialize_to_bytestring(),
+            "profile": True
+        }
+        app = Runner(plugin_class_list=[TransposePlugin], bundle_file_path=bundle_file_path).start(config={
+            "profiling": {
+                "uploader": profile_uploader
+            }
+        })
+        client = TestClient(app)
+        parsed_result = unpackb(client.post("/jobs", data=packb(request_body)).content)
+        assert parsed_result["status"] == "OK"
+        assert "test_runner.py" in parsed_result["profile"]
+        assert len(stored_profiles) == 1
+
+        sampled_app = Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start(config={
+            "profiling": {
+                "sampleRate": 1,
+                "uploader": profile_uploader
+            }
+        })
+        del request_body["profile"]
+        parsed_result = unpackb(TestClient(sampled_app).post("/jobs", data=packb(request_body)).content)
+        assert parsed_result["status"] == "OK"
+        assert "profile" not in parsed_result
+        assert len(stored_profiles) == 2
+
+        request_body["profile"] = True
+        disabled_app = Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start()
+        parsed_result = unpackb(TestClient(disabled_app).post("/jobs", data=packb(request_body)).content)
+        assert "profile" not in parsed_result
+
+
+    def test_per_plugin_routes(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        app = Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start(config={
+            "routing": {
+                "perPluginRoutes": True
+            }
+        })
+        client = TestClient(app)
+        song_bytes = Song().serialize_to_bytestring()
+        response = client.post("/jobs/andantei/hello-world", data=packb({
+            "params": {},
+            "song": song_bytes
+        }))
+        assert unpackb(response.content)["status"] == "OK"
+        response = client.post("/init-plugin-params/andantei/hello-world", data=packb({
+            "song": song_bytes
+        }))
+        assert unpackb(response.content)["status"] == "OK"
+        assert client.post("/jobs/andantei/unknown", data=packb({})).status_code == 404
+
+        response = client.post("/jobs", data=packb({
+            "providerId": "andantei",
+            "pluginId": "unknown",
+            "params": {},
+            "song": song_bytes
+        }))
+        assert response.status_code == 404
+        assert unpackb(response.content)["status"] == "NOT_FOUND"
+
+
+    def test_partial_song_fields(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        song = Song()
+        song.create_track(type=TrackType.MIDI_TRACK)
+        app = Runner(plugin_class_list=[TempoPlugin], bundle_file_path=bundle_file_path).start()
+        parsed_result = unpackb(TestClient(app).post("/jobs", data=packb({
+            "providerId": "andantei",
+            "pluginId": "hello-world",
+            "params": {"bpm": 90},
+            "song": song.serialize_to_bytestring()
+        })).content)
+        assert parsed_result["status"] == "OK"
+        result_song = Song.deserialize_from_bytestring(parsed_result["song"])
+        assert result_song.get_track_count() == 1
+        assert result_song.get_tempo_event_at(0).get_bpm() == 90
+
+
+    def test_batch_jobs(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        app = Runner(plugin_class_list=[TempoPlugin], bundle_file_path=bundle_file_path).start(config={
+            "batch": {
+                "maxItems": 3,
+                "maxConcurrency": 2
+            }
+        })
+        client = TestClient(app)
+        song_bytes = Song().serialize_to_bytestring()
+        response = client.post("/batch-jobs", data=packb({
+            "providerId": "andantei",
+            "pluginId": "hello-world",
+            "song": song_bytes,
+            "paramsList": [{"bpm": 60}, {"bpm": 90}, {"bpm": 120}]
+        }))
+        unpacker = Unpacker()
+        unpacker.feed(response.content)
+        results = sorted(unpacker, key=lambda result: result["index"])
+        assert [result["status"] for result in results] == ["OK"] * 3
+        assert [Song.deserialize_from_bytestring(result["song"]).get_tempo_event_at(0).get_bpm()
+                for result in results] == [60, 90, 120]
+
+        response = client.post("/batch-jobs", data=packb({
+            "providerId": "andantei",
+            "pluginId": "hello-world",
+            "items": [{"song": song_bytes, "params": {}}]
+        }))
+        result = unpackb(response.content)
+        assert result["index"] == 0
+        assert result["status"] == "ERROR"
+
+        response = client.post("/batch-jobs", data=packb({
+            "providerId": "andantei",
+            "pluginId": "hello-world",
+            "song": song_bytes,
+            "paramsList": [{"bpm": 60}] * 4
+        }))
+        assert response.status_code == 413
+        assert unpackb(response.content)["status"] == "BATCH_TOO_LARGE"
+
+    def test_batch_item_crash(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        app = Runner(plugin_class_list=[CrashingPlugin], bundle_file_path=bundle_file_path).start(config={
+            "executor": {
+                "mode": "process",
+                "maxWorkers": 2
+            }
+        })
+        with TestClient(app) as client:
+            response = client.post("/batch-jobs", data=packb({
+                "providerId": "andantei",
+                "pluginId": "hello-world",
+                "song": Song().serialize_to_bytestring(),
+                "paramsList": [{"crash": False}, {"crash": True}, {"crash": False}]
+            }))
+            unpacker = Unpacker()
+            unpacker.feed(response.content)
+            results = sorted(unpacker, key=lambda result: result["index"])
+            # The crashed worker only fails its own item.
+            assert [result["status"] for result in results] == ["OK", "ERROR", "OK"]
+
+
+    def test_lifecycle_hooks(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        app = Runner(plugin_class_list=[LifecyclePlugin], bundle_file_path=bundle_file_path).start()
+        with TestClient(app) as client:
+            response = client.get("/ready")
+            assert response.status_code == 503
+            assert response.json()["status"] == "WARMING_UP"
+            # Jobs wait for the setup to finish.
+            parsed_result = unpackb(client.post("/jobs", data=packb({
+                "providerId": "andantei",
+                "pluginId": "hello-world",
+                "params": {},
+                "song": Song().serialize_to_bytestring()
+            })).content)
+            assert parsed_result["status"] == "OK"
+            response = client.get("/ready")
+            assert response.status_code == 200
+            assert response.json()["status"] == "READY"
+        assert LifecyclePlugin.events == ['setup', 'run', 'teardown']
+
+    def test_lifecycle_hooks_without_lifespan(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        LifecyclePlugin.events = []
+        app = Runner(plugin_class_list=[LifecyclePlugin], bundle_file_path=bundle_file_path).start()
+        # Without the context manager the startup event never runs, so the first job sets up the plugins.
+        client = TestClient(app)
+        parsed_result = unpackb(client.post("/jobs", data=packb({
+            "providerId": "andantei",
+            "pluginId": "hello-world",
+            "params": {},
+            "song": Song().serialize_to_bytestring()
+        })).content)
+        assert parsed_result["status"] == "OK"
+        assert LifecyclePlugin.events == ['setup', 'run']
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "READY"
+
+    def test_failed_setup(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        request_body = packb({
+            "providerId": "andantei",
+            "pluginId": "hello-world",
+            "params": {},
+            "song": Song().serialize_to_bytestring()
+        })
+        app = Runner(plugin_class_list=[FailingSetupPlugin], bundle_file_path=bundle_file_path).start()
+        with TestClient(app) as client:
+            for path in ["/jobs", "/init-plugin-params"]:
+                response = client.post(path, data=request_body)
+                assert response.status_code == 503
+                assert response.headers["Retry-After"] == "1"
+                assert unpackb(response.content)["status"] == "SETUP_FAILED"
+            assert client.get("/ready").json()["status"] == "SETUP_FAILED"
+
+        app = Runner(plugin_class_list=[FailingSetupPlugin], bundle_file_path=bundle_file_path).start(config={
+            "async": {"store": {"type": "memory"}}
+        })
+        with TestClient(app) as client:
+            job_id = unpackb(client.post("/jobs", data=request_body).content)["jobId"]
+            assert unpackb(client.get(f'/jobs/{job_id}').content)["jobStatus"] == "ERROR"
+            assert unpackb(client.get(f'/jobs/{job_id}/result').content)["status"] == "SETUP_FAILED"
+
+    def test_job_timeout(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        for mode, cooperative in [('thread', True), ('process', False)]:
+            app = Runner(plugin_class_list=[SleepingPlugin], bundle_file_path=bundle_file_path).start(config={
+                "executor": {
+                    "mode": mode,
+                    "maxWorkers": 1,
+                    "timeout": 10
+                }
+            })
+            with TestClient(app) as client:
+                start_time = time.perf_counter()
+                parsed_result = unpackb(client.post("/jobs", data=packb({
+                    "providerId": "andantei",
+                    "pluginId": "hello-world",
+                    "params": {"seconds": 10, "cooperative": cooperative},
+                    "timeout": 0.3,
+                    "song": Song().serialize_to_bytestring()
+                })).content)
+                assert parsed_result["status"] == "TIMEOUT"
+                assert time.perf_counter() - start_time < 5
+                # The slot is freed once the plugin stops, or once its worker is killed.
+                parsed_result = unpackb(client.post("/jobs", data=packb({
+                    "providerId": "andantei",
+                    "pluginId": "hello-world",
+                    "params": {"seconds": 0, "cooperative": cooperative},
+                    "song": Song().serialize_to_bytestring()
+                })).content)
+                assert parsed_result["status"] == "OK"
+
+    def test_cancel_on_disconnect(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        app = Runner(plugin_class_list=[DisconnectPlugin], bundle_file_path=bundle_file_path).start(config={
+            "executor": {
+                "mode": "thread",
+                "maxWorkers": 1
+            }
+        })
+        request_body = packb({
+            "providerId": "andantei",
+            "pluginId": "hello-world",
+            "params": {},
+            "song": Song().serialize_to_bytestring()
+        })
+
+        async def run_test():
+            # Drives the app directly, so that the client can disconnect while the job runs.
+            messages = asyncio.Queue()
+            await messages.put({"type": "http.request", "body": request_body, "more_body": False})
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+                "scheme": "http", "path": "/jobs", "raw_path": b"/jobs", "query_string": b"", "root_path": "",
+                "headers": [(b"content-length", str(len(request_body)).encode())],
+                "client": ("testclient", 50000), "server": ("testserver", 80)
+            }
+            sent_messages = []
+
+            async def send(message):
+                sent_messages.append(message)
+            request_task = asyncio.ensure_future(app(scope, messages.get, send))
+            start_time = time.perf_counter()
+            while not DisconnectPlugin.started.is_set():
+                assert time.perf_counter() - start_time < 5
+                await asyncio.sleep(0.01)
+            await messages.put({"type": "http.disconnect"})
+            await asyncio.wait_for(request_task, 5)
+            # The plugin stops and gives its slot back.
+            while len(DisconnectPlugin.statuses) == 0 or app.state.job_scheduler.get_stats()["running"] > 0:
+                assert time.perf_counter() - start_time < 5
+                await asyncio.sleep(0.01)
+            assert DisconnectPlugin.statuses == ["CANCELLED"]
+            assert app.state.job_scheduler.get_stats() == {"running": 0, "waiting": 0}
+
+        asyncio.run(run_test())
+
+    def test_job_progress(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        for mode in ['thread', 'process']:
+            job_ids = []
+
+            def get_result_url(job_id):
+                job_ids.append(job_id)
+                return f"http://download.link/{job_id}"
+
+            app = Runner(plugin_class_list=[ProgressPlugin], bundle_file_path=bundle_file_path).start(config={
+                "executor": {
+                    "mode": mode,
+                    "maxWorkers": 1
+                },
+                "async": {
+                    "store": {
+                        "uploader": lambda job_id, result: None,
+                        "resultUrlResolver": get_result_url
+                    }
+                }
+            })
+            with TestClient(app) as client:
+                # The test client returns after the background job is done, so submit the job from another thread.
+                submit_thread = threading.Thread(target=client.post, args=("/jobs",), kwargs={"data": packb({
+                    "providerId": "andantei",
+                    "pluginId": "hello-world",
+                    "params": {},
+                    "song": Song().serialize_to_bytestring()
+                })})
+                submit_thread.start()
+                while len(job_ids) == 0:
+                    time.sleep(0.01)
+                events = []
+                with client.stream("GET", f'/jobs/{job_ids[0]}/events') as response:
+                    assert response.headers["Content-Type"] == "text/event-stream"
+                    event_name = None
+                    for line in response.iter_lines():
+                        if line.startswith('event: '):
+                            event_name = line[len('event: '):]
+                        elif line.startswith('data: '):
+                            events.append((event_name, json.loads(line[len('data: '):])))
+                submit_thread.join()
+                assert [event[1]["progress"] for event in events if event[0] == 'progress'][-1] == 1
+                assert Song.deserialize_from_bytestring(
+                    base64.b64decode(events[-2][1]["song"])).get_track_count() == 1
+                assert events[-1] == ('done', {"jobId": job_ids[0], "jobStatus": "DONE"})
+                assert client.get('/jobs/missing-job/events').status_code == 404
+
+    def test_default_queue_size(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        app = Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start(config={
+            "scheduler": {"maxConcurrency": 2}
+        })
+        assert app.state.job_scheduler.max_queue_size == 32
+        app = Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start(config={
+            "scheduler": {"maxConcurrency": 2, "maxQueueSize": None}
+        })
+        self.assertIsNone(app.state.job_scheduler.max_queue_size)
+
+    def test_job_registry_off_event_loop(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        with tempfile.TemporaryDirectory() as directory:
+            app = Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start(config={
+                "jobs": {
+                    "backend": EventLoopCheckingJobRegistry(path=os.path.join(directory, 'jobs.db'))
+                },
+                "async": {
+                    "store": {
+                        "type": "filesystem",
+                        "directory": os.path.join(directory, 'results')
+                    }
+                }
+            })
+            with TestClient(app) as client:
+                job_id = unpackb(client.post("/jobs", data=packb({
+                    "providerId": "andantei",
+                    "pluginId": "hello-world",
+                    "params": {},
+                    "song": Song().serialize_to_bytestring()
+                })).content)["jobId"]
+                assert unpackb(client.get(f'/jobs/{job_id}').content)["jobStatus"] == "DONE"
+                assert b'event: done' in client.get(f'/jobs/{job_id}/events').content
+                assert client.get('/jobs/unknown/result').status_code == 404
+            # Blocking registry calls never run on the event loop.
+            assert EventLoopCheckingJobRegistry.loop_calls == []
+
+    def test_in_memory_job_registry_on_event_loop(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        app = Runner(plugin_class_list=[HelloWorldPlugin], bundle_file_path=bundle_file_path).start(config={
+            "jobs": {
+                "backend": OffLoopCheckingJobRegistry()
+            },
+            "async": {
+                "store": {
+                    "type": "memory"
+                }
+            }
+        })
+        with TestClient(app) as client:
+            job_id = unpackb(client.post("/jobs", data=packb({
+                "providerId": "andantei",
+                "pluginId": "hello-world",
+                "params": {},
+                "song": Song().serialize_to_bytestring()
+            })).content)["jobId"]
+            assert unpackb(client.get(f'/jobs/{job_id}').content)["jobStatus"] == "DONE"
+            assert client.delete(f'/jobs/{job_id}').status_code == 409
+        # The unlocked in-memory registry is only used from the event loop thread.
+        assert OffLoopCheckingJobRegistry.off_loop_calls == []
+
+    def test_shared_job_state(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        with tempfile.TemporaryDirectory() as directory:
+            config = {
+                "jobs": {
+                    "registry": "sqlite",
+                    "path": os.path.join(directory, 'jobs.db')
+                },
+                "async": {
+                    "store": {
+                        "type": "filesystem",
+                        "directory": os.path.join(directory, 'results')
+                    }
+                }
+            }
+            # Two apps stand in for two worker processes of one server.
+            worker_app = Runner(plugin_class_list=[SleepingPlugin], bundle_file_path=bundle_file_path).start(config=config)
+            other_app = Runner(plugin_class_list=[SleepingPlugin], bundle_file_path=bundle_file_path).start(config=config)
+            with TestClient(worker_app) as worker_client, TestClient(other_app) as other_client:
+                parsed_accepted_result = unpackb(worker_client.post("/jobs", data=packb({
+                    "providerId": "andantei",
+                    "pluginId": "hello-world",
+                    "params": {"seconds": 0, "cooperative": True},
+                    "song": Song().serialize_to_bytestring()
+                })).content)
+                job_id = parsed_accepted_result["jobId"]
+                assert unpackb(other_client.get(f'/jobs/{job_id}').content)["jobStatus"] == "DONE"
+                assert unpackb(other_client.get(parsed_accepted_result["resultUrl"]).content)["status"] == "OK"
+
+                # Cancel requests reach the worker that runs the job.
+                submit_thread = threading.Thread(target=worker_client.post, args=("/jobs",), kwargs={"data": packb({
+                    "providerId": "andantei",
+                    "pluginId": "hello-world",
+                    "params": {"seconds": 10, "cooperative": True},
+                    "song": Song().serialize_to_bytestring()
+                })})
+                start_time = time.perf_counter()
+                submit_thread.start()
+                job_id = None
+                while job_id is None:
+                    time.sleep(0.05)
+                    for other_job_id in worker_app.state.job_registry._get_connection().execute(
+                            "SELECT job_id FROM jobs WHERE status = 'RUNNING'").fetchall():
+                        job_id = other_job_id[0]
+                response = other_client.delete(f'/jobs/{job_id}')
+                assert unpackb(response.content)["status"] == "OK"
+                submit_thread.join()
+                assert time.perf_counter() - start_time < 5
+                assert unpackb(other_client.get(f'/jobs/{job_id}').content)["jobStatus"] == "CANCELLED"
+
+    def test_cancel_async_job(self):
+        bundle_file_path = str(pathlib.PurePath(
+            __file__).parent.joinpath('hello_world_plugin.bundle.json'))
+        job_ids = []
+        uploaded_results = {}
+
+        def test_store_uploader(job_id, result):
+            uploaded_results[job_id] = unpackb(result)
+
+        def get_result_url(job_id):
+            job_ids.append(job_id)
+            return f"http://download.link/{job_id}"
+
+        app = Runner(plugin_class_list=[SleepingPlugin], bundle_file_path=bundle_file_path).start(config={
+            "async": {
+                "store": {
+                    "uploader": test_store_uploader,
+                    "resultUrlResolver": get_result_url
+                }
+            }
+        })
+        with TestClient(app) as client:
+            # The test client returns after the background job is done, so submit the job from another thread.
+            submit_thread = threading.Thread(target=client.post, args=("/jobs",), kwargs={"data": packb({
+                "providerId": "andantei",
+                "pluginId": "hello-world",
+                "params": {"seconds": 10, "cooperative": True},
+                "song": Song().serialize_to_bytestring()
+            })})
+            submit_thread.start()
+            while len(job_ids) == 0:
+                time.sleep(0.01)
+            job_id = job_ids[0]
+            start_time = time.perf_counter()
+            response = client.delete(f'/jobs/{job_id}')
+            assert response.status_code == 200
+            assert unpackb(response.content)["status"] == "OK"
+            submit_thread.join()
+            assert time.perf_counter() - start_time < 5
+            assert uploaded_results[job_id]["status"] == "CANCELLED"
+            assert unpackb(client.get(f'/jobs/{job_id}').content)["jobStatus"] == "CANCELLED"
+            response = client.delete(f'/jobs/{job_id}')
+            assert response.status_code == 409
+            assert unpackb(response.content)["status"] == "ALREADY_FINISHED"
+            assert client.delete('/jobs/missing-job').status_code == 404
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,83 @@
+from tuneflow_devkit.scheduler_utils import JobScheduler, SchedulerSaturatedError
+import unittest
+import asyncio
+import pytest
+
+
+class TestJobScheduler(unittest.TestCase):
+    def test_bounded_queue(self):
+        async def run_test():
+            scheduler = JobScheduler(max_concurrency=1, max_queue_size=1, retry_after=3)
+            running_ticket = scheduler.admit(('a', 'a'))
+            assert running_ticket.granted
+            waiting_ticket = scheduler.admit(('a', 'a'))
+            assert not waiting_ticket.granted
+            with pytest.raises(SchedulerSaturatedError) as e_info:
+                scheduler.admit(('b', 'b'))
+            assert e_info.value.status_code == 503
+            assert e_info.value.retry_after == 3
+            scheduler.release(running_ticket)
+            assert waiting_ticket.granted
+            assert scheduler.get_stats() == {"running": 1, "waiting": 0}
+
+        asyncio.run(run_test())
+
+    def test_plugin_limits(self):
+        async def run_test():
+            scheduler = JobScheduler(max_concurrency=4, plugin_configs={
+                "heavy": {
+                    "plugin": {
+                        "maxConcurrency": 1,
+                        "maxQueueSize": 1
+                    }
+                }
+            })
+            assert scheduler.admit(('heavy', 'plugin')).granted
+            assert not scheduler.admit(('heavy', 'plugin')).granted
+            with pytest.raises(SchedulerSaturatedError) as e_info:
+                scheduler.admit(('heavy', 'plugin'))
+            assert e_info.value.status_code == 429
+            # Other plugins still get the free slots.
+            assert scheduler.admit(('light', 'plugin')).granted
+
+        asyncio.run(run_test())
+
+    def test_weighted_fairness(self):
+        async def run_test():
+            scheduler = JobScheduler(max_concurrency=1, plugin_configs={
+                "fast": {
+                    "plugin": {
+                        "priority": 2
+                    }
+                }
+            })
+            first_ticket = scheduler.admit(('slow', 'plugin'))
+            tickets = [scheduler.admit(('slow', 'plugin')) for _ in range(3)] + \
+                [scheduler.admit(('fast', 'plugin')) for _ in range(3)]
+            granted_order = []
+            current_ticket = first_ticket
+            for _ in range(len(tickets)):
+                scheduler.release(current_ticket)
+                current_ticket = next(ticket for ticket in tickets if ticket.granted)
+                granted_order.append(current_ticket.plugin_key[0])
+            assert granted_order[:3] == ['fast', 'fast', 'slow']
+
+        asyncio.run(run_test())
+
+    def test_cancelled_waiter_releases_queue(self):
+        async def run_test():
+            scheduler = JobScheduler(max_concurrency=1, max_queue_size=1)
+            running_ticket = scheduler.admit(('a', 'a'))
+            waiting_ticket = scheduler.admit(('a', 'a'))
+            # A job that stops waiting gives up its place in the queue.
+            scheduler.release(waiting_ticket)
+            assert scheduler.get_stats() == {"running": 1, "waiting": 0}
+            scheduler.release(running_ticket)
+            assert scheduler.get_stats() == {"running": 0, "waiting": 0}
+
+        asyncio.run(run_test())
+
+    def test_invalid_priority(self):
+        for priority in [0, -1, '2']:
+            with pytest.raises(Exception, match='must be a positive number'):
+                JobScheduler(max_concurrency=1, plugin_configs={"a": {"a": {"priority": priority}}})
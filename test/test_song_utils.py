@@ -0,0 +1,59 @@
+from tuneflow_py import Song, TrackType
+from tuneflow_devkit.delta_utils import apply_song_delta
+from tuneflow_devkit.song_utils import PartialSong, split_song_fields
+from msgpack import packb, unpackb
+import pytest
+import unittest
+
+
+def create_test_song():
+    song = Song()
+    for _ in range(3):
+        track = song.create_track(type=TrackType.MIDI_TRACK)
+        clip = track.create_midi_clip(clip_start_tick=0, clip_end_tick=10000)
+        for note_index in range(50):
+            clip.create_note(pitch=60, velocity=100, start_tick=note_index * 10, end_tick=note_index * 10 + 5)
+    return song
+
+
+class TestSongUtils(unittest.TestCase):
+    def test_split_song_fields(self):
+        song_bytes = create_test_song().serialize_to_bytestring()
+        field_ranges = split_song_fields(song_bytes)
+        # Tracks are field 6.
+        assert len(field_ranges[6]) == 3
+        assert sum(end - start for ranges in field_ranges.values() for start, end in ranges) == len(song_bytes)
+        with pytest.raises(ValueError):
+            split_song_fields(song_bytes[:-1])
+
+    def test_partial_song(self):
+        song_bytes = create_test_song().serialize_to_bytestring()
+        partial_song = PartialSong(song_bytes, ['PPQ', 'tempos'])
+        song = partial_song.deserialize()
+        assert song.get_track_count() == 0
+        assert song.get_tempo_event_count() == 1
+        song.get_tempo_event_at(0)._proto.bpm = 90
+
+        expected_song = Song.deserialize_from_bytestring(song_bytes)
+        expected_song.get_tempo_event_at(0)._proto.bpm = 90
+        assert Song.deserialize_from_bytestring(partial_song.serialize(song))._proto == expected_song._proto
+
+        song_delta = unpackb(packb(partial_song.get_response(song, response_mode='delta')["songDelta"]))
+        assert apply_song_delta(song_bytes, song_delta)._proto == expected_song._proto
+
+        song.create_track(type=TrackType.MIDI_TRACK)
+        with pytest.raises(Exception, match='did not declare'):
+            partial_song.serialize(song)
+
+    def test_partial_song_keeps_resolution(self):
+        song = create_test_song()
+        song_bytes = song.serialize_to_bytestring()
+        partial_song = PartialSong(song_bytes, ['tempos'])
+        partial = partial_song.deserialize()
+        assert partial.get_resolution() == song.get_resolution()
+        assert partial.tick_to_seconds(song.get_resolution()) == song.tick_to_seconds(song.get_resolution())
+        assert Song.deserialize_from_bytestring(partial_song.serialize(partial))._proto == song._proto
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -92,3 +92,20 @@ class TestPluginAnd(unittest.TestCase):
         }
         plugin_info = find_match_plugin_info(bundle_info=bundle_info, provider_id='c_de', plugin_id='cde')
         self.assertIsNone(plugin_info)
+
+    def test_invalid_song_fields(self):
+        class InvalidPlugin(TuneflowPlugin):
+            song_fields = ['tempos', 'unknown']
+
+            @staticmethod
+            def provider_id() -> str:
+                return 'abc'
+
+            @staticmethod
+            def plugin_id() -> str:
+                return 'abc'
+
+        with pytest.raises(Exception) as e_info:
+            validate_plugin(plugin_class=InvalidPlugin)
+
+        self.assertIn("song_fields must only contain", e_info.value.args[0])